@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+DEFAULT_AUDIT_DB = os.path.expanduser("~/aiofarm_audit.sqlite3")
+
+logger = logging.getLogger("audit")
+
+metrics.describe("audit_written_total", "audit DB에 기록된 결과 수")
+metrics.describe("audit_dropped_total", "queue가 가득 차서 버린 결과 수")
+metrics.describe("audit_batches_total", "audit DB commit 횟수")
+metrics.describe("audit_queue_depth", "audit writer 대기 queue 길이", kind="gauge")
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY,
+    received_at REAL NOT NULL,
+    line_idx INTEGER,
+    lot TEXT,
+    grade INTEGER,
+    output INTEGER,
+    payload TEXT
+)
+"""
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS audit_lot_line ON audit (lot, line_idx)"
+INSERT_SQL = (
+    "INSERT INTO audit (received_at, line_idx, lot, grade, output, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+class AuditSink(threading.Thread):
+    """
+    결과를 SQLite(WAL)에 배치로 기록하는 writer 스레드.
+
+    submit()은 절대 block 하지 않는다. 디스크가 멈춰서 queue가 가득 차면 결과를 버리고 개수만 센다.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_AUDIT_DB,
+        max_queue_size=50000,
+        batch_size=1000,
+        flush_interval=0.2,
+    ):
+        super().__init__(name="AuditSink", daemon=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, result: dict):
+        row = (
+            result.get("received_at") or time.time(),
+            result.get("line_idx"),
+            result.get("lot"),
+            result.get("grade", result.get("count_flag")),
+            result.get("output", result.get("line_idx")),
+            json.dumps(result, default=str),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("audit_dropped_total")
+
+    __call__ = submit
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(CREATE_TABLE_SQL)
+        connection.execute(CREATE_INDEX_SQL)
+        connection.commit()
+        return connection
+
+    def run(self):
+        connection = self._connect()
+        try:
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                batch = self._take_batch()
+                if not batch:
+                    continue
+                try:
+                    with connection:
+                        connection.executemany(INSERT_SQL, batch)
+                except sqlite3.Error as e:
+                    # 기록 실패한 배치는 drop으로 센다
+                    logger.error(f"audit batch write failed: {e}")
+                    self.dropped += len(batch)
+                    metrics.inc("audit_dropped_total", len(batch))
+                    continue
+                self.written += len(batch)
+                metrics.inc("audit_written_total", len(batch))
+                metrics.inc("audit_batches_total")
+                metrics.set("audit_queue_depth", self._queue.qsize())
+        finally:
+            connection.close()
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def find_lot_grades(db_path: str, lot: str, line_idx=None):
+    """lot(및 라인)에 기록된 (received_at, line_idx, grade, output) 목록"""
+    connection = sqlite3.connect(db_path)
+    try:
+        if line_idx is None:
+            cursor = connection.execute(
+                "SELECT received_at, line_idx, grade, output FROM audit "
+                "WHERE lot = ? ORDER BY received_at",
+                (lot,),
+            )
+        else:
+            cursor = connection.execute(
+                "SELECT received_at, line_idx, grade, output FROM audit "
+                "WHERE lot = ? AND line_idx = ? ORDER BY received_at",
+                (lot, line_idx),
+            )
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    # 초당 5000건을 10초 동안 넣고 기록/버림 개수를 확인한다
+    # 사용법: python audit_sink.py [db 경로]  (측정할 디스크 위의 경로를 지정)
+    import sys
+    import tempfile
+
+    db_path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(tempfile.mkdtemp(), "audit_bench.sqlite3")
+    )
+    rate, seconds = 5000, 10
+    sink = AuditSink(db_path)
+    sink.start()
+    start = time.perf_counter()
+    worst_submit = 0.0
+    for i in range(rate * seconds):
+        target = start + i / rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        submit_start = time.perf_counter()
+        sink.submit(
+            {
+                "received_at": time.time(),
+                "line_idx": i % 8,
+                "lot": f"LOT-{i // 10000}",
+                "grade": i % 6,
+            }
+        )
+        worst_submit = max(worst_submit, time.perf_counter() - submit_start)
+    produce_seconds = time.perf_counter() - start
+    sink.stop(timeout=30)
+    total_seconds = time.perf_counter() - start
+    print(f"db: {db_path}")
+    print(
+        f"submitted {rate * seconds} in {produce_seconds:.2f}s, "
+        f"written {sink.written}, dropped {sink.dropped}, "
+        f"drained in {total_seconds:.2f}s, worst submit {worst_submit * 1e6:.0f}us"
+    )
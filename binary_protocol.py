@@ -0,0 +1,431 @@
+"""
+PC -> 아두이노 고정 길이 바이너리 프로토콜.
+
+record = SYNC(1) + schema 필드 + CRC-8(1). CRC는 SYNC를 뺀 필드 바이트에 대해 계산한다 (poly 0x07).
+Python encoder/decoder와 스케치의 C 파서는 모두 아래 schema 하나에서 만든다.
+"""
+
+import struct
+
+CRC8_POLY = 0x07
+
+# 필드 타입: (struct 문자, C 타입)
+FIELD_TYPES = {
+    "uint8": ("B", "uint8_t"),
+    "uint16": ("H", "uint16_t"),
+    "uint32": ("I", "uint32_t"),
+}
+
+RESULT_RECORD_SCHEMA = {
+    "name": "ResultRecord",
+    "sync": 0xA5,
+    "fields": [
+        ("seq", "uint8"),
+        ("line", "uint8"),
+        ("pin", "uint8"),
+        ("grade", "uint8"),
+        ("offset", "uint16"),
+    ],
+}
+
+# 아두이노 -> PC 입력 채널: encoder pulse 번호와 그 순간의 micros().
+# input이 ENCODER_INPUT이면 encoder pulse, FIRE_INPUT | pin이면 그 pin을 count pulse에 움직였다
+PULSE_RECORD_SCHEMA = {
+    "name": "PulseRecord",
+    "sync": 0x5A,
+    "fields": [
+        ("input", "uint8"),
+        ("count", "uint32"),
+        ("timestamp_us", "uint32"),
+    ],
+}
+
+
+ENCODER_INPUT = 0
+FIRE_INPUT = 0x80
+
+
+def fire_input(pin) -> int:
+    """pin 동작 보고 PulseRecord의 input 값"""
+    return FIRE_INPUT | (int(pin) & 0x7F)
+
+
+def _make_crc8_table(poly=CRC8_POLY):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data: bytes, crc=0) -> int:
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+class RecordCodec:
+    """schema로 만든 고정 길이 record encoder/decoder"""
+
+    def __init__(self, schema=RESULT_RECORD_SCHEMA):
+        self.schema = schema
+        self.sync = schema["sync"]
+        self.field_names = [name for name, _ in schema["fields"]]
+        self._body = struct.Struct(
+            "<" + "".join(FIELD_TYPES[kind][0] for _, kind in schema["fields"])
+        )
+        self.size = 1 + self._body.size + 1
+
+    def encode(self, *values) -> bytes:
+        body = self._body.pack(*values)
+        return bytes((self.sync,)) + body + bytes((crc8(body),))
+
+    def encode_dict(self, values: dict) -> bytes:
+        return self.encode(*(values[name] for name in self.field_names))
+
+    def decode(self, record: bytes) -> dict:
+        if len(record) != self.size or record[0] != self.sync:
+            raise ValueError("invalid record framing")
+        body = record[1:-1]
+        if crc8(body) != record[-1]:
+            raise ValueError("crc mismatch")
+        return dict(zip(self.field_names, self._body.unpack(body)))
+
+    def decode_buffer(self, buffer: bytes):
+        """
+        수신 버퍼에서 정상 record를 꺼내고 남은(아직 덜 받은) 바이트를 함께 반환합니다.
+
+        시리얼에서 조각으로 읽는 reader가 다음 read 결과 앞에 남은 바이트를 붙여 쓰면 된다.
+        """
+        records = []
+        index = 0
+        while index + self.size <= len(buffer):
+            if buffer[index] != self.sync:
+                index += 1
+                continue
+            try:
+                records.append(self.decode(buffer[index : index + self.size]))
+            except ValueError:
+                index += 1
+                continue
+            index += self.size
+        rest = buffer[index:]
+        # 남은 바이트 중 SYNC 이전은 버린다
+        sync_index = rest.find(bytes((self.sync,)))
+        return records, rest[sync_index:] if sync_index >= 0 else b""
+
+    def iter_decode(self, stream: bytes):
+        """바이트 스트림에서 SYNC를 찾아가며 정상 record만 꺼낸다 (손상 record는 건너뜀)."""
+        index = 0
+        while index + self.size <= len(stream):
+            if stream[index] != self.sync:
+                index += 1
+                continue
+            try:
+                yield self.decode(stream[index : index + self.size])
+            except ValueError:
+                index += 1
+                continue
+            index += self.size
+
+
+result_record_codec = RecordCodec()
+pulse_record_codec = RecordCodec(PULSE_RECORD_SCHEMA)
+
+
+def make_binary_encoder(codec: RecordCodec = result_record_codec):
+    """PortWriter용 encoder. 포트마다 seq를 0~255로 돌린다."""
+    sequences = {}
+
+    def encode(result: dict, output) -> bytes:
+        seq = sequences.get(output.port, 0)
+        sequences[output.port] = (seq + 1) & 0xFF
+        return codec.encode(
+            seq,
+            result.get("line_idx", 0) & 0xFF,
+            output.pin,
+            result.get("grade", result.get("count_flag", 0)) & 0xFF,
+            result.get("offset", output.offset) & 0xFFFF,
+        )
+
+    return encode
+
+
+def binary_framer(records) -> bytes:
+    """바이너리 record는 자체 SYNC/CRC가 있으므로 그대로 이어 붙인다."""
+    return b"".join(records)
+
+
+def generate_c_decoder(schema=RESULT_RECORD_SCHEMA) -> str:
+    """schema에 맞는 C struct, CRC-8 표, 바이트 단위 파서를 생성합니다."""
+    name = schema["name"]
+    codec = RecordCodec(schema)
+    struct_fields = "\n".join(
+        f"  {FIELD_TYPES[kind][1]} {field};" for field, kind in schema["fields"]
+    )
+    table = ", ".join(f"0x{value:02X}" for value in CRC8_TABLE)
+    unpack_lines = []
+    position = 1
+    for field, kind in schema["fields"]:
+        size = struct.calcsize(FIELD_TYPES[kind][0])
+        parts = " | ".join(
+            f"(({FIELD_TYPES[kind][1]})buf[{position + i}] << {8 * i})"
+            for i in range(size)
+        )
+        unpack_lines.append(f"  out.{field} = {parts};")
+        position += size
+    unpack = "\n".join(unpack_lines)
+    return f"""
+// ---- generated by binary_protocol.py (schema {name}) ----
+const uint8_t {name.upper()}_SYNC = 0x{schema["sync"]:02X};
+const uint8_t {name.upper()}_SIZE = {codec.size};
+const uint8_t crc8Table[256] = {{{table}}};
+
+struct {name} {{
+{struct_fields}
+}};
+
+uint8_t crc8(const uint8_t* data, uint8_t len) {{
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < len; i++) {{
+    crc = crc8Table[crc ^ data[i]];
+  }}
+  return crc;
+}}
+
+uint8_t rxBuf[{codec.size}];
+uint8_t rxLen = 0;
+uint8_t lastSeq = 0;
+bool hasLastSeq = false;
+unsigned long crcErrors = 0;
+unsigned long seqGaps = 0;
+
+// 한 바이트씩 넣고, record가 완성되면 true를 반환한다
+bool feed{name}(uint8_t byte, {name}& out) {{
+  if (rxLen == 0 && byte != {name.upper()}_SYNC) {{
+    return false;
+  }}
+  rxBuf[rxLen++] = byte;
+  if (rxLen < {name.upper()}_SIZE) {{
+    return false;
+  }}
+  rxLen = 0;
+  if (crc8(rxBuf + 1, {name.upper()}_SIZE - 2) != rxBuf[{name.upper()}_SIZE - 1]) {{
+    crcErrors++;
+    return false;
+  }}
+  const uint8_t* buf = rxBuf;
+{unpack}
+  if (hasLastSeq && (uint8_t)(lastSeq + 1) != out.seq) {{
+    seqGaps++;
+  }}
+  lastSeq = out.seq;
+  hasLastSeq = true;
+  return true;
+}}
+// ---- end generated ----
+"""
+
+
+def generate_c_encoder(schema=PULSE_RECORD_SCHEMA, serial_name="Serial") -> str:
+    """
+    schema record를 serial_name으로 보내는 C 함수를 생성합니다.
+
+    crc8()은 generate_c_decoder()가 만든 것을 같이 쓴다.
+    """
+    name = schema["name"]
+    codec = RecordCodec(schema)
+    arguments = ", ".join(
+        f"{FIELD_TYPES[kind][1]} {field}" for field, kind in schema["fields"]
+    )
+    pack_lines = []
+    position = 1
+    for field, kind in schema["fields"]:
+        for i in range(struct.calcsize(FIELD_TYPES[kind][0])):
+            pack_lines.append(f"  buf[{position + i}] = (uint8_t)({field} >> {8 * i});")
+        position += struct.calcsize(FIELD_TYPES[kind][0])
+    pack = "\n".join(pack_lines)
+    return f"""
+// ---- generated by binary_protocol.py (schema {name}, encoder) ----
+void send{name}({arguments}) {{
+  uint8_t buf[{codec.size}];
+  buf[0] = 0x{schema["sync"]:02X};
+{pack}
+  buf[{codec.size - 1}] = crc8(buf + 1, {codec.size - 2});
+  {serial_name}.write(buf, {codec.size});
+}}
+// ---- end generated ----
+"""
+
+
+def fires(grade, fire_grades=None) -> bool:
+    """generate_binary_sketch(fire_grades)로 만든 스케치가 grade record에 pin을 움직이는지"""
+    return fire_grades is None or grade in fire_grades
+
+
+def generate_binary_sketch(
+    outputs,
+    baudrate=115200,
+    encoder_pin=2,
+    pulse_ms=50,
+    report_pulses=False,
+    fire_grades=None,
+) -> str:
+    """
+    바이너리 프로토콜을 받는 프로덕션 스케치를 생성합니다.
+
+    record를 받으면 encoder pulse를 offset만큼 센 뒤 pin을 pulse_ms 동안 HIGH로 만든다.
+    fire_grades가 있으면 그 등급의 record에만 pin을 움직인다 (없으면 모든 등급).
+    report_pulses면 pulse마다 번호와 micros()를 PulseRecord로 PC에 보내고, pin을 HIGH로 만들 때도
+    그 pulse 번호를 input = FIRE_INPUT | pin으로 보낸다 (pulse_clock.py, calibration.py).
+    """
+    pins = sorted({int(output.pin) for output in outputs})
+    pin_list = ", ".join(str(pin) for pin in pins)
+    if fire_grades is None:
+        fire_check = "true"
+    else:
+        fire_check = (
+            " || ".join(f"grade == {int(grade)}" for grade in sorted(set(fire_grades)))
+            or "false"
+        )
+    if report_pulses:
+        pulse_reporter = generate_c_encoder()
+        capture_pulse = """
+  pulseLog[pulseHead].count = pulseCount;
+  pulseLog[pulseHead].timestamp = micros();
+  pulseHead = (pulseHead + 1) % PULSE_LOG_SIZE;"""
+        send_pulses = """
+  while (pulseTail != pulseHead) {
+    noInterrupts();
+    unsigned long count = pulseLog[pulseTail].count;
+    unsigned long timestamp = pulseLog[pulseTail].timestamp;
+    interrupts();
+    sendPulseRecord(0, count, timestamp);
+    pulseTail = (pulseTail + 1) % PULSE_LOG_SIZE;
+  }"""
+        report_fire = f"""
+      sendPulseRecord(0x{FIRE_INPUT:02X} | firePin[i], pulses, micros());"""
+    else:
+        pulse_reporter = capture_pulse = send_pulses = report_fire = ""
+    return f"""{generate_c_decoder()}{pulse_reporter}
+const int outputPins[] = {{{pin_list}}};
+const int numOutputPins = sizeof(outputPins) / sizeof(outputPins[0]);
+const int QUEUE_SIZE = 64;
+
+volatile unsigned long pulseCount = 0;
+const uint8_t PULSE_LOG_SIZE = 32;
+struct PulseLogEntry {{
+  unsigned long count;
+  unsigned long timestamp;
+}};
+volatile PulseLogEntry pulseLog[PULSE_LOG_SIZE];
+volatile uint8_t pulseHead = 0;
+uint8_t pulseTail = 0;
+unsigned long fireAt[QUEUE_SIZE];
+uint8_t firePin[QUEUE_SIZE];
+unsigned long releaseAt[QUEUE_SIZE];
+bool active[QUEUE_SIZE];
+
+void onPulse() {{
+  pulseCount++;{capture_pulse}
+}}
+
+bool firesFor(uint8_t grade) {{
+  return {fire_check};
+}}
+
+void schedule(uint8_t pin, uint16_t offset) {{
+  for (int i = 0; i < QUEUE_SIZE; i++) {{
+    if (!active[i]) {{
+      active[i] = true;
+      firePin[i] = pin;
+      fireAt[i] = pulseCount + offset;
+      releaseAt[i] = 0;
+      return;
+    }}
+  }}
+}}
+
+void setup() {{
+  Serial.begin({baudrate});
+  for (int i = 0; i < numOutputPins; i++) {{
+    pinMode(outputPins[i], OUTPUT);
+  }}
+  pinMode({encoder_pin}, INPUT_PULLUP);
+  attachInterrupt(digitalPinToInterrupt({encoder_pin}), onPulse, RISING);
+}}
+
+void loop() {{
+  ResultRecord record;
+  while (Serial.available() > 0) {{
+    if (feedResultRecord((uint8_t)Serial.read(), record) && firesFor(record.grade)) {{
+      schedule(record.pin, record.offset);
+    }}
+  }}{send_pulses}
+  noInterrupts();
+  unsigned long pulses = pulseCount;
+  interrupts();
+  unsigned long now = millis();
+  for (int i = 0; i < QUEUE_SIZE; i++) {{
+    if (!active[i]) {{
+      continue;
+    }}
+    if (releaseAt[i] == 0 && pulses >= fireAt[i]) {{
+      digitalWrite(firePin[i], HIGH);
+      releaseAt[i] = now + {pulse_ms};{report_fire}
+    }} else if (releaseAt[i] != 0 && now >= releaseAt[i]) {{
+      digitalWrite(firePin[i], LOW);
+      active[i] = false;
+    }}
+  }}
+}}
+"""
+
+
+if __name__ == "__main__":
+    # 가상 시리얼에서 text framing과 binary record의 초당 전송 수를 비교한다
+    import time
+    from types import SimpleNamespace
+
+    from serial_router import SerialOutputRouter, make_framer
+
+    def text_encoder(result, output):
+        return f"{result['line_idx']},{output.pin},{output.offset}".encode()
+
+    for baudrate in (9600, 115200):
+        for protocol in ("text", "binary"):
+            outputs = [
+                SimpleNamespace(
+                    port=f"virtual://protocol_{protocol}_{baudrate}",
+                    baudrate=baudrate,
+                    pin=30 + idx,
+                    offset=120 + idx,
+                )
+                for idx in range(4)
+            ]
+            if protocol == "text":
+                options = {"encoder": text_encoder, "framer": make_framer("CRLF")}
+            else:
+                options = {"encoder": make_binary_encoder(), "framer": binary_framer}
+            router = SerialOutputRouter(
+                outputs, line_count=4, max_queue_size=100000, **options
+            )
+            router.start()
+            total = 500 if baudrate == 9600 else 4000
+            start = time.perf_counter()
+            for i in range(total):
+                router.route({"line_idx": i % 4, "grade": i % 6})
+            writer = next(iter(router.writers.values()))
+            while writer.written < total:
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            router.stop()
+            print(
+                f"{baudrate} baud {protocol}: {total / elapsed:.0f} records/s "
+                f"({writer.bytes_written / total:.1f} bytes/record)"
+            )
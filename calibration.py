@@ -0,0 +1,300 @@
+"""
+선별기 offset / camera_delay 자동 보정.
+
+모델: 카메라 앞을 pulse P에 지난 과일은 출력 i 선별기에 P + D_i pulse에 도착한다 (D_i는 기구 거리).
+결과는 촬영 후 라인 latency L, 서버 -> 선별기 보드 구간 S_i 뒤에 보드에 도착하고, 스케치는 도착 후
+offset_i pulse 뒤에 동작하므로 맞게 선별하려면
+
+    D_i = L + S_i + offset_i
+
+D_i는 설정에서 거꾸로 구하지 않는다 (지금 offset이 틀렸으면 D_i도 같이 틀린다). 사용자가 잰 거리를
+distances로 받고, 나머지는 보드가 보고한 pulse로 잰다.
+
+- S_i: offset 0인 Test 등급 결과를 data_queue에 넣은 시점의 pulse(PulseClock)와, 보드가 그 결과로
+  pin을 움직이며 보낸 pulse(PulseRecord input = FIRE_INPUT | pin, binary_protocol.py)의 차이.
+  offset이 0이므로 동작 pulse가 곧 보드 도착 pulse다.
+- L: clock_sync가 기록하는 라인 결과 latency (라인이 동작 중일 때만).
+
+camera_delay = L + 서버->보드 구간 중앙값 (L을 모르면 그대로 둔다),
+offset_i = D_i - camera_delay * pulse_rate - (출력 i 구간 - 전체 구간).
+
+동작 보고는 입력 채널(PulseCapture)로 들어오므로 encoder를 받는 보드의 binary 프로토콜 스케치를
+report_pulses로 올려야 한다. 다른 보드의 출력이나 거리를 모르는 출력은 측정만 하고 풀지 않는다.
+"""
+
+import collections
+import logging
+import statistics
+import threading
+import time
+
+from binary_protocol import FIRE_INPUT
+from metrics import metrics
+from pulse_clock import UINT32_RANGE
+from serial_router import build_route_table
+
+logger = logging.getLogger("calibration")
+
+metrics.describe("calibration_samples_total", "보정용 Test 등급 결과 수")
+metrics.describe(
+    "calibration_unmatched_fires_total", "보낸 결과와 짝이 없는 선별기 동작 보고 수"
+)
+
+
+class CalibrationError(Exception):
+    pass
+
+
+def _percentile(ordered, percent):
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def _pulse_delta(fired, sent) -> int:
+    """보드 pulse 번호(uint32)와 PulseClock pulse 번호(overflow를 푼 값)의 차이"""
+    return (int(fired) - int(sent) + UINT32_RANGE // 2) % UINT32_RANGE - (
+        UINT32_RANGE // 2
+    )
+
+
+class OffsetCalibration:
+    """
+    offset 0인 Test 등급 결과를 출력별로 보내 서버 -> 선별기 보드 pulse 수를 재고 offset을 풉니다.
+
+    put은 결과를 sender queue에 넣는 함수(server.data_queue.put_nowait)다. sink/통계에 섞이지
+    않도록 dispatch_result를 거치지 않는다. distances는 {output idx: 카메라 -> 선별기 pulse 수}.
+    """
+
+    def __init__(
+        self,
+        config,
+        put,
+        pulse_clock,
+        pulse_capture,
+        distances=None,
+        samples_per_line=20,
+        interval=0.1,
+        tolerance=2,
+        timeout=5.0,
+    ):
+        self.config = config
+        self.put = put
+        self.pulse_clock = pulse_clock
+        self.pulse_capture = pulse_capture
+        self.distances = dict(distances or {})
+        self.samples_per_line = samples_per_line
+        self.interval = interval
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self._samples = []  # (output idx, 서버 -> 보드 pulse 수)
+        self._line_latencies = []
+        self._pending = {}  # pin -> deque[(output idx, 넣은 시점 pulse)]
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def _rate(self) -> float:
+        rate = self.pulse_clock.snapshot().get("rate")
+        if not rate:
+            raise CalibrationError(
+                "컨베이어 속도를 모릅니다. 입력 pulse 수집이 켜져 있는지 확인하세요."
+            )
+        return rate
+
+    def _on_pulse_event(self, record, host_time):
+        if not record["input"] & FIRE_INPUT:
+            return
+        pin = record["input"] & ~FIRE_INPUT
+        with self._lock:
+            pending = self._pending.get(pin)
+            if not pending:
+                metrics.inc("calibration_unmatched_fires_total")
+                return
+            output_idx, sent_pulse = pending.popleft()
+            self._samples.append(
+                (output_idx, _pulse_delta(record["count"], sent_pulse))
+            )
+            self._done.notify_all()
+
+    def _outstanding(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def _sample_line_latency(self):
+        for value in metrics.collect("line_result_latency_seconds").values():
+            if 0 <= value < 10:
+                self._line_latencies.append(value)
+
+    def measure(self, test_grades: dict, progress=None) -> list:
+        """
+        라인마다 test_grades[line_idx] 등급 결과를 samples_per_line개 보내고 보드의 동작 보고를 기다립니다.
+
+        progress(done, total)는 진행률 표시용. 반환값은 (output idx, 서버 -> 보드 pulse 수) 목록
+        """
+        if self.pulse_capture is None or not self.pulse_capture.is_alive():
+            raise CalibrationError(
+                "입력 pulse 수집이 꺼져 있으면 선별기 동작 pulse를 받을 수 없습니다."
+            )
+        outputs = self.config.serial_config.outputs
+        route_table = build_route_table(outputs, self.config.program_config.line_count)
+        # 같은 객체로 다시 측정하면 이전 측정값이 섞이지 않게 비운다
+        with self._lock:
+            self._samples = []
+            self._line_latencies = []
+            self._pending = {}
+        # 동작 보고는 pulse 수집 포트의 보드에서만 온다
+        board_port = self.pulse_capture.port
+        lines = sorted(
+            line_idx
+            for line_idx in test_grades
+            if line_idx < len(route_table)
+            and outputs[route_table[line_idx]].port == board_port
+        )
+        if not lines:
+            raise CalibrationError(
+                f"pulse 수집 포트({board_port})를 쓰는 출력이 없습니다."
+            )
+        total = len(lines) * self.samples_per_line
+        self.pulse_capture.event_callbacks.append(self._on_pulse_event)
+        try:
+            sent = 0
+            for round_idx in range(self.samples_per_line):
+                for line_idx in lines:
+                    output_idx = route_table[line_idx]
+                    result = {
+                        "line_idx": line_idx,
+                        "grade": test_grades[line_idx],
+                        "count_flag": test_grades[line_idx],
+                        "offset": 0,
+                        "calibration_id": f"{line_idx}-{round_idx}",
+                        "received_at": time.time(),
+                    }
+                    try:
+                        sent_pulse = self.pulse_clock.pulse_at(result["received_at"])
+                    except LookupError:
+                        raise CalibrationError("수신한 encoder pulse가 없습니다.")
+                    with self._lock:
+                        self._pending.setdefault(
+                            int(outputs[output_idx].pin), collections.deque()
+                        ).append((output_idx, sent_pulse))
+                    self.put(result)
+                    sent += 1
+                    metrics.inc("calibration_samples_total")
+                self._sample_line_latency()
+                if progress is not None:
+                    progress(sent, total)
+                time.sleep(self.interval)
+            deadline = time.monotonic() + self.timeout
+            with self._lock:
+                while self._outstanding():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._done.wait(remaining)
+                lost = self._outstanding()
+                self._pending = {}
+        finally:
+            self.pulse_capture.event_callbacks.remove(self._on_pulse_event)
+        if lost:
+            logger.warning(f"calibration: {lost} test results were not reported")
+        if not self._samples:
+            raise CalibrationError(
+                "선별기 동작 보고가 없습니다 (binary 프로토콜 report_pulses 스케치 확인)."
+            )
+        return list(self._samples)
+
+    def solve(self) -> dict:
+        """측정한 분포와 distances로 출력별 offset과 camera_delay(ms)를 풉니다."""
+        rate = self._rate()
+        outputs = self.config.serial_config.outputs
+        inputs = self.config.serial_config.inputs
+        camera_delay = inputs[0].camera_delay if inputs else 0
+        by_output = {}
+        for output_idx, pulses in self._samples:
+            by_output.setdefault(output_idx, []).append(pulses)
+        pipeline_pulses = statistics.median(pulses for _, pulses in self._samples)
+        pipeline_ms = pipeline_pulses / rate * 1000
+
+        new_camera_delay = camera_delay
+        line_latency_ms = None
+        if self._line_latencies:
+            line_latency_ms = statistics.median(self._line_latencies) * 1000
+            new_camera_delay = round(line_latency_ms + pipeline_ms)
+
+        report = {
+            "pulse_rate": rate,
+            "samples": len(self._samples),
+            "pipeline_ms": pipeline_ms,
+            "line_latency_ms": line_latency_ms,
+            "camera_delay": {"current": camera_delay, "solved": new_camera_delay},
+            "outputs": [],
+        }
+        for output_idx, output in enumerate(outputs):
+            values = by_output.get(output_idx)
+            if not values:
+                report["outputs"].append({"output": output_idx, "samples": 0})
+                continue
+            pulses = sorted(values)
+            median_pulses = statistics.median(pulses)
+            distance = self.distances.get(output_idx)
+            solved = None
+            if distance is not None:
+                solved = max(
+                    round(
+                        distance
+                        - new_camera_delay / 1000 * rate
+                        - (median_pulses - pipeline_pulses)
+                    ),
+                    0,
+                )
+            # 새 offset을 쓰면 각 샘플이 목표 pulse에서 얼마나 벗어나는지
+            errors = [value - median_pulses for value in pulses]
+            report["outputs"].append(
+                {
+                    "output": output_idx,
+                    "port": output.port,
+                    "pin": output.pin,
+                    "samples": len(values),
+                    "distance": distance,
+                    "delay_ms_p50": median_pulses / rate * 1000,
+                    "delay_ms_p95": _percentile(pulses, 95) / rate * 1000,
+                    "delay_pulses_p5": _percentile(pulses, 5),
+                    "delay_pulses_p50": median_pulses,
+                    "delay_pulses_p95": _percentile(pulses, 95),
+                    "offset": {"current": output.offset, "solved": solved},
+                    "within_tolerance": sum(
+                        abs(error) <= self.tolerance for error in errors
+                    )
+                    / len(errors),
+                }
+            )
+        return report
+
+    def run(self, test_grades: dict, progress=None) -> dict:
+        self.measure(test_grades, progress)
+        return self.solve()
+
+
+def test_grades_for(config, grades=None) -> dict:
+    """
+    라인별 Test 등급 (없으면 0). 같은 출력에 여러 라인이 묶여 있어도 모든 라인을 보낸다.
+    """
+    grades = grades or {}
+    route_table = build_route_table(
+        config.serial_config.outputs, config.program_config.line_count
+    )
+    line_indexes = [line.line_idx for line in config.program_config.lines] or list(
+        range(len(route_table))
+    )
+    return {line_idx: int(grades.get(line_idx, 0)) for line_idx in line_indexes}
+
+
+def apply_calibration(config, report: dict):
+    """solve() 결과를 설정 객체에 반영합니다 (저장은 호출하는 쪽에서)."""
+    for output_report in report["outputs"]:
+        if (
+            output_report.get("samples")
+            and output_report["offset"]["solved"] is not None
+        ):
+            output = config.serial_config.outputs[output_report["output"]]
+            output.offset = output_report["offset"]["solved"]
+    for serial_input in config.serial_config.inputs:
+        serial_input.camera_delay = report["camera_delay"]["solved"]
+    return config
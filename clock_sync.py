@@ -0,0 +1,203 @@
+"""
+GPU 라인과 서버 사이 NTP 방식 시계 동기화 (기존 websocket 위에서 동작).
+
+    서버 -> 라인: {"type": "time_sync", "seq": n, "t0": 서버 송신 시각}
+    라인 -> 서버: {"type": "time_sync_reply", "seq": n, "t0": t0, "t1": 라인 수신 시각, "t2": 라인 송신 시각}
+
+서버가 응답을 받은 시각을 t3라고 하면
+    offset = ((t1 - t0) + (t2 - t3)) / 2   (라인 시계 - 서버 시계)
+    rtt    = (t3 - t0) - (t2 - t1)
+모든 시각은 time.time() 기준 초 단위다. 접속 직후 burst 동안 응답하지 않는 라인에는 더 이상
+ping을 보내지 않으므로 기존 라인 프로그램도 그대로 동작한다.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import math
+import threading
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger("clock_sync")
+
+SYNC_REQUEST_TYPE = "time_sync"
+SYNC_REPLY_TYPE = "time_sync_reply"
+
+metrics.describe(
+    "line_clock_offset_seconds", "라인 시계 - 서버 시계 (smoothing)", kind="gauge"
+)
+metrics.describe("line_clock_rtt_seconds", "라인 websocket 왕복 시간", kind="gauge")
+metrics.describe(
+    "line_result_latency_seconds", "라인 결과 timestamp -> 서버 수신 지연", kind="gauge"
+)
+metrics.describe("line_clock_sync_samples_total", "시계 동기화 응답 수")
+metrics.describe(
+    "line_clock_sync_invalid_total", "형식이 잘못되어 버린 시계 동기화 응답 수"
+)
+
+
+def make_sync_reply(request_text: str, now=time.time) -> str:
+    """라인 쪽 구현용: time_sync 요청에 대한 응답 메시지를 만듭니다."""
+    received_at = now()
+    request = json.loads(request_text)
+    return json.dumps(
+        {
+            "type": SYNC_REPLY_TYPE,
+            "seq": request["seq"],
+            "t0": request["t0"],
+            "t1": received_at,
+            "t2": now(),
+        }
+    )
+
+
+class LineClock:
+    """
+    라인 하나의 offset/rtt 추정.
+
+    최근 filter_size개 샘플 중 rtt가 가장 작은 샘플의 offset을 쓰고(NTP clock filter),
+    그 값을 EWMA로 한 번 더 smoothing 한다.
+    """
+
+    def __init__(self, filter_size=8, alpha=0.2):
+        self.alpha = alpha
+        self.samples = collections.deque(maxlen=filter_size)  # (rtt, offset)
+        self.offset = None
+        self.rtt = None
+        self.updated_at = None
+        self.sample_count = 0
+
+    def add_sample(self, offset: float, rtt: float):
+        self.samples.append((rtt, offset))
+        self.sample_count += 1
+        best_rtt, best_offset = min(self.samples)
+        if self.offset is None:
+            self.offset, self.rtt = best_offset, rtt
+        else:
+            self.offset += self.alpha * (best_offset - self.offset)
+            self.rtt += self.alpha * (rtt - self.rtt)
+        self.updated_at = time.time()
+
+    def to_server_time(self, line_time: float) -> float:
+        return line_time - self.offset
+
+
+class ClockSync:
+    """라인별 LineClock 모음. websocket_endpoint에서 ping 송신과 응답 처리를 맡는다."""
+
+    def __init__(self, interval=5.0, burst=4, burst_interval=0.2):
+        self.interval = interval
+        self.burst = burst  # 접속 직후 빠르게 보낼 ping 수
+        self.burst_interval = burst_interval
+        self.clocks = {}
+        self._pending = {}  # (line_idx, seq) -> t0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def make_request(self, line_idx) -> str:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            t0 = time.time()
+            self._pending[(line_idx, seq)] = t0
+        return json.dumps({"type": SYNC_REQUEST_TYPE, "seq": seq, "t0": t0})
+
+    def handle_message(self, line_idx, received_data: str) -> bool:
+        """time_sync 응답이면 처리하고 True를 반환합니다 (결과 메시지는 False)."""
+        if SYNC_REPLY_TYPE not in received_data:
+            return False
+        t3 = time.time()
+        try:
+            reply = json.loads(received_data)
+        except ValueError:
+            return False
+        if not isinstance(reply, dict) or reply.get("type") != SYNC_REPLY_TYPE:
+            return False
+        try:
+            with self._lock:
+                t0 = self._pending.pop((line_idx, reply.get("seq")), None)
+            if t0 is None:
+                return True  # 연결이 바뀌기 전 요청에 대한 늦은 응답
+            t1, t2 = float(reply["t1"]), float(reply["t2"])
+            if not (math.isfinite(t1) and math.isfinite(t2)):
+                raise ValueError(f"t1/t2: {t1}, {t2}")
+        except (KeyError, TypeError, ValueError) as e:
+            # 잘못된 응답 하나 때문에 연결을 끊지 않고 그 sample만 버린다
+            logger.warning(f"line {line_idx} sent a malformed time_sync reply: {e!r}")
+            metrics.inc("line_clock_sync_invalid_total", line=line_idx)
+            return True
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        rtt = (t3 - t0) - (t2 - t1)
+        clock = self.clocks.setdefault(line_idx, LineClock())
+        clock.add_sample(offset, rtt)
+        metrics.set("line_clock_offset_seconds", clock.offset, line=line_idx)
+        metrics.set("line_clock_rtt_seconds", clock.rtt, line=line_idx)
+        metrics.inc("line_clock_sync_samples_total", line=line_idx)
+        return True
+
+    async def run_pings(self, websocket, line_idx, send=None):
+        """
+        연결이 살아 있는 동안 주기적으로 ping을 보냅니다 (asyncio task로 실행).
+
+        send(websocket, message)를 주면 그것으로 보낸다 (송신 버퍼 accounting용).
+        """
+        send = send or (lambda ws, message: ws.send_text(message))
+        sent = 0
+        try:
+            while True:
+                if sent >= self.burst and line_idx not in self.clocks:
+                    # 응답이 없는 (time_sync를 모르는) 라인에는 더 보내지 않는다
+                    logger.info(f"line {line_idx} does not answer time_sync")
+                    return
+                await send(websocket, self.make_request(line_idx))
+                sent += 1
+                await asyncio.sleep(
+                    self.burst_interval if sent < self.burst else self.interval
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"line {line_idx} time sync stopped: {e}")
+        finally:
+            self.forget_pending(line_idx)
+
+    def forget_pending(self, line_idx):
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == line_idx]:
+                del self._pending[key]
+
+    def to_server_time(self, line_idx, line_time: float):
+        """라인 시계 timestamp를 서버 시계로 바꿉니다. 아직 동기화 전이면 None"""
+        clock = self.clocks.get(line_idx)
+        if clock is None or clock.offset is None:
+            return None
+        return clock.to_server_time(line_time)
+
+    def tag_result(self, result: dict):
+        """결과의 sent_at(라인 시계)을 서버 시계로 바꾼 sent_at_server를 붙입니다 (server.result_taggers)."""
+        sent_at = result.get("sent_at")
+        if not isinstance(sent_at, (int, float)):
+            return
+        server_time = self.to_server_time(result["line_idx"], sent_at)
+        if server_time is None:
+            return
+        result["sent_at_server"] = server_time
+        metrics.set(
+            "line_result_latency_seconds",
+            result["received_at"] - server_time,
+            line=result["line_idx"],
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            line_idx: {
+                "offset": clock.offset,
+                "rtt": clock.rtt,
+                "samples": clock.sample_count,
+                "updated_at": clock.updated_at,
+            }
+            for line_idx, clock in self.clocks.items()
+        }
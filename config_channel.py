@@ -0,0 +1,139 @@
+"""
+라인별 설정 view와 push 채널.
+
+설정이 바뀔 때 한 번만 라인별 view(line_idx, number_of_cut ...)를 계산하고 version을 올린다.
+연결된 라인에는 바뀐 키만 websocket으로 보내고, `/setting`을 polling 하는 라인은 ETag로
+바뀌지 않았으면 304를 받는다.
+
+    push 메시지: {"type": "config", "version": 3, "diff": {"number_of_cut": 2}}
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+
+from metrics import metrics
+
+logger = logging.getLogger("config_channel")
+
+metrics.describe("config_version", "라인 설정 view version", kind="gauge")
+metrics.describe("config_pushes_total", "라인에 보낸 설정 diff 수")
+metrics.describe("setting_not_modified_total", "`/setting` 304 응답 수")
+
+
+def line_config_view(config, line) -> dict:
+    """라인 하나가 알아야 하는 설정 (websocket 첫 메시지와 push에 쓰는 형식)"""
+    return {
+        "line_idx": line.line_idx,
+        "number_of_cut": config.serial_config.signal_count_per_pulse,
+    }
+
+
+def setting_body(view: dict) -> dict:
+    """`/setting` 응답 형식. 예전 라인 프로그램을 위해 subharmonic_signal 키도 유지한다."""
+    return {
+        "line": view["line_idx"],
+        "number_of_cut": view["number_of_cut"],
+        "subharmonic_signal": view["number_of_cut"],
+    }
+
+
+class _LineEntry:
+    def __init__(self, view: dict):
+        self.view = view
+        self.body = json.dumps(setting_body(view)).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+
+
+class ConfigChannel:
+    """라인 ip별 설정 view, ETag, 연결된 websocket을 관리합니다."""
+
+    def __init__(self, send=None):
+        self.send = send  # send(websocket, message) 코루틴 (없으면 websocket.send_text)
+        self.version = 0
+        self._entries = {}  # ip -> _LineEntry
+        self._connections = {}  # websocket -> ip
+        self._lock = threading.Lock()
+        self.loop = None  # websocket이 속한 (uvicorn) event loop
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.version > 0
+
+    def update(self, config, force=False) -> dict:
+        """
+        설정으로 view를 다시 계산하고, 바뀐 라인에 diff를 push합니다.
+
+        force면 바뀐 것이 없어도 연결된 모든 라인에 전체 view를 다시 보낸다.
+        반환값은 ip -> diff
+        """
+        entries = {
+            line.ip: _LineEntry(line_config_view(config, line))
+            for line in config.program_config.lines
+        }
+        with self._lock:
+            diffs = {}
+            for ip, entry in entries.items():
+                old = self._entries.get(ip)
+                old_view = old.view if old is not None else {}
+                diff = {
+                    key: value
+                    for key, value in entry.view.items()
+                    if force or old_view.get(key) != value
+                }
+                if diff:
+                    diffs[ip] = diff
+            if diffs or entries.keys() != self._entries.keys() or not self.is_loaded:
+                self.version += 1
+            self._entries = entries
+            version = self.version
+            targets = [
+                (websocket, diffs[ip])
+                for websocket, ip in self._connections.items()
+                if ip in diffs
+            ]
+        metrics.set("config_version", version)
+        for websocket, diff in targets:
+            self._schedule_push(websocket, version, diff)
+        return diffs
+
+    def view_for(self, ip):
+        """ip의 view. 등록되지 않은 ip면 None"""
+        entry = self._entries.get(ip)
+        return entry.view if entry is not None else None
+
+    def setting_for(self, ip):
+        """`/setting` 응답용 (etag, body bytes). 등록되지 않은 ip면 None"""
+        entry = self._entries.get(ip)
+        if entry is None:
+            return None
+        return entry.etag, entry.body
+
+    def register(self, websocket, ip):
+        with self._lock:
+            self._connections[websocket] = ip
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+
+    def unregister(self, websocket):
+        with self._lock:
+            self._connections.pop(websocket, None)
+
+    def _schedule_push(self, websocket, version, diff):
+        if self.loop is None:
+            return
+        message = json.dumps({"type": "config", "version": version, "diff": diff})
+        asyncio.run_coroutine_threadsafe(self._push(websocket, message), self.loop)
+
+    async def _push(self, websocket, message):
+        try:
+            if self.send is None:
+                await websocket.send_text(message)
+            else:
+                await self.send(websocket, message)
+        except Exception as e:
+            logger.warning(f"config push failed: {e}")
+            return
+        metrics.inc("config_pushes_total")
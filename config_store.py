@@ -0,0 +1,269 @@
+"""
+프로세스 안에서 하나만 두는 설정 저장소.
+
+load_server_root_config()는 부를 때마다 JSON을 다시 읽어 새 객체를 만든다. 따로 읽은 사본을 고쳐
+저장하면 나중에 저장한 쪽이 앞의 변경을 덮어쓴다 (업로드 스레드 여러 개가 동시에 저장할 때 등).
+ConfigStore는 설정을 한 번 읽어 두고 저장할 때마다 version을 올린다.
+
+    root_config = config_store.get()         # 현재 설정 (읽기 전용, 고치지 않는다)
+    draft = config_store.checkout()          # 고칠 사본 (checkout 때의 version을 기억한다)
+    draft.config.program_config.line_count = 4
+    config_store.commit(draft)               # 저장 + 구독자 호출
+
+    config_store.update(lambda root_config: ..., expected_version=3)
+
+commit은 compare-and-swap이다. checkout 뒤에 다른 곳에서 저장했으면, 사본에서 바뀐 필드만 최신 설정에
+옮겨 저장한다. 양쪽이 같은 필드를 다른 값으로 바꿨으면 ConfigConflict. 필드 경로는
+"config.serial_config.baudrate" 같은 점 경로이고 list는 통째로 한 필드로 본다.
+checkout()으로 받지 않은 객체를 commit하면 (예전 설정으로 되돌리기 등) 통째로 바꾼다.
+
+구독자는 subscribe(callback, prefixes)로 등록하고, 저장한 스레드에서 lock을 잡은 채
+callback(root_config, changed_paths, version) 순서대로 불린다. GUI는 Qt signal로 넘겨서 처리한다.
+"""
+
+import copy
+import logging
+import threading
+import weakref
+
+from metrics import metrics
+from tracing import timed
+
+logger = logging.getLogger("config_store")
+
+metrics.describe("config_store_version", "설정 저장소 version", kind="gauge")
+metrics.describe("config_store_commits_total", "설정 저장 수")
+metrics.describe(
+    "config_store_merges_total", "다른 저장 뒤에 바뀐 필드만 옮겨 저장한 수"
+)
+metrics.describe(
+    "config_store_conflicts_total", "같은 필드를 동시에 바꿔 거절한 저장 수"
+)
+
+
+class ConfigConflict(Exception):
+    """다른 곳에서 먼저 저장한 설정과 겹치는 필드를 바꾼 저장"""
+
+    def __init__(self, paths, message=None):
+        self.paths = sorted(paths)
+        super().__init__(message or f"config conflict: {', '.join(self.paths)}")
+
+
+def flatten(data: dict, prefix="") -> dict:
+    """중첩 dict를 {"a.b.c": 값}으로 펼칩니다 (list와 빈 dict는 값 하나)."""
+    items = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            items.update(flatten(value, path + "."))
+        else:
+            items[path] = value
+    return items
+
+
+def _set_path(data: dict, path: str, value):
+    *parents, key = path.split(".")
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+
+def _changed(before: dict, after: dict) -> set:
+    return {
+        path
+        for path in before.keys() | after.keys()
+        if before.get(path, _MISSING) != after.get(path, _MISSING)
+    }
+
+
+_MISSING = object()
+
+
+def _default_load():
+    from server_config_model import load_server_root_config
+
+    return load_server_root_config()
+
+
+def _default_save(root_config):
+    from server_config_model import save_config
+
+    save_config(root_config)
+
+
+class ConfigStore:
+    """RootConfig 하나와 version, 구독자를 관리합니다."""
+
+    def __init__(self, load=None, save=None):
+        self._load = timed("config_load")(load or _default_load)
+        self._save = save or _default_save
+        self.version = 0
+        self._root_config = None
+        self._flat = None
+        # id(사본) -> (weakref(사본), 기준 version, 펼친 dump). 사본이 사라지면 같이 지운다
+        self._drafts = {}
+        self._subscribers = []  # (callback, prefixes)
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._root_config is None:
+            self._root_config = self._load()
+            self._flat = flatten(self._root_config.model_dump())
+            self.version = 1
+            metrics.set("config_store_version", self.version)
+
+    def get(self):
+        """현재 RootConfig. 저장할 때마다 새 객체로 바뀌므로 받은 객체는 그대로 남는다."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._root_config
+
+    @property
+    def config(self):
+        """현재 ServerConfig (읽기 전용)"""
+        return self.get().config
+
+    def checkout(self):
+        """고쳐서 commit할 사본을 만듭니다."""
+        with self._lock:
+            self._ensure_loaded()
+            draft = copy.deepcopy(self._root_config)
+            self._remember(draft, self.version, self._flat)
+            return draft
+
+    def _remember(self, draft, version, flat):
+        key = id(draft)
+        entry = self._drafts.get(key)
+        if entry is None or entry[0]() is not draft:
+            weakref.finalize(draft, self._drafts.pop, key, None)
+        self._drafts[key] = (weakref.ref(draft), version, flat)
+
+    def _base_of(self, root_config):
+        """checkout()으로 받은 사본이면 (기준 version, 펼친 dump), 아니면 None"""
+        entry = self._drafts.get(id(root_config))
+        if entry is None or entry[0]() is not root_config:
+            return None
+        return entry[1], entry[2]
+
+    def commit(self, root_config, expected_version=None) -> int:
+        """
+        root_config를 저장하고 새 version을 반환합니다.
+
+        expected_version을 주면 현재 version과 다를 때 병합하지 않고 ConfigConflict.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if expected_version is not None and expected_version != self.version:
+                metrics.inc("config_store_conflicts_total")
+                raise ConfigConflict(
+                    [],
+                    f"config version {self.version} != expected {expected_version}",
+                )
+            flat = flatten(root_config.model_dump())
+            base = self._base_of(root_config)
+            if base is not None:
+                base_version, base_flat = base
+                if base_version != self.version:
+                    root_config, flat = self._merge(root_config, base_flat, flat)
+            changed = _changed(self._flat, flat)
+            if not changed:
+                return self.version
+            self._save(root_config)
+            self._root_config = copy.deepcopy(root_config)
+            self._flat = flat
+            self.version += 1
+            # 같은 사본을 더 고쳐 다시 commit할 수 있도록 지금 version을 기준으로 삼는다
+            self._remember(root_config, self.version, flat)
+            metrics.inc("config_store_commits_total")
+            metrics.set("config_store_version", self.version)
+            self._notify(changed)
+            return self.version
+
+    def _merge(self, draft, base_flat, draft_flat):
+        """checkout 뒤에 저장된 최신 설정에 사본에서 바뀐 필드만 옮깁니다."""
+        mine = _changed(base_flat, draft_flat)
+        theirs = _changed(base_flat, self._flat)
+        conflicts = {
+            path
+            for path in mine & theirs
+            if draft_flat.get(path, _MISSING) != self._flat.get(path, _MISSING)
+        }
+        if conflicts:
+            metrics.inc("config_store_conflicts_total")
+            raise ConfigConflict(conflicts)
+        data = self._root_config.model_dump()
+        for path in mine:
+            if path in draft_flat:
+                _set_path(data, path, draft_flat[path])
+        merged = type(self._root_config).model_validate(data)
+        metrics.inc("config_store_merges_total")
+        logger.info(f"config merged onto version {self.version}: {sorted(mine)}")
+        return merged, flatten(merged.model_dump())
+
+    def update(self, mutate, expected_version=None) -> int:
+        """
+        현재 설정의 사본에 mutate(root_config)를 적용해 저장합니다.
+
+        lock 안에서 하므로 동시에 부른 update는 차례로 적용된다. mutate가 RootConfig를 반환하면
+        그것을 저장한다.
+        """
+        with self._lock:
+            draft = self.checkout()
+            result = mutate(draft)
+            return self.commit(
+                draft if result is None else result, expected_version=expected_version
+            )
+
+    def reload(self) -> set:
+        """
+        파일을 다시 읽습니다 (sender 모듈의 create_default_config처럼 파일에 직접 쓴 뒤).
+
+        바뀐 필드가 있으면 version을 올리고 구독자에게 알린다. 반환값은 바뀐 필드 경로
+        """
+        with self._lock:
+            if self._root_config is None:
+                self._ensure_loaded()
+                return set()
+            root_config = self._load()
+            flat = flatten(root_config.model_dump())
+            changed = _changed(self._flat, flat)
+            if changed:
+                self._root_config = root_config
+                self._flat = flat
+                self.version += 1
+                metrics.set("config_store_version", self.version)
+                self._notify(changed)
+            return changed
+
+    def subscribe(self, callback, prefixes=None):
+        """
+        저장 후 callback(root_config, changed_paths, version)을 부릅니다.
+
+        prefixes가 있으면 그 경로로 시작하는 필드가 바뀌었을 때만 부른다.
+        """
+        with self._lock:
+            self._subscribers.append((callback, tuple(prefixes) if prefixes else None))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [
+                (subscriber, prefixes)
+                for subscriber, prefixes in self._subscribers
+                if subscriber != callback
+            ]
+
+    def _notify(self, changed: set):
+        for callback, prefixes in list(self._subscribers):
+            if prefixes is not None and not any(
+                path == prefix or path.startswith(prefix + ".")
+                for path in changed
+                for prefix in prefixes
+            ):
+                continue
+            try:
+                callback(self._root_config, changed, self.version)
+            except Exception as e:
+                logger.error(f"config subscriber {callback} failed: {e}")
+
+
+config_store = ConfigStore()
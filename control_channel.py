@@ -0,0 +1,98 @@
+import json
+import logging
+import socket
+import socketserver
+import threading
+
+# API 서버(8000), plant_simulator 기본 포트와 겹치지 않는 포트
+DEFAULT_CONTROL_PORT = 8790
+
+logger = logging.getLogger("control_channel")
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                handler = self.server.handlers.get(request.get("cmd"))
+                if handler is None:
+                    response = {
+                        "ok": False,
+                        "error": f"unknown cmd {request.get('cmd')}",
+                    }
+                else:
+                    response = {
+                        "ok": True,
+                        "result": handler(**request.get("args", {})),
+                    }
+            except Exception as e:
+                logger.error(f"control request failed: {e}")
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+
+class _ThreadingControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    """
+    localhost 전용 JSON line 제어 소켓.
+
+    요청: {"cmd": "status", "args": {...}}  응답: {"ok": true, "result": ...}
+    """
+
+    def __init__(self, handlers: dict, port=DEFAULT_CONTROL_PORT, host="127.0.0.1"):
+        self._server = _ThreadingControlServer((host, port), _ControlRequestHandler)
+        self._server.handlers = handlers
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="ControlServer", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ControlClient:
+    """ControlServer에 명령을 보내는 client (GUI에서 사용)"""
+
+    def __init__(self, port=DEFAULT_CONTROL_PORT, host="127.0.0.1", timeout=2.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._socket = None
+        self._reader = None
+
+    def _connect(self):
+        self._socket = socket.create_connection(self.address, timeout=self.timeout)
+        self._reader = self._socket.makefile("rb")
+
+    def request(self, cmd: str, **args):
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                message = json.dumps({"cmd": cmd, "args": args}).encode() + b"\n"
+                self._socket.sendall(message)
+                line = self._reader.readline()
+                if not line:
+                    raise ConnectionError("control server closed the connection")
+            except OSError:
+                self.close()
+                raise
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error"))
+        return response.get("result")
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+        self._socket = None
+        self._reader = None
@@ -0,0 +1,278 @@
+"""
+websocket 결과 수신 admission control.
+
+- parse_line_result: 라인 메시지를 결과 dict로 바꾸고 형식이 잘못되면 InvalidLineResult.
+- 라인(ip)별 token bucket으로 초당 결과 수를 제한한다 (재시도 loop에 빠진 라인 대비).
+- FairIngestQueue: 크기가 정해진 data_queue. 가득 차면 overflow policy를 따르고,
+  sender가 꺼낼 때는 라인별로 돌아가며 꺼내서 한 라인이 다른 라인을 굶기지 않는다.
+  그 뒤의 sender queue(SenderHost, SenderSupervisor)도 작게 bound해서 결과가 이 queue에 쌓이게 한다.
+"""
+
+import collections
+import json
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+REJECT = "reject"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, REJECT)
+
+metrics.describe("ingest_accepted_total", "data_queue에 들어간 라인 결과 수")
+metrics.describe("ingest_dropped_total", "버린 라인 결과 수 (reason별)")
+metrics.describe("ingest_queue_depth", "data_queue 길이", kind="gauge")
+
+
+class IngestRejected(Exception):
+    """REJECT policy에서 queue가 가득 차서 받지 않은 결과 (라인에 error frame으로 알린다)"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class IngestStats:
+    """라인별 accepted/dropped 카운터 (GUI 표와 `/ingest`에서 읽는다)"""
+
+    FIELDS = (
+        "accepted",
+        "rate_limited",
+        "dropped_oldest",
+        "dropped_newest",
+        "rejected",
+        "invalid",
+    )
+
+    def __init__(self):
+        self._counts = collections.defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self._lock = threading.Lock()
+
+    def count(self, line_idx, field, value=1):
+        with self._lock:
+            self._counts[line_idx][field] += value
+        if field == "accepted":
+            metrics.inc("ingest_accepted_total", value, line=line_idx)
+        else:
+            metrics.inc("ingest_dropped_total", value, line=line_idx, reason=field)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {line_idx: dict(counts) for line_idx, counts in self._counts.items()}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self, now=None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """ip별 token bucket. rate가 None이면 제한하지 않는다."""
+
+    def __init__(self, rate=200.0, burst=400.0, stats=None):
+        self.rate = rate
+        self.burst = burst
+        self.stats = stats or IngestStats()
+        self._buckets = {}
+
+    def admit(self, ip, line_idx) -> bool:
+        if self.rate is None:
+            return True
+        bucket = self._buckets.get(ip)
+        if bucket is None:
+            bucket = self._buckets[ip] = TokenBucket(self.rate, self.burst)
+        if bucket.allow():
+            return True
+        self.stats.count(line_idx, "rate_limited")
+        return False
+
+
+class InvalidLineResult(ValueError):
+    """라인이 보낸 결과 JSON의 필드 형식이 잘못됨"""
+
+
+def _int_field(payload: dict, name: str, default: int) -> int:
+    value = payload.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise InvalidLineResult(f"{name}: {value!r}")
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidLineResult(f"{name}: {value!r}") from None
+
+
+def parse_line_result(received_data: str, line_idx) -> dict:
+    """
+    라인에서 받은 메시지를 결과 dict로 변환합니다. JSON이 아니면 기존 형식으로 처리
+
+    line_idx는 연결(설정의 라인 IP)에서 정한 값을 쓴다. payload의 line_idx는 무시한다.
+    등급/timestamp 형식이 잘못되면 InvalidLineResult
+    """
+    result = {"line_idx": line_idx, "count_flag": 0, "grade": 0}
+    try:
+        payload = json.loads(received_data)
+    except (TypeError, ValueError):
+        payload = None
+    if isinstance(payload, dict):
+        result["count_flag"] = _int_field(payload, "count_flag", 0)
+        result["grade"] = _int_field(payload, "grade", result["count_flag"])
+        if "timestamp" in payload:
+            try:
+                result["sent_at"] = float(payload["timestamp"])
+            except (TypeError, ValueError):
+                raise InvalidLineResult(f"timestamp: {payload['timestamp']!r}")
+        if "lot" in payload:
+            result["lot"] = str(payload["lot"])
+    result["received_at"] = time.time()
+    return result
+
+
+def requeue(target_queue, results):
+    """돌려받은 결과를 target_queue에 되돌립니다. requeue()가 있으면 앞쪽에, 없으면 뒤에 붙인다."""
+    results = list(results)
+    method = getattr(target_queue, "requeue", None)
+    if callable(method):
+        method(results)
+        return
+    for result in results:
+        target_queue.put(result)
+
+
+class FairIngestQueue:
+    """
+    라인별 deque를 가진 bounded queue (queue.Queue와 같은 put/get API).
+
+    get은 라인을 round-robin으로 돌며 하나씩 꺼낸다. 가득 찼을 때 policy가
+    DROP_OLDEST면 가장 많이 쌓인 라인의 가장 오래된 결과를 버린다 (넘치게 보낸 라인이 손해를 본다).
+    DROP_NEWEST면 들어온 결과를 버리고, REJECT면 IngestRejected를 발생시킨다.
+    """
+
+    def __init__(self, maxsize=10000, policy=DROP_OLDEST, stats=None, key="line_idx"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = stats or IngestStats()
+        self.key = key
+        self._lines = collections.OrderedDict()  # line_idx -> deque
+        self._size = 0
+        lock = threading.Lock()
+        self._condition = threading.Condition(lock)  # 결과가 들어왔다 (get 대기)
+        self._not_full = threading.Condition(lock)  # 자리가 났다 (block put 대기)
+
+    def _line_of(self, item):
+        return item.get(self.key) if isinstance(item, dict) else None
+
+    def put(self, item, block=True, timeout=None) -> bool:
+        """
+        block이면 자리가 날 때까지 (timeout까지) 기다린다. 그래도 가득 차 있으면 policy대로 처리한다.
+        """
+        with self._condition:
+            if block:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._size >= self.maxsize:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._not_full.wait(remaining)
+            return self._put_locked(item)
+
+    def put_nowait(self, item) -> bool:
+        with self._condition:
+            return self._put_locked(item)
+
+    def _put_locked(self, item) -> bool:
+        line_idx = self._line_of(item)
+        if self._size >= self.maxsize:
+            if self.policy == DROP_NEWEST:
+                self.stats.count(line_idx, "dropped_newest")
+                return False
+            if self.policy == REJECT:
+                self.stats.count(line_idx, "rejected")
+                raise IngestRejected("ingest queue full")
+            self._drop_oldest()
+        self._lines.setdefault(line_idx, collections.deque()).append(item)
+        self._size += 1
+        self._condition.notify()
+        self.stats.count(line_idx, "accepted")
+        return True
+
+    def requeue(self, items):
+        """
+        sender에서 돌려받은 결과를 라인별 맨 앞에 순서대로 되돌립니다.
+
+        이미 accepted로 센 결과이므로 다시 세지 않고 policy도 적용하지 않는다 (maxsize를 잠시 넘을 수 있다).
+        """
+        with self._condition:
+            for item in reversed(list(items)):
+                line_idx = self._line_of(item)
+                items_of_line = self._lines.get(line_idx)
+                if items_of_line is None:
+                    items_of_line = self._lines[line_idx] = collections.deque()
+                    self._lines.move_to_end(line_idx, last=False)
+                items_of_line.appendleft(item)
+                self._size += 1
+            self._condition.notify_all()
+
+    def _drop_oldest(self):
+        line_idx, longest = max(self._lines.items(), key=lambda item: len(item[1]))
+        longest.popleft()
+        self._size -= 1
+        if not longest:
+            del self._lines[line_idx]
+        self.stats.count(line_idx, "dropped_oldest")
+
+    def get(self, block=True, timeout=None):
+        with self._condition:
+            if block:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._size == 0:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Empty
+                    self._condition.wait(remaining)
+            elif self._size == 0:
+                raise queue.Empty
+            line_idx, items = next(iter(self._lines.items()))
+            item = items.popleft()
+            self._size -= 1
+            if items:
+                self._lines.move_to_end(line_idx)
+            else:
+                del self._lines[line_idx]
+            self._not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def line_depths(self) -> dict:
+        with self._condition:
+            return {line_idx: len(items) for line_idx, items in self._lines.items()}
@@ -0,0 +1,238 @@
+"""
+라인 websocket 연결 관리 (heartbeat, idle timeout, 송신 버퍼 accounting).
+
+끊긴 연결을 찾는 방법은 두 가지다.
+
+- uvicorn websocket ping/pong (`ping_interval`, `ping_timeout`): 모든 websocket client가 자동으로
+  응답하므로 예전 라인 프로그램도 포함된다. 재부팅된 PC의 반쯤 열린 TCP 연결은 여기서 끊긴다.
+- idle timeout: time_sync에 응답하는(heartbeat를 아는) 라인이 idle_timeout 동안 아무것도
+  보내지 않으면 timer wheel reaper가 연결을 정리한다.
+
+송신은 send()를 거치며 연결별로 아직 보내지 못한 바이트를 센다. transport를 알면(TransportScopeMiddleware)
+transport 쓰기 버퍼 크기를, 모르면 send()가 끝나지 않은 메시지 바이트를 쓴다. 한도를 넘거나 send_timeout
+안에 못 보내면 그 연결은 멈춘 것으로 보고 정리하므로 broadcast가 한 라인 때문에 막히지 않는다.
+"""
+
+import asyncio
+import logging
+import math
+import time
+
+from metrics import metrics
+from traffic_capture import traffic_capture
+
+logger = logging.getLogger("line_connections")
+
+metrics.describe("line_connections", "연결된 라인 websocket 수", kind="gauge")
+metrics.describe("line_connections_reaped_total", "정리한 라인 연결 수")
+metrics.describe(
+    "line_send_buffer_bytes", "라인 연결별 아직 보내지 못한 바이트", kind="gauge"
+)
+
+
+class TransportScopeMiddleware:
+    """
+    websocket scope에 uvicorn 연결의 transport를 넣는 ASGI middleware.
+
+    uvicorn은 protocol의 bound method를 send로 넘기므로 그 protocol의 transport를 꺼낸다.
+    찾지 못하면 None을 넣는다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            protocol = getattr(send, "__self__", None)
+            scope["transport"] = getattr(protocol, "transport", None)
+        await self.app(scope, receive, send)
+
+
+class LineConnection:
+    def __init__(self, websocket, ip, task=None):
+        self.websocket = websocket
+        self.ip = ip
+        self.task = task  # websocket_endpoint task (reap할 때 cancel)
+        scope = getattr(websocket, "scope", None) or {}
+        self.transport = scope.get("transport")
+        self.line_idx = None
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        # time_sync에 응답한 적이 있으면 idle timeout을 적용한다
+        self.answers_heartbeat = False
+        # time_sync ping task (timestamp를 보내는 라인에만 시작한다)
+        self.ping_task = None
+        self.pending_bytes = 0
+        self.max_pending_bytes = 0
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.closed = False
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+        self.messages_received += 1
+
+    def send_buffer_bytes(self) -> int:
+        """transport 쓰기 버퍼 크기 (transport를 모르면 send()가 끝나지 않은 메시지 바이트)"""
+        get_write_buffer_size = getattr(self.transport, "get_write_buffer_size", None)
+        if callable(get_write_buffer_size):
+            return get_write_buffer_size()
+        return self.pending_bytes
+
+    def info(self) -> dict:
+        return {
+            "ip": self.ip,
+            "line_idx": self.line_idx,
+            "connected_at": self.connected_at,
+            "idle_seconds": time.monotonic() - self.last_seen,
+            "answers_heartbeat": self.answers_heartbeat,
+            "pending_bytes": self.pending_bytes,
+            "send_buffer_bytes": self.send_buffer_bytes(),
+            "max_pending_bytes": self.max_pending_bytes,
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "messages_received": self.messages_received,
+        }
+
+
+class LineConnectionRegistry:
+    """
+    연결된 라인 websocket 목록과 idle 연결 reaper.
+
+    reaper는 tick 단위 timer wheel을 쓴다. 연결은 마감 시각에 해당하는 slot에 한 번 들어가고,
+    메시지를 받을 때는 last_seen만 갱신한다(O(1)). slot을 처리할 때 아직 마감 전이면 새 마감
+    slot으로 옮기고, 지났으면 정리한다.
+    """
+
+    def __init__(
+        self,
+        ping_interval=2.0,
+        ping_timeout=4.0,
+        idle_timeout=15.0,
+        send_timeout=2.0,
+        max_send_buffer=256 * 1024,
+        tick=0.5,
+    ):
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.max_send_buffer = max_send_buffer
+        self.tick = tick
+        self.connections = {}  # websocket -> LineConnection
+        self.reaped = 0
+        slot_count = int(math.ceil(idle_timeout / tick)) + 1
+        self._wheel = [set() for _ in range(slot_count)]
+        self._cursor = 0
+        self._reaper_task = None
+
+    def __len__(self):
+        return len(self.connections)
+
+    def add(self, websocket, ip) -> LineConnection:
+        connection = LineConnection(websocket, ip, asyncio.current_task())
+        self.connections[websocket] = connection
+        self._schedule(connection, self.idle_timeout)
+        metrics.set("line_connections", len(self.connections))
+        return connection
+
+    def remove(self, websocket):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.closed = True
+        metrics.set("line_connections", len(self.connections))
+
+    def get(self, websocket):
+        return self.connections.get(websocket)
+
+    def _schedule(self, connection, delay):
+        ticks = max(1, min(len(self._wheel) - 1, int(math.ceil(delay / self.tick))))
+        self._wheel[(self._cursor + ticks) % len(self._wheel)].add(connection)
+
+    def start_reaper(self):
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self._cursor = (self._cursor + 1) % len(self._wheel)
+            slot = self._wheel[self._cursor]
+            self._wheel[self._cursor] = set()
+            now = time.monotonic()
+            for connection in slot:
+                if connection.closed:
+                    continue  # 이미 정상 종료된 연결은 slot에서 떨어져 나간다
+                remaining = connection.last_seen + self.idle_timeout - now
+                if connection.answers_heartbeat and remaining <= 0:
+                    await self.reap(connection, "idle timeout")
+                else:
+                    # 마감까지 남은 시간 뒤에 다시 본다 (heartbeat를 모르는 라인은 idle_timeout마다)
+                    self._schedule(
+                        connection, remaining if remaining > 0 else self.idle_timeout
+                    )
+            for connection in self.connections.values():
+                metrics.set(
+                    "line_send_buffer_bytes",
+                    connection.send_buffer_bytes(),
+                    ip=connection.ip,
+                )
+
+    async def reap(self, connection, reason: str):
+        if connection.closed:
+            return
+        logger.warning(f"Reaping line connection {connection.ip}: {reason}")
+        self.remove(connection.websocket)
+        self.reaped += 1
+        metrics.inc("line_connections_reaped_total")
+        try:
+            await asyncio.wait_for(connection.websocket.close(), timeout=1.0)
+        except Exception:
+            pass
+        if (
+            connection.task is not None
+            and connection.task is not asyncio.current_task()
+        ):
+            connection.task.cancel()
+
+    async def send(self, websocket, message: str) -> bool:
+        """송신 버퍼를 세면서 보냅니다. 멈춘 연결이면 정리하고 False를 반환"""
+        connection = self.connections.get(websocket)
+        traffic_capture.ws_out(
+            connection.line_idx if connection is not None else None, message
+        )
+        if connection is None:
+            await websocket.send_text(message)
+            return True
+        size = len(message)
+        if connection.send_buffer_bytes() + size > self.max_send_buffer:
+            await self.reap(
+                connection, f"send buffer over {self.max_send_buffer} bytes"
+            )
+            return False
+        connection.pending_bytes += size
+        connection.max_pending_bytes = max(
+            connection.max_pending_bytes, connection.send_buffer_bytes()
+        )
+        try:
+            await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+        except asyncio.TimeoutError:
+            await self.reap(connection, f"send timeout {self.send_timeout}s")
+            return False
+        finally:
+            connection.pending_bytes -= size
+        connection.bytes_sent += size
+        connection.messages_sent += 1
+        return True
+
+    async def broadcast(self, message: str):
+        """모든 라인에 동시에 보냅니다. 느린 라인은 send_timeout 뒤 정리된다."""
+        await asyncio.gather(
+            *(self.send(websocket, message) for websocket in list(self.connections)),
+            return_exceptions=True,
+        )
+
+    def snapshot(self) -> list:
+        return [connection.info() for connection in self.connections.values()]
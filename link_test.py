@@ -0,0 +1,454 @@
+"""
+시리얼 링크 품질 테스트 (처리량, 왕복 지연, 비트 오류/손실률).
+
+echo 스케치(generate_echo_sketch)를 올린 보드에 frame을 보내는 속도를 회선 용량의 25%부터 100%까지
+올려 가며, 보드레이트별로 돌아온 frame을 확인한다. 측정한 여유를 보고 보드레이트를 고르기 위한 것이다.
+가상 포트(`virtual://`)는 loopback이라 스케치 없이 돌려 볼 수 있다.
+
+frame (little endian)
+
+    SYNC 0xC3, seq u16, length u8, payload(length), CRC-8(seq ~ payload, binary_protocol.crc8)
+
+payload는 seq로 정해지는 바이트라 돌아온 frame의 비트 오류를 셀 수 있다. 스케치는 CRC가 맞는
+frame만 돌려보내므로 PC -> 보드 구간에서 깨진 frame은 손실로, 보드 -> PC 구간에서 깨진 frame은
+오류(corrupt)로 나온다. seq 0xFFFF는 보드레이트 변경 명령(payload u32)이다. 스케치는 명령을 그대로
+돌려보낸 뒤 보드레이트를 바꾼다.
+
+    python link_test.py COM4 --baud 9600 19200 57600 115200 --required 2000
+    python link_test.py --sketch link_test_echo.ino
+"""
+
+import argparse
+import json
+import struct
+import sys
+import threading
+import time
+
+from binary_protocol import CRC8_TABLE, crc8
+from virtual_serial import open_serial_port
+
+SYNC = 0xC3
+FRAME_HEADER = struct.Struct("<BHB")
+BAUD_COMMAND_SEQ = 0xFFFF
+BAUD_COMMAND = struct.Struct("<I")
+MAX_PAYLOAD = 64  # 스케치 수신 버퍼
+BAUDRATES = (9600, 19200, 38400, 57600, 115200)
+DEFAULT_LOADS = (0.25, 0.5, 0.75, 0.9, 1.0)
+
+
+class LinkTestError(Exception):
+    pass
+
+
+def payload_for(seq: int, size: int) -> bytes:
+    """seq로 정해지는 payload (0/1 비트가 고르게 섞이도록 바이트마다 값을 바꾼다)"""
+    return bytes((seq * 131 + index * 37 + 0x5A) & 0xFF for index in range(size))
+
+
+def encode_frame(seq: int, payload: bytes) -> bytes:
+    header = FRAME_HEADER.pack(SYNC, seq, len(payload))
+    return header + payload + bytes([crc8(header[1:] + payload)])
+
+
+def decode_frames(buffer: bytes, lengths):
+    """
+    buffer에서 frame을 꺼냅니다. 반환값은 ([(seq, frame 바이트, crc_ok)], 버린 바이트 수, 남은 buffer)
+
+    length가 lengths에 없으면 frame 시작이 아닌 것으로 보고 한 바이트씩 넘긴다 (payload 안의 SYNC).
+    """
+    frames = []
+    skipped = 0
+    position = 0
+    while True:
+        start = buffer.find(SYNC, position)
+        if start < 0:
+            return frames, skipped + len(buffer) - position, b""
+        skipped += start - position
+        if len(buffer) - start < FRAME_HEADER.size:
+            return frames, skipped, buffer[start:]
+        _, seq, length = FRAME_HEADER.unpack_from(buffer, start)
+        if length not in lengths:
+            position = start + 1
+            skipped += 1
+            continue
+        end = start + FRAME_HEADER.size + length + 1
+        if len(buffer) < end:
+            return frames, skipped, buffer[start:]
+        frame = bytes(buffer[start:end])
+        frames.append((seq, frame, crc8(frame[1:-1]) == frame[-1]))
+        position = end
+
+
+def bit_errors(expected: bytes, actual: bytes) -> int:
+    errors = sum(bin(left ^ right).count("1") for left, right in zip(expected, actual))
+    return errors + 8 * abs(len(expected) - len(actual))
+
+
+def _percentile(ordered, percent):
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+class LinkTest:
+    """
+    열린 포트 하나로 보드레이트/부하 단계별 echo 측정을 합니다.
+
+    port는 pyserial Serial 또는 VirtualSerialPort. 보드레이트를 바꿀 때는 스케치에 명령을 보내고
+    port.baudrate를 바꾼다.
+    """
+
+    def __init__(
+        self,
+        port,
+        payload_size=32,
+        frames_per_step=200,
+        loads=DEFAULT_LOADS,
+        timeout=1.0,
+    ):
+        if not 0 < payload_size <= MAX_PAYLOAD or payload_size == BAUD_COMMAND.size:
+            raise ValueError(f"payload_size must be 1~{MAX_PAYLOAD} (not 4)")
+        self.port = port
+        self.payload_size = payload_size
+        self.frames_per_step = frames_per_step
+        self.loads = loads
+        self.timeout = timeout
+        self.frame_size = FRAME_HEADER.size + payload_size + 1
+        self._seq = 0
+
+    def _next_seq(self) -> int:
+        seq = self._seq
+        self._seq = (self._seq + 1) % BAUD_COMMAND_SEQ
+        return seq
+
+    def set_baudrate(self, baudrate: int):
+        """스케치에 보드레이트 변경을 보내고 echo를 확인한 뒤 PC 쪽도 바꿉니다."""
+        baudrate = int(baudrate)
+        if int(self.port.baudrate) == baudrate:
+            return
+        command = encode_frame(BAUD_COMMAND_SEQ, BAUD_COMMAND.pack(baudrate))
+        self.port.reset_input_buffer()
+        self.port.write(command)
+        buffer = b""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            buffer += self.port.read(max(1, self.port.in_waiting))
+            frames, _, buffer = decode_frames(buffer, (BAUD_COMMAND.size,))
+            if any(seq == BAUD_COMMAND_SEQ and ok for seq, _, ok in frames):
+                break
+        else:
+            raise LinkTestError(
+                f"{self.port.port}: 보드레이트 변경 명령 echo가 없습니다 (echo 스케치 확인)."
+            )
+        time.sleep(0.05)  # 스케치가 마지막 바이트를 보내고 보드레이트를 바꿀 시간
+        self.port.baudrate = baudrate
+        self.port.reset_input_buffer()
+
+    def run_step(self, load: float) -> dict:
+        """회선 용량의 load 비율로 frames_per_step개를 보내고 echo를 확인합니다."""
+        baudrate = int(self.port.baudrate)
+        capacity = baudrate / 10  # 1byte = 10bit
+        interval = self.frame_size / (capacity * load)
+        outstanding = {}  # seq -> (보낸 perf_counter_ns, frame)
+        counts = {"received": 0, "corrupt": 0, "bit_errors": 0, "skipped_bytes": 0}
+        rtts = []
+        received_bytes = [0]
+        last_received_ns = [0]
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def receive(seq, frame, crc_ok, received_ns):
+            with lock:
+                sent = outstanding.pop(seq, None)
+                if sent is None and not crc_ok and outstanding:
+                    # seq가 깨졌으면 가장 오래된 frame이 돌아온 것으로 본다
+                    sent = outstanding.pop(
+                        min(outstanding, key=lambda s: outstanding[s][0])
+                    )
+                if sent is None:
+                    counts["skipped_bytes"] += len(frame)
+                    return
+                sent_ns, expected = sent
+                errors = bit_errors(expected, frame)
+                counts["bit_errors"] += errors
+                if crc_ok and not errors:
+                    counts["received"] += 1
+                    received_bytes[0] += len(frame)
+                    rtts.append(received_ns - sent_ns)
+                else:
+                    counts["corrupt"] += 1
+                last_received_ns[0] = received_ns
+
+        def read():
+            buffer = b""
+            while not done.is_set():
+                data = self.port.read(max(1, self.port.in_waiting))
+                if not data:
+                    continue
+                received_ns = time.perf_counter_ns()
+                frames, skipped, buffer = decode_frames(
+                    buffer + data, (self.payload_size,)
+                )
+                counts["skipped_bytes"] += skipped
+                for seq, frame, crc_ok in frames:
+                    receive(seq, frame, crc_ok, received_ns)
+
+        self.port.reset_input_buffer()
+        reader = threading.Thread(target=read, name="LinkTestReader", daemon=True)
+        reader.start()
+        started_ns = time.perf_counter_ns()
+        started = time.perf_counter()
+        for index in range(self.frames_per_step):
+            delay = started + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            seq = self._next_seq()
+            frame = encode_frame(seq, payload_for(seq, self.payload_size))
+            with lock:
+                outstanding[seq] = (time.perf_counter_ns(), frame)
+            self.port.write(frame)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            with lock:
+                if not outstanding:
+                    break
+            time.sleep(0.01)
+        done.set()
+        reader.join(timeout=self.timeout + 1)
+        with lock:
+            lost = len(outstanding)
+        sent = self.frames_per_step
+        elapsed = (max(last_received_ns[0], started_ns) - started_ns) / 1e9
+        rtts.sort()
+        bits = (counts["received"] + counts["corrupt"]) * self.frame_size * 8
+        report = {
+            "baudrate": baudrate,
+            "load": load,
+            "payload_size": self.payload_size,
+            "sent": sent,
+            **counts,
+            "lost": lost,
+            "error_rate": (counts["corrupt"] + lost) / sent,
+            "bit_error_rate": counts["bit_errors"] / bits if bits else None,
+            "capacity_bytes_per_s": capacity,
+            "offered_bytes_per_s": capacity * load,
+            "bytes_per_s": received_bytes[0] / elapsed if elapsed else 0.0,
+        }
+        if rtts:
+            report.update(
+                {
+                    "rtt_ms_p50": _percentile(rtts, 50) / 1e6,
+                    "rtt_ms_p95": _percentile(rtts, 95) / 1e6,
+                    "rtt_ms_p99": _percentile(rtts, 99) / 1e6,
+                    "rtt_ms_max": rtts[-1] / 1e6,
+                }
+            )
+        return report
+
+    def run_baudrate(self, baudrate: int, progress=None) -> dict:
+        self.set_baudrate(baudrate)
+        steps = []
+        for load in self.loads:
+            steps.append(self.run_step(load))
+            if progress is not None:
+                progress(baudrate, load)
+        clean = [step for step in steps if step["lost"] == 0 and step["corrupt"] == 0]
+        return {
+            "baudrate": int(baudrate),
+            "steps": steps,
+            "max_clean_bytes_per_s": max(
+                (step["bytes_per_s"] for step in clean), default=0.0
+            ),
+        }
+
+    def run(self, baudrates=BAUDRATES, progress=None) -> list:
+        """보드레이트마다 부하 단계를 돌린 결과 목록 (낮은 보드레이트부터)"""
+        return [self.run_baudrate(baudrate, progress) for baudrate in sorted(baudrates)]
+
+
+def recommend_baudrate(results, required_bytes_per_s, headroom=2.0, max_rtt_ms=None):
+    """
+    오류 없이 낸 처리량이 required_bytes_per_s의 headroom배 이상인 가장 낮은 보드레이트.
+
+    각 결과에 margin(오류 없는 처리량 / 필요 처리량)을 채운다. 조건을 맞추는 것이 없으면 None
+    """
+    for result in results:
+        result["margin"] = (
+            result["max_clean_bytes_per_s"] / required_bytes_per_s
+            if required_bytes_per_s
+            else None
+        )
+    for result in sorted(results, key=lambda result: result["baudrate"]):
+        if result["margin"] is None or result["margin"] < headroom:
+            continue
+        if max_rtt_ms is not None and any(
+            step.get("rtt_ms_p99", float("inf")) > max_rtt_ms
+            for step in result["steps"]
+            if step["bytes_per_s"] <= required_bytes_per_s * headroom
+        ):
+            continue
+        return result["baudrate"]
+    return None
+
+
+def format_report(results) -> str:
+    lines = []
+    for result in results:
+        margin = result.get("margin")
+        lines.append(
+            f"{result['baudrate']} baud: 오류 없는 최대 {result['max_clean_bytes_per_s']:.0f} byte/s"
+            + (f", 여유 {margin:.1f}배" if margin is not None else "")
+        )
+        for step in result["steps"]:
+            rtt = (
+                f"RTT p50 {step['rtt_ms_p50']:.1f} / p99 {step['rtt_ms_p99']:.1f} ms"
+                if "rtt_ms_p50" in step
+                else "RTT 없음"
+            )
+            lines.append(
+                f"  부하 {step['load'] * 100:.0f}%: {step['bytes_per_s']:.0f} byte/s, {rtt}, "
+                f"손실 {step['lost']}, 오류 {step['corrupt']}/{step['sent']}, "
+                f"BER {step['bit_error_rate'] or 0:.2e}"
+            )
+    return "\n".join(lines)
+
+
+def generate_echo_sketch(baudrate=BAUDRATES[0], serial_names=("Serial",)) -> str:
+    """
+    link test frame을 받아 CRC가 맞으면 그대로 돌려보내는 스케치를 생성합니다.
+
+    serial_names의 포트마다 따로 받는다 (Mega의 Serial1/Serial2 등). 보드레이트 변경 명령을 받으면
+    돌려보낸 뒤 그 포트만 보드레이트를 바꾼다.
+    """
+    table = ", ".join(f"0x{value:02X}" for value in CRC8_TABLE)
+    ports = ", ".join(f"&{name}" for name in serial_names)
+    return f"""
+// ---- generated by link_test.py ----
+const uint8_t LINK_SYNC = 0x{SYNC:02X};
+const uint8_t LINK_HEADER_SIZE = {FRAME_HEADER.size};
+const uint8_t LINK_MAX_PAYLOAD = {MAX_PAYLOAD};
+const uint16_t LINK_BAUD_COMMAND = 0x{BAUD_COMMAND_SEQ:04X};
+const uint8_t crc8Table[256] = {{{table}}};
+
+uint8_t crc8(const uint8_t* data, uint8_t len) {{
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < len; i++) {{
+    crc = crc8Table[crc ^ data[i]];
+  }}
+  return crc;
+}}
+
+struct LinkParser {{
+  uint8_t buf[LINK_HEADER_SIZE + LINK_MAX_PAYLOAD + 1];
+  uint8_t len;
+  unsigned long crcErrors;
+}};
+
+HardwareSerial* ports[] = {{{ports}}};
+const int numPorts = sizeof(ports) / sizeof(ports[0]);
+LinkParser parsers[sizeof(ports) / sizeof(ports[0])];
+
+void feedLink(HardwareSerial& port, LinkParser& parser, uint8_t byte) {{
+  if (parser.len == 0 && byte != LINK_SYNC) {{
+    return;
+  }}
+  parser.buf[parser.len++] = byte;
+  if (parser.len < LINK_HEADER_SIZE) {{
+    return;
+  }}
+  uint8_t length = parser.buf[3];
+  if (length > LINK_MAX_PAYLOAD) {{
+    parser.len = 0;
+    return;
+  }}
+  uint8_t size = LINK_HEADER_SIZE + length + 1;
+  if (parser.len < size) {{
+    return;
+  }}
+  parser.len = 0;
+  if (crc8(parser.buf + 1, size - 2) != parser.buf[size - 1]) {{
+    parser.crcErrors++;
+    return;
+  }}
+  port.write(parser.buf, size);
+  uint16_t seq = parser.buf[1] | ((uint16_t)parser.buf[2] << 8);
+  if (seq == LINK_BAUD_COMMAND && length == 4) {{
+    uint32_t baud = (uint32_t)parser.buf[4] | ((uint32_t)parser.buf[5] << 8) |
+                    ((uint32_t)parser.buf[6] << 16) | ((uint32_t)parser.buf[7] << 24);
+    port.flush();
+    delay(20);
+    port.begin(baud);
+  }}
+}}
+
+void setup() {{
+  for (int i = 0; i < numPorts; i++) {{
+    ports[i]->begin({int(baudrate)});
+    parsers[i].len = 0;
+    parsers[i].crcErrors = 0;
+  }}
+}}
+
+void loop() {{
+  for (int i = 0; i < numPorts; i++) {{
+    while (ports[i]->available() > 0) {{
+      feedLink(*ports[i], parsers[i], (uint8_t)ports[i]->read());
+    }}
+  }}
+}}
+// ---- end generated ----
+"""
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("port", nargs="?", help="시리얼 포트 (virtual://... 가능)")
+    parser.add_argument(
+        "--baud",
+        type=int,
+        nargs="+",
+        default=list(BAUDRATES),
+        help="테스트할 보드레이트",
+    )
+    parser.add_argument(
+        "--initial-baud",
+        type=int,
+        default=BAUDRATES[0],
+        help="스케치가 시작하는 보드레이트",
+    )
+    parser.add_argument("--payload", type=int, default=32, help="frame payload 크기")
+    parser.add_argument("--frames", type=int, default=200, help="부하 단계별 frame 수")
+    parser.add_argument(
+        "--required", type=float, default=0, help="필요 처리량(byte/s), 여유 계산용"
+    )
+    parser.add_argument(
+        "--headroom", type=float, default=2.0, help="추천 보드레이트의 최소 여유 배수"
+    )
+    parser.add_argument("--sketch", help="echo 스케치를 이 파일로 쓰고 끝낸다")
+    args = parser.parse_args(argv)
+
+    if args.sketch:
+        with open(args.sketch, "w", encoding="utf-8") as sketch_file:
+            sketch_file.write(generate_echo_sketch(args.initial_baud))
+        return 0
+    if not args.port:
+        parser.error("port is required")
+
+    port = open_serial_port(args.port, args.initial_baud, timeout=0.1)
+    try:
+        results = LinkTest(port, args.payload, args.frames).run(args.baud)
+    finally:
+        port.close()
+    recommended = recommend_baudrate(results, args.required, args.headroom)
+    print(format_report(results), file=sys.stderr)
+    print(
+        json.dumps(
+            {"results": results, "recommended_baudrate": recommended},
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+    return 0 if all(result["max_clean_bytes_per_s"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
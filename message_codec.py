@@ -0,0 +1,170 @@
+import collections
+import string
+import threading
+
+# FormatEnum 값 -> (앞에 붙는 바이트, 뒤에 붙는 바이트)
+FRAME_FORMATS = {
+    "STX/ETX": (b"\x02", b"\x03"),
+    "CRLF": (b"", b"\r\n"),
+    "LF": (b"", b"\n"),
+    "CR": (b"", b"\r"),
+}
+
+# EncodingEnum 값 중 매번 BOM이 붙는 인코딩 (조각을 따로 인코딩해서 이어 붙이면 안 됨)
+BOM_ENCODINGS = {"UTF-16", "UTF-32"}
+
+DEFAULT_ENCODINGS = ("ASCII", "UTF-8", "UTF-16", "ISO-8859-1", "UTF-32")
+
+# 캐시 항목 수 상한. 결과마다 값이 바뀌는 메시지가 들어와도 메모리가 계속 늘지 않는다
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def _value(enum_or_str) -> str:
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+class _LRUCache(collections.OrderedDict):
+    """max_entries를 넘으면 가장 오래 안 쓴 항목부터 버리는 dict"""
+
+    def __init__(self, max_entries):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+
+class ParameterizedMessage:
+    """
+    "{grade}" 같은 치환 메시지. 고정 부분은 미리 인코딩해 두고 값만 인코딩해서 버퍼에 채운다.
+    """
+
+    def __init__(self, template: str, encoding: str, format_value: str, size=256):
+        self.template = template
+        self.encoding = encoding
+        self.prefix, self.suffix = FRAME_FORMATS.get(format_value, (b"", b""))
+        self.parts = []  # (미리 인코딩한 literal, 필드 이름 또는 None)
+        for literal, field, _, _ in string.Formatter().parse(template):
+            self.parts.append((literal.encode(encoding), field))
+        self._buffer = bytearray(size)
+        self._lock = threading.Lock()
+
+    def render(self, **values) -> bytes:
+        chunks = list(self._chunks(values))
+        length = sum(len(chunk) for chunk in chunks)
+        with self._lock:
+            if length > len(self._buffer):
+                # 버퍼보다 긴 메시지는 드물기 때문에 그때만 늘린다 (memoryview를 잡기 전에)
+                self._buffer.extend(bytes(length - len(self._buffer)))
+            with memoryview(self._buffer) as view:
+                start = 0
+                for chunk in chunks:
+                    end = start + len(chunk)
+                    view[start:end] = chunk
+                    start = end
+                return bytes(view[:length])
+
+    def _chunks(self, values):
+        yield self.prefix
+        for literal, field in self.parts:
+            yield literal
+            if field is not None:
+                yield str(values[field]).encode(self.encoding)
+        yield self.suffix
+
+
+class MessageCodec:
+    """
+    (메시지, 인코딩, 포맷) 조합별로 시리얼에 쓸 bytes를 미리 만들어 두는 codec.
+
+    frame()은 dict 조회 한 번으로 불변 bytes를 반환한다. 등록되지 않은 메시지는 처음 한 번만
+    인코딩해서 캐시에 넣는다. 캐시는 max_entries까지만 두고 오래 안 쓴 조합부터 버린다.
+    시리얼 테스트 탭과 프로덕션 sender(serial_router.default_encoder의 template)가 같은 codec을
+    쓴다.
+    """
+
+    def __init__(
+        self,
+        messages=(),
+        encodings=DEFAULT_ENCODINGS,
+        formats=None,
+        max_entries=DEFAULT_MAX_ENTRIES,
+    ):
+        self.encodings = [_value(encoding) for encoding in encodings]
+        self.formats = [_value(fmt) for fmt in (formats or FRAME_FORMATS)] + ["None"]
+        self._frames = _LRUCache(max_entries)
+        self._encoded = _LRUCache(max_entries)
+        self._templates = _LRUCache(max_entries)
+        self._lock = threading.Lock()
+        for message in messages:
+            self.add(message)
+
+    def add_config(self, config):
+        """설정에 있는 테스트 메시지를 미리 등록합니다."""
+        message = config.serial_config.test_message_to_sorter
+        if message:
+            self.add(message)
+
+    def add(self, message: str):
+        for encoding in self.encodings:
+            try:
+                encoded = message.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+            with self._lock:
+                self._encoded.store((message, encoding), encoded)
+                for format_value in self.formats:
+                    prefix, suffix = FRAME_FORMATS.get(format_value, (b"", b""))
+                    self._frames.store(
+                        (message, encoding, format_value), prefix + encoded + suffix
+                    )
+
+    def encode(self, message: str, encoding) -> bytes:
+        key = (message, _value(encoding))
+        with self._lock:
+            encoded = self._encoded.lookup(key)
+        if encoded is None:
+            encoded = message.encode(key[1])
+            with self._lock:
+                self._encoded.store(key, encoded)
+        return encoded
+
+    def frame(self, message: str, encoding, format_value) -> bytes:
+        """인코딩과 frame까지 적용한 bytes (UnicodeEncodeError, LookupError 가능)"""
+        key = (message, _value(encoding), _value(format_value))
+        with self._lock:
+            frame = self._frames.lookup(key)
+        if frame is None:
+            prefix, suffix = FRAME_FORMATS.get(key[2], (b"", b""))
+            frame = prefix + self.encode(message, key[1]) + suffix
+            with self._lock:
+                self._frames.store(key, frame)
+        return frame
+
+    def frame_encoded(self, encoded: bytes, format_value) -> bytes:
+        prefix, suffix = FRAME_FORMATS.get(_value(format_value), (b"", b""))
+        return prefix + encoded + suffix
+
+    def template(self, template: str, encoding, format_value) -> ParameterizedMessage:
+        """치환 메시지용 ParameterizedMessage (조합별로 하나씩 재사용)"""
+        key = (template, _value(encoding), _value(format_value))
+        if key[1] in BOM_ENCODINGS:
+            raise ValueError(f"{key[1]}는 BOM 때문에 조각 인코딩을 할 수 없습니다.")
+        with self._lock:
+            parameterized = self._templates.lookup(key)
+            if parameterized is None:
+                parameterized = ParameterizedMessage(template, key[1], key[2])
+                self._templates.store(key, parameterized)
+        return parameterized
+
+
+message_codec = MessageCodec()
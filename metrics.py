@@ -0,0 +1,73 @@
+import threading
+
+
+class MetricsRegistry:
+    """
+    프로세스 내부 counter/gauge 모음. `/metrics`에서 Prometheus text 형식으로 내보낸다.
+
+    metrics.inc("audit_dropped_total")
+    metrics.set("sender_restarts", 3, sender="hs_sorter")
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._kinds = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, help_text, kind="counter"):
+        with self._lock:
+            self._help[name] = help_text
+            self._kinds[name] = kind
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._kinds.setdefault(name, "counter")
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._kinds.setdefault(name, "gauge")
+            self._values[key] = value
+
+    def get(self, name, default=0, **labels):
+        with self._lock:
+            return self._values.get(self._key(name, labels), default)
+
+    def collect(self, name) -> dict:
+        """name에 해당하는 값들을 {labels tuple: value}로 반환"""
+        with self._lock:
+            return {
+                labels: value
+                for (metric_name, labels), value in self._values.items()
+                if metric_name == name
+            }
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+            kinds = dict(self._kinds)
+            help_texts = dict(self._help)
+        lines = []
+        described = set()
+        for (name, labels), value in values:
+            if name not in described:
+                described.add(name)
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} {kinds.get(name, 'untyped')}")
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+            if label_text:
+                lines.append(f"{name}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,514 @@
+"""
+가상 선별 공장 시뮬레이터 (end-to-end 처리 용량 측정).
+
+`program_config.lines`의 라인마다 다음을 같이 돌린다.
+
+- VirtualConveyor: 설정한 속도로 encoder pulse를 만들고 입력 채널(가상 포트)에 PulseRecord로 넣는다.
+  pulses_per_fruit pulse마다 각 라인 카메라 앞을 과일 하나가 지나간다. 서버는 첫 입력 포트에
+  PulseCapture를 띄워 운영과 같이 pulse 시계를 맞추고 결과에 pulse 번호를 붙인다.
+- 가상 GPU 라인: 과일마다 추론 지연(camera_delay ± jitter) 뒤 websocket으로 등급 결과를 보낸다.
+  실제 서버 app(uvicorn)과 sender(가상 시리얼 포트)를 그대로 거친다.
+- VirtualSorter: 출력 포트에 frame이 도착한 pulse + offset에 선별기가 동작한다고 보고, 그 과일이
+  선별기 위치(카메라 pulse + camera_delay 동안의 pulse + offset)에 있을 때 동작했는지 확인한다.
+
+속도별로 잘못 선별한 비율(늦음/빠름/등급 틀림/누락)을 보고하므로 이 PC의 실제 처리 용량을 알 수 있다.
+
+    python plant_simulator.py --rates 2 5 10 20 --seconds 20
+"""
+
+import argparse
+import asyncio
+import collections
+import copy
+import json
+import logging
+import random
+import threading
+import time
+
+from binary_protocol import pulse_record_codec, result_record_codec
+from clock_sync import SYNC_REQUEST_TYPE, make_sync_reply
+from serial_router import RoutingResultSender, build_route_table, decode_text_records
+from tracing import traced_queue
+from virtual_serial import VIRTUAL_PORT_PREFIX, get_virtual_port
+
+logger = logging.getLogger("plant_simulator")
+
+PLANT_PORT_PREFIX = VIRTUAL_PORT_PREFIX + "plant/"
+# 시뮬레이터 서버 포트 (운영 API 8000, process_mode 제어 소켓과 겹치지 않게)
+DEFAULT_SIMULATOR_PORT = 8770
+
+
+def virtualize_config(config):
+    """입출력 포트를 `virtual://plant/...` 가상 포트로 바꾼 설정 사본"""
+    config = copy.deepcopy(config)
+    for serial_input in config.serial_config.inputs:
+        serial_input.port = PLANT_PORT_PREFIX + "input/" + serial_input.port
+    for output in config.serial_config.outputs:
+        output.port = PLANT_PORT_PREFIX + output.port
+    return config
+
+
+class VirtualConveyor(threading.Thread):
+    """
+    pulse_rate(pulse/s)로 encoder pulse를 세는 컨베이어.
+
+    pulse마다 입력 포트에 PulseRecord를 넣고, 라인 카메라 위치에 과일이 오면 on_fruit(line_idx, pulse)
+    를 부른다. 라인마다 카메라 위상을 조금씩 다르게 둬서 결과가 한꺼번에 몰리지 않게 한다.
+    """
+
+    def __init__(self, pulse_rate, pulses_per_fruit, line_indexes, on_fruit, ports=()):
+        super().__init__(name="VirtualConveyor", daemon=True)
+        self.pulse_rate = pulse_rate
+        self.pulses_per_fruit = pulses_per_fruit
+        self.on_fruit = on_fruit
+        self.ports = list(ports)
+        self.count = 0
+        phase_step = max(pulses_per_fruit // max(len(line_indexes), 1), 1)
+        self._phases = {
+            line_idx: (index * phase_step) % pulses_per_fruit
+            for index, line_idx in enumerate(line_indexes)
+        }
+        self._stop_event = threading.Event()
+
+    def run(self):
+        started = time.perf_counter()
+        while not self._stop_event.is_set():
+            due = int((time.perf_counter() - started) * self.pulse_rate)
+            while self.count < due:
+                self.count += 1
+                self._pulse(self.count, int((time.perf_counter() - started) * 1e6))
+            time.sleep(min(0.001, 0.5 / self.pulse_rate))
+
+    def _pulse(self, count, timestamp_us):
+        if self.ports:
+            record = pulse_record_codec.encode(0, count, timestamp_us & 0xFFFFFFFF)
+            for port in self.ports:
+                port.inject(record)
+        for line_idx, phase in self._phases.items():
+            if count % self.pulses_per_fruit == phase:
+                self.on_fruit(line_idx, count)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class VirtualSorter:
+    """
+    출력 포트 frame을 선별기 동작으로 바꿔 과일의 목표 pulse와 비교합니다.
+
+    frame이 도착한 pulse + offset에 동작한다(스케치와 같은 동작). 같은 출력에 걸린 과일 중
+    목표 pulse가 가장 가까운 과일과 짝짓고, 차이가 tolerance pulse를 넘으면 빠름/늦음으로 센다.
+    """
+
+    def __init__(self, conveyor, outputs, protocol="text", tolerance=2):
+        self.conveyor = conveyor
+        self.outputs = list(outputs)
+        self.protocol = protocol
+        self.tolerance = tolerance
+        self._output_by_pin = {
+            int(output.pin): idx for idx, output in enumerate(outputs)
+        }
+        self._pending = collections.defaultdict(list)  # output idx -> [(target, grade)]
+        self._buffers = collections.defaultdict(bytes)
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.errors = []  # 짝지은 동작의 (동작 pulse - 목표 pulse)
+
+    def expect(self, output_idx, target_pulse, grade):
+        with self._lock:
+            self._pending[output_idx].append((target_pulse, grade))
+            self.counts["fruits"] += 1
+
+    def attach(self, port):
+        port.write_callbacks.append(
+            lambda timestamp_ns, data: self.receive(port.port, data)
+        )
+
+    def receive(self, port_name, data: bytes):
+        pulse = self.conveyor.count
+        buffer = self._buffers[port_name] + data
+        if self.protocol == "binary":
+            records, self._buffers[port_name] = result_record_codec.decode_buffer(
+                buffer
+            )
+            actuations = [
+                (record["pin"], record["offset"], record["grade"]) for record in records
+            ]
+        else:
+            records, self._buffers[port_name] = decode_text_records(buffer)
+            actuations = []
+            for pin, grade in records:
+                output_idx = self._output_by_pin.get(pin)
+                offset = (
+                    self.outputs[output_idx].offset if output_idx is not None else 0
+                )
+                actuations.append((pin, offset, grade))
+        for pin, offset, grade in actuations:
+            self._actuate(self._output_by_pin.get(int(pin)), pulse + offset, grade)
+
+    def _actuate(self, output_idx, fire_pulse, grade):
+        with self._lock:
+            self.counts["actuations"] += 1
+            pending = self._pending.get(output_idx)
+            if not pending:
+                self.counts["unexpected"] += 1
+                return
+            index = min(
+                range(len(pending)), key=lambda i: abs(pending[i][0] - fire_pulse)
+            )
+            target, expected_grade = pending.pop(index)
+            error = fire_pulse - target
+            self.errors.append(error)
+            if error > self.tolerance:
+                self.counts["late"] += 1
+            elif error < -self.tolerance:
+                self.counts["early"] += 1
+            elif grade is not None and grade != expected_grade:
+                self.counts["wrong_grade"] += 1
+            else:
+                self.counts["correct"] += 1
+
+    def finish(self) -> dict:
+        """남은 과일은 누락으로 세고 결과를 반환합니다."""
+        with self._lock:
+            self.counts["missed"] += sum(
+                len(pending) for pending in self._pending.values()
+            )
+            self._pending.clear()
+            counts = dict(self.counts)
+            errors = sorted(self.errors)
+        fruits = counts.get("fruits", 0)
+        mis_sorted = sum(
+            counts.get(key, 0) for key in ("late", "early", "wrong_grade", "missed")
+        )
+        return {
+            **counts,
+            "mis_sorted": mis_sorted,
+            "mis_sort_rate": mis_sorted / fruits if fruits else 0.0,
+            "pulse_error_p50": errors[len(errors) // 2] if errors else None,
+            "pulse_error_max": max(errors, key=abs) if errors else None,
+        }
+
+
+class VirtualGpuLines:
+    """
+    라인마다 websocket 연결 하나로 등급 결과를 보내는 가상 GPU 라인들.
+
+    결과는 {"line_idx", "grade", "timestamp"} JSON이고, 서버가 보내는 time_sync 요청에도 응답한다.
+    """
+
+    def __init__(self, url, line_indexes, inference_delay, jitter):
+        self.url = url
+        self.line_indexes = list(line_indexes)
+        self.inference_delay = inference_delay
+        self.jitter = jitter
+        self.loop = None
+        self.sent = 0
+        self._connections = {}
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="VirtualGpuLines", daemon=True
+        )
+
+    def start(self, timeout=10):
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"virtual lines could not connect to {self.url}")
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._connect())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _connect(self):
+        import websockets
+
+        for line_idx in self.line_indexes:
+            websocket = await websockets.connect(self.url)
+            await websocket.recv()  # 첫 메시지는 라인 설정 view
+            self._connections[line_idx] = websocket
+            self.loop.create_task(self._read(websocket))
+
+    async def _read(self, websocket):
+        try:
+            async for message in websocket:
+                if SYNC_REQUEST_TYPE not in message:
+                    continue  # "Message received" 응답, 설정 push
+                request = json.loads(message)
+                if request.get("type") == SYNC_REQUEST_TYPE:
+                    await websocket.send(make_sync_reply(message))
+        except Exception:
+            pass
+
+    def send_fruit(self, line_idx, grade):
+        """conveyor 스레드에서 부른다. 추론 지연 뒤 결과를 보낸다."""
+        delay = max(random.gauss(self.inference_delay, self.jitter), 0.0)
+        self.loop.call_soon_threadsafe(
+            lambda: self.loop.create_task(self._send(line_idx, grade, delay))
+        )
+
+    async def _send(self, line_idx, grade, delay):
+        await asyncio.sleep(delay)
+        message = json.dumps(
+            {"line_idx": line_idx, "grade": grade, "timestamp": time.time()}
+        )
+        await self._connections[line_idx].send(message)
+        self.sent += 1
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        async def close():
+            for websocket in self._connections.values():
+                await websocket.close()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class PlantSimulator:
+    """
+    서버 app, sender, 가상 컨베이어/라인/선별기를 묶어 속도별로 돌립니다.
+
+    같은 PC의 가상 라인은 모두 127.0.0.1에서 접속하므로 ip별 rate limit은 시뮬레이션 동안 끈다.
+    가상 과일이 운영 이력/통계/감사 기록에 섞이지 않도록 result sink도 시뮬레이션 동안 끈다.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        sender_class=RoutingResultSender,
+        pulses_per_fruit=10,
+        jitter=0.005,
+        tolerance=None,
+        port=DEFAULT_SIMULATOR_PORT,
+        feed_input=True,
+    ):
+        if config is None:
+            from server_config_model import load_server_root_config
+
+            config = load_server_root_config().config
+        self.config = virtualize_config(config)
+        self.sender_class = sender_class
+        self.pulses_per_fruit = pulses_per_fruit
+        self.jitter = jitter
+        self.tolerance = pulses_per_fruit // 2 if tolerance is None else tolerance
+        self.port = port
+        self.feed_input = feed_input
+        self.line_indexes = [line.line_idx for line in config.program_config.lines]
+        inputs = self.config.serial_config.inputs
+        self.camera_delay = (inputs[0].camera_delay if inputs else 0) / 1000
+        self.route_table = build_route_table(
+            self.config.serial_config.outputs, self.config.program_config.line_count
+        )
+        self._server = None
+        self._sender = None
+        self._saved_sinks = None
+
+    def start(self):
+        import uvicorn
+
+        import server
+
+        self._saved_rate = server.rate_limiter.rate
+        server.rate_limiter.rate = None
+        self._saved_sinks = list(server.result_sinks)
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                server.app, host="127.0.0.1", port=self.port, log_level="warning"
+            )
+        )
+        threading.Thread(
+            target=self._server.run, name="PlantServer", daemon=True
+        ).start()
+        while not self._server.started:
+            time.sleep(0.05)
+        # startup에서 등록한 이력 저장소는 닫고, 시뮬레이션 동안 sink를 모두 끈다
+        for sink in server.result_sinks:
+            close = getattr(sink, "close", None)
+            if sink not in self._saved_sinks and callable(close):
+                close()
+        server.result_sinks.clear()
+        # startup의 load_config_channel이 저장된 설정을 넣으므로 그 다음에 가상 설정을 넣는다
+        server.config_channel.update(self.config)
+        inputs = self.config.serial_config.inputs
+        if self.feed_input and inputs:
+            # 컨베이어가 넣는 PulseRecord를 운영처럼 읽어 결과에 pulse 번호를 붙인다
+            server.enable_pulse_capture(inputs[0].port, inputs[0].baudrate)
+        self._sender = self.sender_class(
+            traced_queue(self.sender_class, server.data_queue), config=self.config
+        )
+        self._sender.start()
+
+    def stop(self):
+        import server
+
+        if self._sender is not None:
+            self._sender.stop()
+            self._sender.join(timeout=5)
+        server.disable_pulse_capture()
+        if self._server is not None:
+            self._server.should_exit = True
+        server.rate_limiter.rate = self._saved_rate
+        if self._saved_sinks is not None:
+            server.result_sinks[:] = self._saved_sinks
+
+    def run(self, fruit_rate: float, seconds: float, drain=1.0) -> dict:
+        """라인마다 초당 fruit_rate개 과일로 seconds 동안 돌리고 선별 결과를 반환합니다."""
+        pulse_rate = fruit_rate * self.pulses_per_fruit
+        outputs = self.config.serial_config.outputs
+        input_ports = []
+        if self.feed_input:
+            input_ports = [
+                get_virtual_port(serial_input.port, serial_input.baudrate, timeout=0.1)
+                for serial_input in self.config.serial_config.inputs
+            ]
+        lines = VirtualGpuLines(
+            f"ws://127.0.0.1:{self.port}/",
+            self.line_indexes,
+            self.camera_delay,
+            self.jitter,
+        )
+        lines.start()
+        sorter = None
+
+        def on_fruit(line_idx, pulse):
+            grade = random.randrange(6)
+            output_idx = self.route_table[line_idx % len(self.route_table)]
+            # 선별기 위치 = 카메라 + camera_delay 동안 지나가는 pulse + offset
+            target = (
+                pulse
+                + round(self.camera_delay * pulse_rate)
+                + outputs[output_idx].offset
+            )
+            sorter.expect(output_idx, target, grade)
+            lines.send_fruit(line_idx, grade)
+
+        conveyor = VirtualConveyor(
+            pulse_rate, self.pulses_per_fruit, self.line_indexes, on_fruit, input_ports
+        )
+        sorter = VirtualSorter(
+            conveyor,
+            outputs,
+            getattr(self.sender_class, "protocol", "text"),
+            self.tolerance,
+        )
+        output_ports = {}
+        for output in outputs:
+            if output.port not in output_ports:
+                port = get_virtual_port(output.port, output.baudrate, timeout=0.1)
+                port.loopback = False
+                port.write_callbacks.clear()
+                sorter.attach(port)
+                output_ports[output.port] = port
+        conveyor.start()
+        time.sleep(seconds)
+        conveyor.stop()
+        conveyor.join()
+        time.sleep(self.camera_delay + drain)
+        lines.stop()
+        measured_rate = self._measured_pulse_rate()
+        for port in input_ports:
+            port.reset_input_buffer()
+        for port in output_ports.values():
+            port.write_callbacks.clear()
+        report = sorter.finish()
+        report.update(
+            {
+                "fruit_rate_per_line": fruit_rate,
+                "fruit_per_second": fruit_rate * len(self.line_indexes),
+                "pulse_rate": pulse_rate,
+                "measured_pulse_rate": measured_rate,
+                "sent": lines.sent,
+            }
+        )
+        return report
+
+    def _measured_pulse_rate(self):
+        """서버 PulseCapture가 입력 채널에서 잰 pulse rate (입력을 넣지 않았으면 None)"""
+        import server
+
+        if not (self.feed_input and self.config.serial_config.inputs):
+            return None
+        return server.pulse_clock.snapshot()["rate"]
+
+    def sweep(self, rates, seconds=20.0, max_mis_sort_rate=0.001) -> dict:
+        """속도를 올려가며 돌리고, mis-sort 비율이 max_mis_sort_rate 이하인 최고 속도를 찾습니다."""
+        reports = []
+        capacity = None
+        self.start()
+        try:
+            for rate in rates:
+                report = self.run(rate, seconds)
+                reports.append(report)
+                logger.info(
+                    f"{report['fruit_per_second']:.1f} fruit/s: "
+                    f"mis-sort {report['mis_sort_rate']:.4f}"
+                )
+                if report["mis_sort_rate"] <= max_mis_sort_rate:
+                    capacity = report["fruit_per_second"]
+        finally:
+            self.stop()
+        return {"capacity_fruit_per_second": capacity, "runs": reports}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="가상 선별 공장 end-to-end 처리 용량 측정"
+    )
+    parser.add_argument(
+        "--rates",
+        type=float,
+        nargs="+",
+        default=[2, 5, 10, 20],
+        help="라인별 초당 과일 수",
+    )
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--pulses-per-fruit", type=int, default=10)
+    parser.add_argument(
+        "--jitter-ms", type=float, default=5.0, help="추론 지연 표준편차"
+    )
+    parser.add_argument("--max-mis-sort-rate", type=float, default=0.001)
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_SIMULATOR_PORT, help="시뮬레이터 서버 포트"
+    )
+    parser.add_argument(
+        "--sender", help="plugin_registry sender 이름 (기본 RoutingResultSender)"
+    )
+    args = parser.parse_args(argv)
+
+    sender_class = RoutingResultSender
+    if args.sender:
+        from plugin_registry import plugin_registry
+
+        sender_class = plugin_registry.get_sender_class(args.sender)
+        if sender_class is None:
+            parser.error(f"sender {args.sender} not found")
+    logging.basicConfig(level=logging.INFO)
+    simulator = PlantSimulator(
+        sender_class=sender_class,
+        pulses_per_fruit=args.pulses_per_fruit,
+        jitter=args.jitter_ms / 1000,
+        port=args.port,
+    )
+    result = simulator.sweep(args.rates, args.seconds, args.max_mis_sort_rate)
+    print(
+        f"{'fruit/s':>8} {'fruits':>7} {'late':>5} {'early':>5} {'grade':>5} "
+        f"{'missed':>6} {'mis-sort':>9}"
+    )
+    for run in result["runs"]:
+        print(
+            f"{run['fruit_per_second']:8.1f} {run.get('fruits', 0):7d} "
+            f"{run.get('late', 0):5d} {run.get('early', 0):5d} "
+            f"{run.get('wrong_grade', 0):5d} {run.get('missed', 0):6d} "
+            f"{run['mis_sort_rate']:9.4f}"
+        )
+    print(f"capacity: {result['capacity_fruit_per_second']} fruit/s")
+
+
+if __name__ == "__main__":
+    main()
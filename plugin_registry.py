@@ -0,0 +1,146 @@
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+
+logger = logging.getLogger("plugin_registry")
+
+RESULT_SENDER_PACKAGE = "result_sender"
+# 플러그인 패키지 없이 쓸 수 있는 내장 sender: 이름 -> `ResultSender`가 있는 모듈
+BUILTIN_SENDERS = {"routing_result_sender": "serial_router"}
+
+
+class PluginRegistry:
+    """
+    result_sender 플러그인 목록과 모듈/ResultSender 클래스를 캐시한다.
+
+    목록은 `result_sender.__all_senders__`와 importlib.util.find_spec으로 한 번만 만들고,
+    실제 모듈 import는 처음 필요할 때 한 번만 한다. 패키지 설치 이후에는 invalidate()를 호출한다.
+    BUILTIN_SENDERS의 내장 sender는 목록 앞에 오고 플러그인과 같은 방법으로 불러온다.
+    """
+
+    def __init__(self, package: str = RESULT_SENDER_PACKAGE, builtins=None):
+        self.package = package
+        self.builtins = dict(BUILTIN_SENDERS if builtins is None else builtins)
+        self._lock = threading.RLock()
+        self._available = {}  # 패키지 이름 -> find_spec 결과 (bool)
+        self._senders = None
+        self._modules = {}
+        self._import_times = {}
+        self._import_errors = {}
+
+    def _sender_module_name(self, sender_name: str) -> str:
+        if sender_name in self.builtins:
+            return self.builtins[sender_name]
+        return f"{self.package}.all_senders.{sender_name}"
+
+    def is_available(self, package_name: str) -> bool:
+        """패키지를 import 하지 않고 찾을 수 있는지만 확인합니다."""
+        with self._lock:
+            if package_name not in self._available:
+                try:
+                    found = importlib.util.find_spec(package_name) is not None
+                except (ImportError, ValueError):
+                    found = False
+                self._available[package_name] = found
+            return self._available[package_name]
+
+    def senders(self) -> list:
+        """내장 sender와 `__all_senders__`에 등록된 플러그인 중 찾을 수 있는 것만 반환"""
+        with self._lock:
+            if self._senders is None:
+                self._senders = [
+                    name
+                    for name in self.builtins
+                    if self.is_available(self._sender_module_name(name))
+                ]
+                if self.is_available(self.package):
+                    package_module = self._import(self.package)
+                    names = getattr(package_module, "__all_senders__", [])
+                    self._senders += [
+                        name
+                        for name in names
+                        if name not in self.builtins
+                        and self.is_available(self._sender_module_name(name))
+                    ]
+            return list(self._senders)
+
+    def _import(self, module_name: str):
+        if module_name in self._modules:
+            return self._modules[module_name]
+        if module_name in self._import_errors:
+            return None
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            # 플러그인 모듈의 어떤 오류(SyntaxError, 모듈 수준 코드 예외)도 그 플러그인만 뺀다
+            self._import_errors[module_name] = e
+            logger.exception(f"plugin import failed: {module_name}: {e}")
+            return None
+        finally:
+            self._import_times[module_name] = time.perf_counter() - start
+        logger.info(
+            f"plugin imported: {module_name} "
+            f"({self._import_times[module_name] * 1000:.1f}ms)"
+        )
+        self._modules[module_name] = module
+        return module
+
+    def get_module(self, sender_name: str):
+        """ResultSender가 있는 모듈을 반환합니다. 없으면 None"""
+        if not sender_name:
+            return None
+        module_name = self._sender_module_name(sender_name)
+        with self._lock:
+            if not self.is_available(module_name):
+                return None
+            return self._import(module_name)
+
+    def get_sender_class(self, sender_name: str):
+        module = self.get_module(sender_name)
+        return getattr(module, "ResultSender", None)
+
+    def reload(self, sender_name: str):
+        """이미 import 한 플러그인 모듈을 다시 불러옵니다 (sender 교체용)."""
+        if sender_name in self.builtins:
+            # 내장 sender는 프로그램과 같이 배포되므로 다시 불러오지 않는다
+            return self.get_module(sender_name)
+        module_name = self._sender_module_name(sender_name)
+        with self._lock:
+            module = self._modules.get(module_name)
+            if module is None:
+                self._import_errors.pop(module_name, None)
+                return self._import(module_name)
+            start = time.perf_counter()
+            try:
+                module = importlib.reload(module)
+            except Exception as e:
+                logger.exception(f"plugin reload failed: {module_name}: {e}")
+                return None
+            self._import_times[module_name] = time.perf_counter() - start
+            self._modules[module_name] = module
+            return module
+
+    def import_times(self) -> dict:
+        """지금까지 import 한 모듈별 import 시간(초)"""
+        with self._lock:
+            return dict(self._import_times)
+
+    def import_error(self, sender_name: str):
+        with self._lock:
+            return self._import_errors.get(self._sender_module_name(sender_name))
+
+    def invalidate(self):
+        """패키지 설치/업데이트 이후 캐시를 비웁니다."""
+        with self._lock:
+            importlib.invalidate_caches()
+            self._available.clear()
+            self._senders = None
+            self._modules.clear()
+            self._import_times.clear()
+            self._import_errors.clear()
+
+
+plugin_registry = PluginRegistry()
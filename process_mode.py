@@ -0,0 +1,334 @@
+"""
+프로세스 분리 실행 모드.
+
+    python process_mode.py                   # API 서버 / sender 프로세스 + 제어 소켓 실행
+    python server_config_app.py --client     # GUI는 제어 소켓에 붙는 client로 실행
+
+API 서버와 sender는 각자 프로세스에서 돌고 공유 메모리 ring(SharedRing)으로 결과를 주고받는다.
+GUI를 닫거나 다시 켜도 선별 작업은 계속된다.
+
+GUI가 설정을 저장하면 제어 소켓으로 "config_committed"를 보낸다. launcher는 공유 config version을
+올리고, API 서버 프로세스는 version이 바뀌면 config_store.reload()로 파일을 다시 읽는다
+(`/setting`, 라인 설정 push가 새 설정을 쓴다). sender 프로세스는 다시 띄울 때 설정을 읽는다.
+"""
+
+import collections
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+
+from control_channel import DEFAULT_CONTROL_PORT, ControlServer
+from metrics import metrics
+from sender_supervisor import SenderSupervisor
+from shm_ring import SharedRing
+
+logger = logging.getLogger("process_mode")
+
+DEFAULT_API_PORT = 8000
+
+
+def watch_config_version(config_version, stop_event=None, interval=0.5):
+    """공유 config version이 바뀔 때마다 config_store를 다시 읽습니다 (API 서버 프로세스)."""
+    from config_store import config_store
+
+    seen = config_version.value
+    while not (stop_event is not None and stop_event.is_set()):
+        time.sleep(interval)
+        version = config_version.value
+        if version == seen:
+            continue
+        seen = version
+        try:
+            changed = config_store.reload()
+        except Exception as e:
+            logger.error(f"config reload failed: {e}")
+            continue
+        logger.info(f"config reloaded ({len(changed)} fields changed)")
+
+
+def run_api_process(ring_name, log_queue, host, port, config_version):
+    """API 서버 프로세스 본체. 결과는 data_queue 대신 공유 ring으로 보낸다."""
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(logging.INFO)
+
+    import uvicorn
+
+    import server
+
+    server.data_queue = SharedRing.attach(ring_name)
+    threading.Thread(
+        target=watch_config_version,
+        args=(config_version,),
+        name="ConfigVersionWatch",
+        daemon=True,
+    ).start()
+    uvicorn.run(
+        server.app,
+        host=host,
+        port=port,
+        log_level="info",
+        ws_ping_interval=server.line_connections.ping_interval,
+        ws_ping_timeout=server.line_connections.ping_timeout,
+    )
+
+
+class ProcessLauncher:
+    """API 서버와 sender 프로세스를 띄우고 감시하며, 제어 소켓으로 상태/로그를 제공한다."""
+
+    def __init__(
+        self,
+        sender_name=None,
+        api_host="0.0.0.0",
+        api_port=DEFAULT_API_PORT,
+        control_port=DEFAULT_CONTROL_PORT,
+        ring_capacity=65536,
+        backoff_initial=0.1,
+        backoff_max=10.0,
+    ):
+        self.sender_name = sender_name
+        self.api_host = api_host
+        self.api_port = api_port
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.ring = SharedRing.create(capacity=ring_capacity)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._log_queue = self._context.Queue()
+        self._logs = collections.deque(maxlen=2000)
+        self._log_base = 0  # deque에서 밀려난 로그 수
+        self._logs_lock = threading.Lock()
+        self._shutdown = threading.Event()
+        # GUI가 설정을 저장할 때마다 올린다 (API 서버 프로세스가 보고 다시 읽는다)
+        self._config_version = self._context.Value("q", 0)
+
+        self.api_process = None
+        self.api_restarts = 0
+
+        self.sender_supervisor = SenderSupervisor(self.ring)
+        self.sender_supervisor.log_callbacks.append(self.append_log)
+        self.sender_supervisor.restart_callbacks.append(self._on_sender_restarted)
+
+        self.control_server = ControlServer(
+            {
+                "status": self.status,
+                "logs": self.read_logs,
+                "switch_sender": self.switch_sender,
+                "restart_sender": self.restart_sender,
+                "config_committed": self.config_committed,
+                "metrics": metrics.render,
+                "stop": self.stop,
+            },
+            port=control_port,
+        )
+
+    def append_log(self, message: str):
+        with self._logs_lock:
+            if len(self._logs) == self._logs.maxlen:
+                self._log_base += 1
+            self._logs.append(message)
+
+    def read_logs(self, since=0):
+        """since 이후의 로그와 다음 요청에 쓸 index를 반환"""
+        with self._logs_lock:
+            start = max(since - self._log_base, 0)
+            lines = list(self._logs)[start:]
+            return {"next": self._log_base + len(self._logs), "lines": lines}
+
+    def _forward_logs(self):
+        while not self._shutdown.is_set():
+            try:
+                record = self._log_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.append_log(f"[api] {record.getMessage()}")
+
+    def _on_sender_restarted(self, sender_name, reason, restart_seconds):
+        self.append_log(
+            f"**{sender_name} sender 재시작** ({reason}, {restart_seconds * 1000:.0f}ms)"
+        )
+
+    def _start_api(self):
+        self.api_process = self._context.Process(
+            target=run_api_process,
+            args=(
+                self.ring.name,
+                self._log_queue,
+                self.api_host,
+                self.api_port,
+                self._config_version,
+            ),
+            name="AiofarmApiServer",
+            daemon=True,
+        )
+        self.api_process.start()
+
+    def start(self):
+        if not self.sender_name:
+            from server_config_model import load_server_root_config
+
+            config = load_server_root_config().config
+            self.sender_name = config.serial_config.production_result_sender_module
+        threading.Thread(target=self._forward_logs, daemon=True).start()
+        self._start_api()
+        self.sender_supervisor.start(self.sender_name)
+        self.control_server.start()
+        self.append_log(
+            f"프로세스 분리 모드 시작: api pid {self.api_process.pid}, "
+            f"sender {self.sender_name}"
+        )
+
+    def run_forever(self):
+        """API 서버 프로세스를 감시하고 죽으면 backoff 후 다시 띄운다."""
+        backoff = self.backoff_initial
+        while not self._shutdown.wait(0.1):
+            metrics.set("result_ring_depth", self.ring.qsize())
+            metrics.set("result_ring_dropped", self.ring.dropped)
+            if self.api_process.is_alive():
+                continue
+            self.append_log(
+                f"**API 서버 종료 감지** (exit code {self.api_process.exitcode})"
+            )
+            if self._shutdown.wait(backoff):
+                break
+            self._start_api()
+            self.api_restarts += 1
+            metrics.inc("api_restarts_total")
+            backoff = min(backoff * 2, self.backoff_max)
+        self._cleanup()
+
+    def status(self):
+        return {
+            "api": {
+                "pid": self.api_process.pid if self.api_process else None,
+                "alive": bool(self.api_process and self.api_process.is_alive()),
+                "restarts": self.api_restarts,
+            },
+            "sender": {
+                "name": self.sender_supervisor.sender_name,
+                "alive": self.sender_supervisor.is_running,
+                "restarts": self.sender_supervisor.restart_count,
+                "last_restart_seconds": self.sender_supervisor.last_restart_seconds,
+            },
+            "ring": {
+                "depth": self.ring.qsize(),
+                "dropped": self.ring.dropped,
+                "capacity": self.ring.capacity,
+            },
+        }
+
+    def switch_sender(self, sender_name=None):
+        threading.Thread(
+            target=self.sender_supervisor.switch,
+            args=(sender_name or self.sender_name,),
+            daemon=True,
+        ).start()
+        self.sender_name = sender_name or self.sender_name
+        return self.sender_name
+
+    def restart_sender(self):
+        return self.switch_sender(self.sender_name)
+
+    def config_committed(self, version=None):
+        """GUI가 설정을 저장했다 (API 서버가 다시 읽도록 공유 version을 올린다)."""
+        with self._config_version.get_lock():
+            self._config_version.value += 1
+            shared_version = self._config_version.value
+        self.append_log(f"설정 저장 알림 (GUI version {version})")
+        return shared_version
+
+    def stop(self):
+        self._shutdown.set()
+        return True
+
+    def _cleanup(self):
+        self.control_server.stop()
+        self.sender_supervisor.stop()
+        if self.api_process is not None and self.api_process.is_alive():
+            self.api_process.terminate()
+            self.api_process.join(timeout=5)
+        self.ring.close()
+
+
+class RemoteSnapshot:
+    """
+    client 모드 GUI 패널에 API 서버의 JSON 상태를 넘겨주는 어댑터.
+
+    요청은 백그라운드 스레드가 interval마다 보내고, snapshot()은 마지막으로 받은 값을 바로
+    반환한다. 패널은 QTimer(GUI 스레드)에서 snapshot()을 부르므로 HTTP를 기다리면 안 된다.
+    """
+
+    path = ""
+
+    def __init__(
+        self,
+        api_url=f"http://127.0.0.1:{DEFAULT_API_PORT}",
+        timeout=0.5,
+        interval=0.5,
+    ):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.interval = interval
+        self._latest = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def snapshot(self) -> dict:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._poll, name=f"Remote{self.path}", daemon=True
+            )
+            self._thread.start()
+        return self._latest
+
+    def close(self):
+        self._stop.set()
+
+    def _poll(self):
+        import requests
+
+        while not self._stop.is_set():
+            try:
+                response = requests.get(
+                    f"{self.api_url}{self.path}", timeout=self.timeout
+                )
+                response.raise_for_status()
+                self._latest = self.parse(response.json())
+            except (requests.RequestException, ValueError):
+                self._latest = {}
+            self._stop.wait(self.interval)
+
+    def parse(self, data):
+        return data
+
+
+class RemoteStatistics(RemoteSnapshot):
+    """API 서버의 `/statistics`를 StatisticsPanel에 넘겨주는 어댑터"""
+
+    path = "/statistics"
+
+    def parse(self, data):
+        return {
+            int(line_idx): {int(window): stats for window, stats in windows.items()}
+            for line_idx, windows in data.items()
+        }
+
+
+class RemoteConveyor(RemoteSnapshot):
+    """API 서버의 `/conveyor`를 ConveyorPanel에 넘겨주는 어댑터"""
+
+    path = "/conveyor"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    launcher = ProcessLauncher()
+    launcher.start()
+    try:
+        launcher.run_forever()
+    except KeyboardInterrupt:
+        launcher.stop()
+        launcher._cleanup()
@@ -0,0 +1,142 @@
+"""
+운영 중 프로파일링용 debug route (sampling profiler, tracemalloc, @timed 구간 통계).
+
+    GET /debug/profile?seconds=10      sampling profiler, collapsed stack 파일 (flamegraph.pl, speedscope)
+    GET /debug/tracemalloc/start       tracemalloc 시작
+    GET /debug/tracemalloc/snapshot    할당 상위 목록, diff=true면 이전 snapshot과 비교
+    GET /debug/tracemalloc/stop
+    GET /debug/timings                 @timed 구간별 호출 수/백분위수
+
+debug route는 localhost에서 오거나 `X-Debug-Token` 헤더가 서버 시작 때 로그에 찍힌 token과
+같을 때만 응답한다.
+"""
+
+import collections
+import logging
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from tracing import timing_summary
+
+logger = logging.getLogger("profiling")
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+MAX_PROFILE_SECONDS = 120
+
+debug_token = secrets.token_hex(16)
+
+
+class SamplingProfiler:
+    """sys._current_frames()를 주기적으로 읽어 스레드별 stack을 세는 sampling profiler"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._running = threading.Lock()
+
+    def profile(self, seconds: float) -> str:
+        """seconds 동안 sample 해서 collapsed stack 텍스트("a;b;c count" 줄)를 반환합니다."""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("profiler already running")
+        try:
+            return self._collect(seconds)
+        finally:
+            self._running.release()
+
+    def _collect(self, seconds) -> str:
+        own_thread = threading.get_ident()
+        stacks = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            thread_names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+sampling_profiler = SamplingProfiler()
+_last_snapshot = None
+
+
+def require_debug_access(request: Request):
+    if request.client is not None and request.client.host in LOCAL_HOSTS:
+        return
+    if secrets.compare_digest(request.headers.get("x-debug-token", ""), debug_token):
+        return
+    raise HTTPException(status_code=403, detail="debug routes are local only")
+
+
+debug_router = APIRouter(prefix="/debug")
+
+
+@debug_router.get("/profile")
+def profile(request: Request, seconds: float = 10.0):
+    require_debug_access(request)
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    try:
+        collapsed = sampling_profiler.profile(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@debug_router.get("/tracemalloc/start")
+def start_tracemalloc(request: Request, frames: int = 25):
+    require_debug_access(request)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+
+@debug_router.get("/tracemalloc/stop")
+def stop_tracemalloc(request: Request):
+    global _last_snapshot
+    require_debug_access(request)
+    tracemalloc.stop()
+    _last_snapshot = None
+    return {"tracing": False}
+
+
+@debug_router.get("/tracemalloc/snapshot")
+def tracemalloc_snapshot(request: Request, diff: bool = False, limit: int = 30):
+    global _last_snapshot
+    require_debug_access(request)
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not started")
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+    if diff and _last_snapshot is not None:
+        stats = snapshot.compare_to(_last_snapshot, "lineno")
+    else:
+        stats = snapshot.statistics("lineno")
+    _last_snapshot = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"# traced {current} bytes (peak {peak})"]
+    lines += [str(stat) for stat in stats[:limit]]
+    return PlainTextResponse("\n".join(lines))
+
+
+@debug_router.get("/timings")
+def read_timings(request: Request):
+    require_debug_access(request)
+    return timing_summary()
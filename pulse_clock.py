@@ -0,0 +1,323 @@
+"""
+아두이노 encoder pulse 시계.
+
+프로덕션 스케치(report_pulses)가 pulse마다 보내는 (pulse 번호, micros) record를 받아
+pulse 번호 <-> PC wall time 변환식을 유지한다. 아두이노 수정 발진기와 PC 시계의 drift는
+최근 샘플의 선형 회귀로, 시리얼 지연은 회귀선의 하한(가장 빨리 도착한 샘플)으로 보정한다.
+"""
+
+import bisect
+import collections
+import logging
+import math
+import threading
+import time
+
+from binary_protocol import ENCODER_INPUT, pulse_record_codec
+from metrics import metrics
+from virtual_serial import open_serial_port
+
+logger = logging.getLogger("pulse_clock")
+
+metrics.describe("conveyor_pulse_rate", "초당 encoder pulse 수", kind="gauge")
+metrics.describe("conveyor_pulse_jitter_seconds", "pulse 간격 표준편차", kind="gauge")
+metrics.describe("pulse_clock_drift_ppm", "아두이노 시계 drift (ppm)", kind="gauge")
+metrics.describe("pulse_records_total", "수신한 pulse record 수")
+metrics.describe("pulse_clock_resets_total", "아두이노 reset으로 다시 시작한 횟수")
+
+UINT32_RANGE = 1 << 32
+# overflow를 풀어 이어 붙인 device 경과 시간이 PC 경과 시간과 이만큼(초 + 비율) 다르면 reset으로 본다
+RESET_SLACK = 1.0
+RESET_SLACK_RATIO = 0.01
+
+
+class PulseClock:
+    """
+    pulse 번호 -> wall time 변환 (drift 추정 포함).
+
+    add_sample()에 (pulse 번호, 아두이노 micros, 받은 시각)을 넣는다. micros/pulse 번호의
+    uint32 overflow는 내부에서 풀어서 이어 붙인다. 이어 붙인 device 시각이 PC 경과 시간과 맞지
+    않으면 아두이노가 reset된 것으로 보고 샘플을 비운 뒤 보드 번호 그대로 다시 시작한다.
+    """
+
+    def __init__(self, window=512, fit_interval=32):
+        self.window = window
+        self.fit_interval = fit_interval  # 샘플 몇 개마다 회귀를 다시 할지
+        self._samples = collections.deque(maxlen=window)  # (pulse, device_sec, host)
+        self._intervals = collections.deque(maxlen=window)  # pulse 1개당 device 초
+        self._interval_sum = 0.0
+        # tag_result가 결과마다 bisect 하는 정렬된 pulse/device 시각 (window~2*window개)
+        self._pulses = []
+        self._devices = []
+        self._lock = threading.Lock()
+        self._last_raw = None  # (count, timestamp_us) overflow 감지용
+        self._count_base = 0
+        self._time_base = 0
+        self._since_fit = 0
+        # host = offset + scale * device_sec
+        self.offset = None
+        self.scale = 1.0
+        self.total_samples = 0
+
+    def add_sample(self, count: int, timestamp_us: int, host_time: float = None):
+        host_time = time.time() if host_time is None else host_time
+        with self._lock:
+            if self._last_raw is not None:
+                last_count, last_us = self._last_raw
+                count_base, time_base = self._count_base, self._time_base
+                if count < last_count:
+                    count_base += UINT32_RANGE
+                if timestamp_us < last_us:
+                    time_base += UINT32_RANGE
+                if self._is_reset((time_base + timestamp_us) / 1e6, host_time):
+                    self._reset()
+                else:
+                    self._count_base, self._time_base = count_base, time_base
+            self._last_raw = (count, timestamp_us)
+            pulse = self._count_base + count
+            device_sec = (self._time_base + timestamp_us) / 1e6
+            if self._samples:
+                last_pulse, last_device, _ = self._samples[-1]
+                if pulse > last_pulse:
+                    self._add_interval(
+                        (device_sec - last_device) / (pulse - last_pulse)
+                    )
+            self._samples.append((pulse, device_sec, host_time))
+            self._pulses.append(pulse)
+            self._devices.append(device_sec)
+            if len(self._pulses) > 2 * self.window:
+                # 앞쪽을 한 번에 잘라내 append당 비용을 O(1)로 유지한다
+                del self._pulses[: -self.window]
+                del self._devices[: -self.window]
+            self.total_samples += 1
+            self._since_fit += 1
+            if self.offset is None or self._since_fit >= self.fit_interval:
+                self._fit()
+
+    def _is_reset(self, device_sec, host_time) -> bool:
+        _, last_device, last_host = self._samples[-1]
+        host_elapsed = host_time - last_host
+        slack = RESET_SLACK + RESET_SLACK_RATIO * abs(host_elapsed)
+        return abs((device_sec - last_device) - host_elapsed) > slack
+
+    def _reset(self):
+        self._samples.clear()
+        self._intervals.clear()
+        self._interval_sum = 0.0
+        self._pulses = []
+        self._devices = []
+        self._count_base = 0
+        self._time_base = 0
+        self._since_fit = 0
+        self.offset = None
+        self.scale = 1.0
+        metrics.inc("pulse_clock_resets_total")
+        logger.warning("pulse clock reset (아두이노 reset 또는 긴 공백)")
+
+    def _add_interval(self, interval: float):
+        if len(self._intervals) == self._intervals.maxlen:
+            self._interval_sum -= self._intervals[0]
+        self._intervals.append(interval)
+        self._interval_sum += interval
+
+    def _fit(self):
+        self._since_fit = 0
+        # 누적 합의 부동소수점 오차가 쌓이지 않도록 회귀할 때 다시 더한다
+        self._interval_sum = sum(self._intervals)
+        n = len(self._samples)
+        if n < 2:
+            _, device_sec, host_time = self._samples[-1]
+            self.offset = host_time - device_sec
+            return
+        # 숫자가 커지지 않도록 첫 샘플 기준으로 회귀한다
+        _, device_0, host_0 = self._samples[0]
+        xs = [device - device_0 for _, device, _ in self._samples]
+        ys = [host - host_0 for _, _, host in self._samples]
+        mean_x = sum(xs) / n
+        mean_y = sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x <= 0:
+            return
+        scale = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        intercept = mean_y - scale * mean_x
+        # 시리얼 지연은 항상 양수이므로 가장 빨리 도착한 샘플에 회귀선을 맞춘다
+        intercept += min(y - (intercept + scale * x) for x, y in zip(xs, ys))
+        self.scale = scale
+        self.offset = host_0 + intercept - scale * device_0
+
+    def device_to_wall(self, device_sec: float) -> float:
+        return self.offset + self.scale * device_sec
+
+    def wall_to_device(self, wall_time: float) -> float:
+        return (wall_time - self.offset) / self.scale
+
+    def pulse_time(self, pulse: int) -> float:
+        """pulse 번호가 들어온(들어올) wall time. 지난 pulse는 기록, 이후는 평균 간격으로 예측"""
+        with self._lock:
+            if self.offset is None:
+                raise LookupError("pulse sample 없음")
+            index = bisect.bisect_left(self._pulses, pulse)
+            if index < len(self._pulses) and self._pulses[index] == pulse:
+                return self.device_to_wall(self._devices[index])
+            last_pulse, last_device = self._pulses[-1], self._devices[-1]
+            device_sec = last_device + (pulse - last_pulse) * self._mean_interval()
+            return self.device_to_wall(device_sec)
+
+    def pulse_at(self, wall_time: float) -> int:
+        """wall_time 시점에 마지막으로 들어온 pulse 번호"""
+        with self._lock:
+            if self.offset is None:
+                raise LookupError("pulse sample 없음")
+            device_sec = self.wall_to_device(wall_time)
+            index = bisect.bisect_right(self._devices, device_sec)
+            if 0 < index < len(self._devices):
+                return self._pulses[index - 1]
+            edge = -1 if index else 0
+            last_pulse, last_device = self._pulses[edge], self._devices[edge]
+            interval = self._mean_interval()
+            if interval <= 0:
+                return last_pulse
+            return last_pulse + math.floor((device_sec - last_device) / interval)
+
+    def _mean_interval(self) -> float:
+        if not self._intervals:
+            return 0.0
+        return self._interval_sum / len(self._intervals)
+
+    def tag_result(self, result: dict):
+        """
+        결과가 속한 pulse 번호와 그 pulse의 wall time을 결과에 붙입니다 (server.result_taggers).
+
+        라인 시계가 동기화되어 있으면(sent_at_server) 라인에서 보낸 시각, 아니면 받은 시각 기준
+        """
+        if self.offset is None:
+            return
+        when = result.get("sent_at_server", result.get("received_at", time.time()))
+        pulse = self.pulse_at(when)
+        result["pulse"] = pulse
+        result["pulse_time"] = self.pulse_time(pulse)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            intervals = list(self._intervals)
+            offset = self.offset
+            scale = self.scale
+            latency = None
+            if offset is not None and self._samples:
+                latency = sum(
+                    host - (offset + scale * device)
+                    for _, device, host in self._samples
+                ) / len(self._samples)
+        if intervals:
+            mean = sum(intervals) / len(intervals)
+            jitter = math.sqrt(sum((i - mean) ** 2 for i in intervals) / len(intervals))
+        else:
+            mean = jitter = 0.0
+        return {
+            "pulses": self.total_samples,
+            "rate": 1 / mean if mean > 0 else 0.0,
+            "interval_mean": mean,
+            "jitter": jitter,
+            "drift_ppm": (1 / scale - 1) * 1e6,  # +면 아두이노 시계가 빠름
+            "latency": latency,
+        }
+
+
+class PulseCapture(threading.Thread):
+    """
+    입력 채널 포트에서 PulseRecord를 읽어 PulseClock에 넣는 스레드.
+
+    결과 출력과 같은 USB 포트를 쓰는 경우 serial_port로 이미 열린 포트 객체를 넘긴다
+    (Windows는 같은 COM 포트를 두 번 열 수 없다).
+    encoder가 아닌 record(pin 동작 보고 등)는 clock에 넣지 않고 event_callbacks에 있는
+    callback(record, host_time)을 부른다.
+    """
+
+    def __init__(
+        self, clock, port=None, baudrate=115200, serial_port=None, timeout=0.1
+    ):
+        super().__init__(name=f"PulseCapture-{port}", daemon=True)
+        self.clock = clock
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self._serial = serial_port
+        self._owns_serial = serial_port is None
+        self._stop_event = threading.Event()
+        self.event_callbacks = []
+
+    def run(self):
+        if self._serial is None:
+            self._serial = open_serial_port(self.port, self.baudrate, self.timeout)
+        buffer = b""
+        last_report = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                data = self._serial.read(max(1, self._serial.in_waiting))
+                if not data:
+                    continue
+                host_time = time.time()
+                records, buffer = pulse_record_codec.decode_buffer(buffer + data)
+                for record in records:
+                    if record["input"] == ENCODER_INPUT:
+                        self.clock.add_sample(
+                            record["count"], record["timestamp_us"], host_time
+                        )
+                    else:
+                        self._dispatch(record, host_time)
+                metrics.inc("pulse_records_total", len(records))
+                if time.monotonic() - last_report >= 1.0:
+                    last_report = time.monotonic()
+                    self._report_metrics()
+        except Exception as e:
+            logger.error(f"pulse capture 중단 ({self.port}): {e}")
+        finally:
+            if self._owns_serial:
+                self._serial.close()
+
+    def _dispatch(self, record, host_time):
+        for callback in list(self.event_callbacks):
+            try:
+                callback(record, host_time)
+            except Exception as e:
+                logger.error(f"pulse event callback {callback} failed: {e}")
+
+    def _report_metrics(self):
+        snapshot = self.clock.snapshot()
+        metrics.set("conveyor_pulse_rate", snapshot["rate"])
+        metrics.set("conveyor_pulse_jitter_seconds", snapshot["jitter"])
+        metrics.set("pulse_clock_drift_ppm", snapshot["drift_ppm"])
+
+    def stop(self):
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    # 가상 포트로 50ppm 빠른 아두이노 시계와 지터가 있는 10Hz encoder를 흉내 낸다
+    import random
+
+    from virtual_serial import get_virtual_port
+
+    clock = PulseClock()
+    port = get_virtual_port("virtual://pulse_demo", 115200, timeout=0.1)
+    capture = PulseCapture(clock, port="virtual://pulse_demo", serial_port=port)
+    capture.start()
+    start = time.time()
+    device_us = 0
+    for count in range(1, 301):
+        device_us += int(random.gauss(100_000, 2_000) * (1 + 50e-6))
+        time.sleep(max(0.0, start + device_us / 1e6 / (1 + 50e-6) - time.time()))
+        time.sleep(random.uniform(0, 0.004))  # USB 지연
+        port.inject(pulse_record_codec.encode(0, count, device_us % UINT32_RANGE))
+    time.sleep(0.2)
+    capture.stop()
+    snapshot = clock.snapshot()
+    print(
+        f"rate {snapshot['rate']:.2f}/s, jitter {snapshot['jitter'] * 1000:.2f}ms, "
+        f"drift {snapshot['drift_ppm']:.0f}ppm, latency {snapshot['latency'] * 1000:.2f}ms"
+    )
+    now = time.time()
+    pulse = clock.pulse_at(now)
+    print(
+        f"pulse_at(now)={pulse}, pulse_time error {(clock.pulse_time(pulse) - now) * 1000:.1f}ms"
+    )
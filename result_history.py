@@ -0,0 +1,401 @@
+import datetime
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from metrics import metrics
+
+logger = logging.getLogger("result_history")
+
+metrics.describe(
+    "result_history_dropped_total", "이력 writer queue가 가득 차서 버린 결과 수"
+)
+metrics.describe(
+    "result_history_pruned_segments_total", "보관 기간/용량을 넘어 지운 세그먼트 수"
+)
+
+# 결과 한 건당 저장하는 컬럼과 dtype
+HISTORY_COLUMNS = {
+    "timestamp": np.float64,
+    "line_idx": np.int16,
+    "grade": np.int16,
+    "output": np.int16,
+    "latency": np.float32,
+}
+
+DEFAULT_HISTORY_DIR = os.path.expanduser("~/aiofarm_result_history")
+SEGMENT_GROW_ROWS = 1 << 16  # 세그먼트 파일을 늘릴 때 한 번에 확보하는 row 수
+DEFAULT_RETENTION_HOURS = 7 * 24
+DEFAULT_MAX_BYTES = 2 << 30
+
+
+def segment_key(timestamp: float) -> str:
+    """timestamp가 속한 1시간 단위 세그먼트 이름 (YYYYMMDD_HH)"""
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H")
+
+
+class _Segment:
+    """1시간 분량의 컬럼 파일 묶음. 컬럼마다 memmap 파일 하나와 row 수를 기록하는 count 파일을 가진다."""
+
+    def __init__(self, path: str, writable: bool):
+        self.path = path
+        self.writable = writable
+        self.columns = {}
+        self.capacity = 0
+        if writable:
+            os.makedirs(path, exist_ok=True)
+        count_path = os.path.join(path, "count.bin")
+        if writable and not os.path.exists(count_path):
+            np.zeros(1, dtype=np.int64).tofile(count_path)
+        self._count = np.memmap(
+            count_path, dtype=np.int64, mode="r+" if writable else "r", shape=(1,)
+        )
+        self._map_columns(self.count)
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _map_columns(self, min_rows: int):
+        if self.writable:
+            capacity = max(self.capacity, SEGMENT_GROW_ROWS)
+            while capacity < min_rows:
+                capacity *= 2
+            for name, dtype in HISTORY_COLUMNS.items():
+                column_path = self._column_path(name)
+                size = capacity * np.dtype(dtype).itemsize
+                with open(column_path, "ab") as f:
+                    if f.tell() < size:
+                        f.truncate(size)
+                self.columns[name] = np.memmap(
+                    column_path, dtype=dtype, mode="r+", shape=(capacity,)
+                )
+            self.capacity = capacity
+            return
+
+        self.capacity = min_rows
+        for name, dtype in HISTORY_COLUMNS.items():
+            if min_rows == 0:
+                self.columns[name] = np.empty(0, dtype=dtype)
+                continue
+            self.columns[name] = np.memmap(
+                self._column_path(name), dtype=dtype, mode="r", shape=(min_rows,)
+            )
+
+    def append(self, timestamp, line_idx, grade, output, latency):
+        row = self.count
+        if row >= self.capacity:
+            self.flush()
+            self._map_columns(row + 1)
+        self.columns["timestamp"][row] = timestamp
+        self.columns["line_idx"][row] = line_idx
+        self.columns["grade"][row] = grade
+        self.columns["output"][row] = output
+        self.columns["latency"][row] = latency
+        # count는 값을 모두 쓴 뒤에 올려야 reader가 반쯤 쓴 row를 보지 않는다
+        self._count[0] = row + 1
+
+    def view(self, rows: int = None) -> dict:
+        rows = self.count if rows is None else rows
+        return {name: column[:rows] for name, column in self.columns.items()}
+
+    def flush(self):
+        if not self.writable:
+            return
+        for column in self.columns.values():
+            column.flush()
+        self._count.flush()
+
+
+class ResultHistoryStore:
+    """
+    분류 결과를 컬럼 단위 memmap 파일로 쌓고, 라인별 통계를 numpy 벡터 연산으로 계산한다.
+
+    root_dir/YYYYMMDD_HH/ 아래에 컬럼별 파일이 생기며 시간이 바뀌면 새 세그먼트로 넘어간다.
+    세그먼트를 새로 열 때 retention_hours보다 오래됐거나 합계가 max_bytes를 넘는 오래된
+    세그먼트를 지운다.
+
+    result sink(append_result)로 받은 결과는 bounded queue를 거쳐 writer 스레드가 쓴다. 결과를
+    넣는 쪽(asyncio loop)은 memmap 쓰기/flush를 기다리지 않고, queue가 가득 차면 버린 개수만 센다.
+    """
+
+    def __init__(
+        self,
+        root_dir: str = DEFAULT_HISTORY_DIR,
+        flush_interval=1.0,
+        retention_hours=DEFAULT_RETENTION_HOURS,
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_queue_size=100000,
+    ):
+        self.root_dir = root_dir
+        self.flush_interval = flush_interval
+        self.retention_hours = retention_hours
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_key = None
+        self._last_flush = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def append(self, timestamp, line_idx, grade, output=-1, latency=0.0):
+        key = segment_key(timestamp)
+        with self._lock:
+            if key != self._segment_key:
+                self._roll(key)
+            self._segment.append(timestamp, line_idx, grade, output, latency)
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._segment.flush()
+                self._last_flush = now
+
+    def append_result(self, result: dict):
+        """data_queue로 보내는 결과 dict를 writer 스레드에 넘긴다 (result sink)"""
+        timestamp = result.get("received_at") or time.time()
+        sent_at = result.get("sent_at")
+        latency = timestamp - sent_at if sent_at else 0.0
+        row = (
+            timestamp,
+            result.get("line_idx", -1),
+            result.get("grade", result.get("count_flag", 0)),
+            result.get("output", result.get("line_idx", -1)),
+            latency,
+        )
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("result_history_dropped_total")
+
+    __call__ = append_result
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._run_writer, name="ResultHistoryWriter", daemon=True
+                )
+                self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            try:
+                row = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if row is None:
+                break
+            try:
+                self.append(*row)
+            except Exception as e:
+                logger.error(f"result history append failed: {e}")
+
+    def _roll(self, key: str):
+        if self._segment is not None:
+            self._segment.flush()
+        self._segment = _Segment(os.path.join(self.root_dir, key), writable=True)
+        self._segment_key = key
+        self._prune()
+
+    def _prune(self):
+        """보관 기간이 지났거나 용량을 넘는 오래된 세그먼트를 지운다 (지금 세그먼트는 남긴다)"""
+        keys = sorted(
+            name
+            for name in os.listdir(self.root_dir)
+            if name != self._segment_key
+            and os.path.isdir(os.path.join(self.root_dir, name))
+        )
+        expired = []
+        if self.retention_hours is not None:
+            cutoff = segment_key(time.time() - self.retention_hours * 3600)
+            expired = [key for key in keys if key < cutoff]
+            keys = keys[len(expired) :]
+        if self.max_bytes is not None:
+            sizes = {key: self._segment_bytes(key) for key in keys}
+            total = sum(sizes.values()) + self._segment_bytes(self._segment_key)
+            while keys and total > self.max_bytes:
+                key = keys.pop(0)
+                total -= sizes[key]
+                expired.append(key)
+        for key in expired:
+            shutil.rmtree(os.path.join(self.root_dir, key), ignore_errors=True)
+            metrics.inc("result_history_pruned_segments_total")
+            logger.info(f"result history segment removed: {key}")
+
+    def _segment_bytes(self, key: str) -> int:
+        path = os.path.join(self.root_dir, key)
+        return sum(
+            os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+        )
+
+    def flush(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+
+    def close(self):
+        """queue에 남은 결과까지 쓰고 writer 스레드를 멈춥니다."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout=5)
+        self.flush()
+        with self._lock:
+            self._segment = None
+            self._segment_key = None
+
+    # ---- 조회 ----
+
+    def _segment_keys(self, start: float, end: float):
+        hour = datetime.datetime.fromtimestamp(start).replace(
+            minute=0, second=0, microsecond=0
+        )
+        last = datetime.datetime.fromtimestamp(end)
+        while hour <= last:
+            yield hour.strftime("%Y%m%d_%H")
+            hour += datetime.timedelta(hours=1)
+
+    def load(self, start: float, end: float = None) -> dict:
+        """[start, end) 구간의 컬럼 배열을 반환한다. 각 값은 numpy 배열."""
+        end = time.time() if end is None else end
+        parts = {name: [] for name in HISTORY_COLUMNS}
+        for key in self._segment_keys(start, end):
+            with self._lock:
+                if key == self._segment_key:
+                    columns = self._segment.view()
+                    columns = {name: np.array(col) for name, col in columns.items()}
+                else:
+                    columns = None
+            if columns is None:
+                path = os.path.join(self.root_dir, key)
+                if not os.path.exists(os.path.join(path, "count.bin")):
+                    continue
+                columns = _Segment(path, writable=False).view()
+            timestamps = columns["timestamp"]
+            # 세그먼트 안에서는 시간순으로 쌓이므로 searchsorted로 범위를 자른다
+            lo = np.searchsorted(timestamps, start, side="left")
+            hi = np.searchsorted(timestamps, end, side="left")
+            for name in HISTORY_COLUMNS:
+                parts[name].append(columns[name][lo:hi])
+        return {
+            name: (
+                np.concatenate(chunks)
+                if chunks
+                else np.empty(0, dtype=HISTORY_COLUMNS[name])
+            )
+            for name, chunks in parts.items()
+        }
+
+    def grade_histogram(self, start: float, end: float = None) -> dict:
+        """라인별 등급 개수. {line_idx: np.ndarray(grade 개수)}"""
+        data = self.load(start, end)
+        lines = data["line_idx"].astype(np.int64)
+        grades = data["grade"].astype(np.int64)
+        if lines.size == 0:
+            return {}
+        valid = (lines >= 0) & (grades >= 0)
+        lines, grades = lines[valid], grades[valid]
+        if lines.size == 0:
+            return {}
+        grade_count = int(grades.max()) + 1
+        line_count = int(lines.max()) + 1
+        counts = np.bincount(
+            lines * grade_count + grades, minlength=line_count * grade_count
+        ).reshape(line_count, grade_count)
+        return {
+            int(line_idx): counts[line_idx] for line_idx in np.unique(lines).tolist()
+        }
+
+    def throughput(self, start: float, end: float = None, bucket_seconds=60.0):
+        """
+        라인별 처리량 곡선.
+
+        (bucket 시작 시각 배열, {line_idx: 초당 개수 배열}) 을 반환한다.
+        """
+        end = time.time() if end is None else end
+        data = self.load(start, end)
+        bucket_count = max(1, int(np.ceil((end - start) / bucket_seconds)))
+        edges = start + np.arange(bucket_count) * bucket_seconds
+        lines = data["line_idx"].astype(np.int64)
+        if lines.size == 0:
+            return edges, {}
+        buckets = ((data["timestamp"] - start) // bucket_seconds).astype(np.int64)
+        buckets = np.clip(buckets, 0, bucket_count - 1)
+        line_count = int(lines.max()) + 1
+        valid = lines >= 0
+        counts = np.bincount(
+            lines[valid] * bucket_count + buckets[valid],
+            minlength=line_count * bucket_count,
+        ).reshape(line_count, bucket_count)
+        rates = counts / bucket_seconds
+        return edges, {
+            int(line_idx): rates[line_idx]
+            for line_idx in np.unique(lines[valid]).tolist()
+        }
+
+    def latency_percentiles(
+        self, start: float, end: float = None, percentiles=(50, 90, 99)
+    ) -> dict:
+        """라인별 latency 백분위수(초). {line_idx: {p: value}}"""
+        data = self.load(start, end)
+        lines = data["line_idx"]
+        if lines.size == 0:
+            return {}
+        order = np.argsort(lines, kind="stable")
+        sorted_lines = lines[order]
+        sorted_latency = data["latency"][order]
+        unique_lines, first_idx = np.unique(sorted_lines, return_index=True)
+        groups = np.split(sorted_latency, first_idx[1:])
+        return {
+            int(line_idx): dict(
+                zip(percentiles, np.percentile(group, percentiles).tolist())
+            )
+            for line_idx, group in zip(unique_lines.tolist(), groups)
+            if line_idx >= 0
+        }
+
+
+if __name__ == "__main__":
+    # 하루치(8라인, 초당 40개) 데이터를 쌓고 조회 시간을 측정한다
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ResultHistoryStore(tmp_dir)
+        day_start = time.time() - 24 * 3600
+        rows = 24 * 3600 * 40
+        rng = np.random.default_rng(0)
+        timestamps = day_start + np.sort(rng.uniform(0, 24 * 3600, rows))
+        line_values = rng.integers(0, 8, rows)
+        grade_values = rng.integers(0, 6, rows)
+        latency_values = rng.gamma(2.0, 0.01, rows)
+        write_start = time.perf_counter()
+        for ts, line_idx, grade, latency in zip(
+            timestamps.tolist(),
+            line_values.tolist(),
+            grade_values.tolist(),
+            latency_values.tolist(),
+        ):
+            store.append(ts, line_idx, grade, line_idx, latency)
+        store.flush()
+        print(f"append {rows} rows: {time.perf_counter() - write_start:.2f}s")
+
+        query_start = time.perf_counter()
+        store.grade_histogram(day_start)
+        store.throughput(day_start, bucket_seconds=300)
+        store.latency_percentiles(day_start)
+        print(f"full day queries: {(time.perf_counter() - query_start) * 1000:.1f}ms")
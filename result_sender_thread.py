@@ -1,12 +1,15 @@
-from enum import Enum
-import importlib
-import sys
-import time
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QVBoxLayout, QWidget
-from PyQt5.QtCore import QThread, pyqtSignal
 import logging
+import sys
+from enum import Enum
 from queue import Queue
-from server_config_model import RootConfig, ServerConfig, load_server_root_config
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QVBoxLayout, QWidget
+from server_config_model import RootConfig, ServerConfig
+
+from config_store import config_store
+from plugin_registry import plugin_registry
+from sender_host import SenderHost
 
 
 class QTextEditHandler(logging.Handler):
@@ -18,47 +21,71 @@ class QTextEditHandler(logging.Handler):
         log_entry = self.format(record)
         self.log_signal.emit(log_entry)
 
+
 class NeedPackageEnum(str, Enum):
     ResultSender = "result_sender"
     LocalServer = "local_server"
-    
+
+
 class ResultSenderThread(QThread):
     # 로그 업데이트 시그널
     log_signal = pyqtSignal(str)
 
-    def __init__(self, result_data_queue: Queue) -> None:
+    def __init__(
+        self,
+        result_data_queue: Queue,
+        sender_host: SenderHost = None,
+        result_sender_name: str = None,
+        reload: bool = False,
+    ) -> None:
         super().__init__()
         self.result_data_queue = result_data_queue
+        # sender_host를 넘겨받으면 기존 sender를 결과 손실 없이 교체한다
+        self.sender_host = sender_host or SenderHost(result_data_queue)
+        self.result_sender_name = result_sender_name
+        self.reload = reload
         self.logger = None
+
     def is_package_importable(self, package_name):
-        try:
-            importlib.import_module(package_name)
-            return True
-        except ImportError:
-            return False
+        return plugin_registry.is_available(package_name)
 
     def run(self):
-        root_config: RootConfig = load_server_root_config()
-        config: ServerConfig = root_config.config
-        result_sender_name = config.serial_config.production_result_sender_module
-        
-        target_module = f"{NeedPackageEnum.ResultSender.value}.all_senders.{result_sender_name}"
-        
-        if not self.is_package_importable(target_module):
+        try:
+            self.start_sender()
+        except Exception as e:
+            # 예외로 스레드가 조용히 끝나지 않도록 로그 창에 남긴다
+            self.log_signal.emit(f"**ResultSender 시작 실패**: {e}")
+            raise
+
+    def start_sender(self):
+        result_sender_name = self.result_sender_name
+        if not result_sender_name:
+            root_config: RootConfig = config_store.get()
+            config: ServerConfig = root_config.config
+            result_sender_name = config.serial_config.production_result_sender_module
+
+        if self.reload:
+            plugin_registry.reload(result_sender_name)
+        result_sender_class = plugin_registry.get_sender_class(result_sender_name)
+        if result_sender_class is None:
             raise ImportError("모듈 없는데요")
-        result_sender_module = importlib.import_module(target_module)
-        result_sender_class = getattr(result_sender_module, 'ResultSender')
-        
-        
-        result_sender = result_sender_class(result_data_queue=self.result_data_queue)
-        print(result_sender.name, 'result_sender.name')
+
+        report = self.sender_host.swap(result_sender_class)
+        result_sender = self.sender_host.sender
         self.logger = logging.getLogger(f"{result_sender.name}")
-        
+
+        # 교체할 때마다 handler가 쌓이지 않도록 이전 스레드의 handler는 뺀다
+        for handler in list(self.logger.handlers):
+            if isinstance(handler, QTextEditHandler):
+                self.logger.removeHandler(handler)
         text_edit_handler = QTextEditHandler(self.log_signal)
-        text_edit_handler.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(message)s'))
+        text_edit_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(threadName)s - %(message)s")
+        )
         self.logger.addHandler(text_edit_handler)
-        result_sender.start()
-            
+        self.log_signal.emit(str(report))
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -82,6 +109,7 @@ class MainWindow(QMainWindow):
         # QTextEdit에 로그 추가
         self.text_edit.append(log_message)
 
+
 if __name__ == "__main__":
     qt_app = QApplication(sys.argv)
     window = MainWindow()
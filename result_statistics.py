@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+# 통계 window(초). 화면/API에서 이 순서대로 보여준다
+STATISTICS_WINDOWS = (10, 60, 900)
+
+
+class RollingStatistics:
+    """
+    라인별 rolling window 통계 (과일 수, 등급 분포, 도착 간격).
+
+    bucket_seconds 단위의 고정 크기 ring 배열에 누적하므로 이벤트마다 메모리를 새로 잡지 않는다.
+    ring의 각 칸에는 해당 bucket 번호를 같이 기록해 두고, 번호가 다르면 오래된 칸으로 보고 비운다.
+    """
+
+    def __init__(
+        self,
+        max_lines=32,
+        max_grades=16,
+        bucket_seconds=1.0,
+        windows=STATISTICS_WINDOWS,
+    ):
+        self.max_lines = max_lines
+        self.max_grades = max_grades
+        self.bucket_seconds = bucket_seconds
+        self.windows = tuple(windows)
+        self.bucket_count = int(math.ceil(max(self.windows) / bucket_seconds)) + 1
+        shape = (max_lines, self.bucket_count)
+        self._bucket_ids = np.full(shape, -1, dtype=np.int64)
+        self._counts = np.zeros(shape, dtype=np.int64)
+        self._grades = np.zeros(shape + (max_grades,), dtype=np.int64)
+        self._gap_sum = np.zeros(shape, dtype=np.float64)
+        self._gap_sq_sum = np.zeros(shape, dtype=np.float64)
+        self._gap_count = np.zeros(shape, dtype=np.int64)
+        self._last_arrival = np.zeros(max_lines, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def record(self, line_idx: int, grade: int, timestamp: float = None):
+        if not 0 <= line_idx < self.max_lines:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        bucket = int(timestamp // self.bucket_seconds)
+        slot = bucket % self.bucket_count
+        grade = min(max(int(grade), 0), self.max_grades - 1)
+        with self._lock:
+            if self._bucket_ids[line_idx, slot] != bucket:
+                self._bucket_ids[line_idx, slot] = bucket
+                self._counts[line_idx, slot] = 0
+                self._grades[line_idx, slot].fill(0)
+                self._gap_sum[line_idx, slot] = 0.0
+                self._gap_sq_sum[line_idx, slot] = 0.0
+                self._gap_count[line_idx, slot] = 0
+            self._counts[line_idx, slot] += 1
+            self._grades[line_idx, slot, grade] += 1
+            last_arrival = self._last_arrival[line_idx]
+            if last_arrival > 0.0:
+                gap = timestamp - last_arrival
+                self._gap_sum[line_idx, slot] += gap
+                self._gap_sq_sum[line_idx, slot] += gap * gap
+                self._gap_count[line_idx, slot] += 1
+            self._last_arrival[line_idx] = timestamp
+
+    def record_result(self, result: dict):
+        """dispatch_result에 등록하는 result sink"""
+        self.record(
+            result.get("line_idx", -1),
+            result.get("grade", result.get("count_flag", 0)),
+            result.get("received_at"),
+        )
+
+    __call__ = record_result
+
+    def snapshot(self, now: float = None) -> dict:
+        """
+        {line_idx: {window: {...}}} 형태로 현재 통계를 반환한다.
+
+        window 값에는 count, rate(개/초), grades(등급별 개수), gap_mean, gap_std가 들어간다.
+        """
+        now = time.time() if now is None else now
+        current_bucket = int(now // self.bucket_seconds)
+        with self._lock:
+            bucket_ids = self._bucket_ids.copy()
+            counts = self._counts.copy()
+            grades = self._grades.copy()
+            gap_sum = self._gap_sum.copy()
+            gap_sq_sum = self._gap_sq_sum.copy()
+            gap_count = self._gap_count.copy()
+
+        active_lines = np.flatnonzero((bucket_ids >= 0).any(axis=1))
+        snapshot = {int(line_idx): {} for line_idx in active_lines}
+        for window in self.windows:
+            window_buckets = int(math.ceil(window / self.bucket_seconds))
+            mask = (bucket_ids > current_bucket - window_buckets) & (
+                bucket_ids <= current_bucket
+            )
+            window_counts = (counts * mask).sum(axis=1)
+            window_grades = (grades * mask[:, :, None]).sum(axis=1)
+            window_gap_count = (gap_count * mask).sum(axis=1)
+            window_gap_sum = (gap_sum * mask).sum(axis=1)
+            window_gap_sq_sum = (gap_sq_sum * mask).sum(axis=1)
+            safe_count = np.maximum(window_gap_count, 1)
+            gap_mean = window_gap_sum / safe_count
+            gap_var = np.maximum(window_gap_sq_sum / safe_count - gap_mean**2, 0.0)
+            for line_idx in active_lines:
+                snapshot[int(line_idx)][window] = {
+                    "count": int(window_counts[line_idx]),
+                    "rate": float(window_counts[line_idx]) / window,
+                    "grades": window_grades[line_idx].tolist(),
+                    "gap_mean": float(gap_mean[line_idx]),
+                    "gap_std": float(np.sqrt(gap_var[line_idx])),
+                }
+        return snapshot
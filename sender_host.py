@@ -0,0 +1,189 @@
+import logging
+import queue
+import threading
+import time
+
+from ingest import requeue
+from metrics import metrics
+from tracing import traced_queue
+
+logger = logging.getLogger("sender_host")
+
+metrics.describe("sender_switchovers_total", "ResultSender 교체 횟수")
+metrics.describe(
+    "sender_switchover_seconds", "마지막 ResultSender 교체에 걸린 시간", kind="gauge"
+)
+metrics.describe("sender_handover_results", "교체 시 넘겨준 결과 수", kind="gauge")
+
+
+class SwitchoverReport:
+    def __init__(self, sender_name, handed_over, drain_seconds, switch_seconds):
+        self.sender_name = sender_name
+        self.handed_over = handed_over  # 이전 sender queue에서 새 sender로 옮긴 결과 수
+        self.drain_seconds = drain_seconds  # watermark까지 기다린 시간
+        self.switch_seconds = switch_seconds  # pump를 멈춘 순간부터 새 sender 시작까지
+
+    def __str__(self):
+        return (
+            f"{self.sender_name} 전환 완료: {self.switch_seconds * 1000:.1f}ms "
+            f"(drain {self.drain_seconds * 1000:.1f}ms, 인계 {self.handed_over}건)"
+        )
+
+
+class SenderHost:
+    """
+    공유 data_queue와 실제 ResultSender 사이에서 sender를 교체해 주는 host.
+
+    pump 스레드가 data_queue의 결과를 현재 sender 전용 queue로 옮긴다.
+    교체할 때는 pump를 잠시 멈추고(그 동안 결과는 data_queue에 쌓인다), 이전 sender가
+    watermark까지 처리하기를 기다린 다음, 남은 결과를 새 sender queue로 순서대로 넘기고 전환한다.
+    이전 sender가 stop_timeout 안에 끝나지 않으면 두 sender가 같이 쓰지 않도록 교체하지 않는다.
+    """
+
+    def __init__(
+        self,
+        result_data_queue,
+        watermark=0,
+        drain_timeout=2.0,
+        stop_timeout=10.0,
+        sender_queue_size=256,
+    ):
+        self.result_data_queue = result_data_queue
+        # sender queue를 작게 두어 밀린 결과는 data_queue(라인별 공정성, overflow policy)에 쌓이게 한다
+        self.sender_queue_size = sender_queue_size
+        self.watermark = watermark
+        self.drain_timeout = drain_timeout
+        self.stop_timeout = stop_timeout  # 이전 sender 스레드가 끝나기를 기다리는 시간
+        self.sender = None
+        self.sender_queue = None
+        self.sender_name = None
+        self._swap_lock = threading.Lock()  # pump가 옮기는 동안에는 교체하지 않는다
+        self._stop_event = threading.Event()
+        self._pump_thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._pump_thread is not None and self._pump_thread.is_alive()
+
+    def start_pump(self):
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._pump_thread = threading.Thread(
+            target=self._pump, name="SenderHostPump", daemon=True
+        )
+        self._pump_thread.start()
+
+    def _pump(self):
+        result = None
+        while not self._stop_event.is_set():
+            if result is None:
+                try:
+                    result = self.result_data_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            # sender queue가 가득 차면 lock을 놓고 다시 시도한다 (그 사이 교체할 수 있게)
+            with self._swap_lock:
+                try:
+                    self.sender_queue.put(result, timeout=0.1)
+                except queue.Full:
+                    continue
+            result = None
+        if result is not None:
+            requeue(self.result_data_queue, [result])
+
+    def swap(self, sender_class, watermark=None) -> SwitchoverReport:
+        """sender_class로 새 sender를 만들고 결과 손실 없이 교체합니다."""
+        watermark = self.watermark if watermark is None else watermark
+        new_queue = queue.Queue(maxsize=self.sender_queue_size)
+        new_sender = sender_class(
+            result_data_queue=traced_queue(sender_class, new_queue)
+        )
+        sender_name = getattr(new_sender, "name", sender_class.__name__)
+
+        with self._swap_lock:
+            switch_start = time.perf_counter()
+            drain_seconds = 0.0
+            handed_over = 0
+            if self.sender is not None:
+                drain_seconds = self._drain(watermark)
+                if not self._stop_sender(self.sender, self.stop_timeout):
+                    # 결과는 이전 sender queue에 남아 있으므로 다시 교체하면 넘어간다
+                    raise RuntimeError(
+                        f"{self.sender_name} sender가 {self.stop_timeout}s 안에 "
+                        "끝나지 않아 교체하지 않았습니다."
+                    )
+                handed_over = self._hand_over(self.sender_queue, new_queue)
+            new_sender.start()
+            self.sender = new_sender
+            self.sender_queue = new_queue
+            self.sender_name = sender_name
+            switch_seconds = time.perf_counter() - switch_start
+
+        self.start_pump()
+        metrics.inc("sender_switchovers_total")
+        metrics.set("sender_switchover_seconds", switch_seconds)
+        metrics.set("sender_handover_results", handed_over)
+        report = SwitchoverReport(
+            sender_name, handed_over, drain_seconds, switch_seconds
+        )
+        logger.info(str(report))
+        return report
+
+    def _drain(self, watermark) -> float:
+        """이전 sender queue가 watermark 이하가 될 때까지 기다립니다 (최대 drain_timeout)."""
+        start = time.perf_counter()
+        deadline = start + self.drain_timeout
+        while self.sender_queue.qsize() > watermark and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _hand_over(old_queue, new_queue) -> int:
+        handed_over = 0
+        while True:
+            try:
+                new_queue.put(old_queue.get_nowait())
+            except queue.Empty:
+                return handed_over
+            handed_over += 1
+
+    @staticmethod
+    def _stop_sender(sender, timeout) -> bool:
+        """sender를 멈추고 스레드가 끝났으면 True (스레드가 아닌 sender도 True)."""
+        stop = getattr(sender, "stop", None)
+        if callable(stop):
+            stop()
+        join = getattr(sender, "join", None)
+        is_alive = getattr(sender, "is_alive", None)
+        if callable(join) and callable(is_alive) and is_alive():
+            join(timeout=timeout)
+            if is_alive():
+                logger.error(f"{sender} sender가 {timeout}s 안에 끝나지 않았습니다.")
+                return False
+        return True
+
+    def _return_to_data_queue(self, old_queue) -> int:
+        """처리하지 못한 결과를 data_queue 앞쪽으로 되돌립니다 (새로 들어온 결과보다 먼저)."""
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(old_queue.get_nowait())
+            except queue.Empty:
+                break
+        requeue(self.result_data_queue, leftovers)
+        return len(leftovers)
+
+    def stop(self):
+        """pump와 현재 sender를 멈춥니다. 처리하지 못한 결과는 data_queue 앞쪽으로 되돌립니다."""
+        self._stop_event.set()
+        if self._pump_thread is not None:
+            self._pump_thread.join(timeout=1.0)
+            self._pump_thread = None
+        with self._swap_lock:
+            if self.sender is not None:
+                self._stop_sender(self.sender, self.stop_timeout)
+                self._return_to_data_queue(self.sender_queue)
+            self.sender = None
+            self.sender_queue = None
+            self.sender_name = None
@@ -0,0 +1,426 @@
+import collections
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+
+from ingest import requeue
+from metrics import metrics
+from tracing import traced_queue, tracer
+
+logger = logging.getLogger("sender_supervisor")
+
+metrics.describe("sender_restarts_total", "sender 프로세스 재시작 횟수")
+metrics.describe(
+    "sender_restart_seconds", "장애 감지부터 새 프로세스 첫 heartbeat까지", kind="gauge"
+)
+metrics.describe("sender_process_up", "sender 프로세스 동작 여부", kind="gauge")
+metrics.describe(
+    "sender_results_handed_over_total", "재시작할 때 이전 자식에서 돌려받은 결과 수"
+)
+metrics.describe(
+    "sender_results_dropped_total",
+    "강제 종료된 자식이 꺼내서 처리 중이던 결과 수 (다시 보내지 않는다)",
+)
+
+
+class HeartbeatQueue:
+    """
+    sender가 결과를 꺼내러 올 때마다 heartbeat를 갱신하는 queue proxy.
+
+    write()에서 멈추거나 deadlock에 걸린 sender는 queue를 다시 읽지 않으므로 heartbeat가 끊긴다.
+    timeout 없는 get()도 heartbeat_interval마다 깨어나 갱신하므로 결과가 없을 때는 끊기지 않는다.
+
+    taken/done을 주면 queue의 항목은 (seq, 결과)이다. 꺼낸 seq를 taken에 남기고, 다음 get()으로
+    돌아오면 앞의 결과는 처리가 끝난 것으로 보고 done에 남긴다 (SenderSupervisor의 인계 기준).
+    """
+
+    def __init__(
+        self, result_queue, heartbeat, heartbeat_interval, taken=None, done=None
+    ):
+        self._queue = result_queue
+        self._heartbeat = heartbeat
+        self._interval = heartbeat_interval
+        self._taken = taken
+        self._done = done
+
+    def get(self, block=True, timeout=None):
+        if self._done is not None:
+            self._done.value = self._taken.value
+        if not block:
+            self._heartbeat.value = time.time()
+            return self._unwrap(self._queue.get_nowait())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._heartbeat.value = time.time()
+            wait = self._interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            try:
+                return self._unwrap(self._queue.get(timeout=wait))
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def _unwrap(self, item):
+        if self._taken is None:
+            return item
+        seq, result = item
+        self._taken.value = seq
+        return result
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def __getattr__(self, name):
+        return getattr(self._queue, name)
+
+
+def run_sender_process(
+    sender_name,
+    result_queue,
+    heartbeat,
+    stop_event,
+    log_queue,
+    heartbeat_interval,
+    taken=None,
+    done=None,
+    trace_queue=None,
+):
+    """
+    자식 프로세스에서 실행되는 sender 본체.
+
+    sender가 죽으면 0이 아닌 코드로 종료해서 supervisor가 재시작하게 한다.
+    heartbeat는 sender가 queue를 읽을 때 갱신된다 (HeartbeatQueue).
+    끝난 trace는 trace_queue로 supervisor에 보내 그쪽 tracer(`/trace/stages`)에 기록한다.
+    """
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(logging.INFO)
+
+    if trace_queue is not None:
+
+        def forward_trace(*trace):
+            try:
+                trace_queue.put_nowait(trace)
+            except queue.Full:
+                pass  # supervisor가 세지 못하므로 trace 하나 빠지는 것으로 끝낸다
+
+        tracer.forward = forward_trace
+
+    from plugin_registry import plugin_registry
+
+    if isinstance(result_queue, str):
+        # 프로세스 분리 모드에서는 공유 메모리 ring 이름을 받는다
+        from shm_ring import SharedRing
+
+        result_queue = SharedRing.attach(result_queue)
+
+    sender_class = plugin_registry.get_sender_class(sender_name)
+    if sender_class is None:
+        logging.error(
+            f"{sender_name} 모듈 없음: {plugin_registry.import_error(sender_name)}"
+        )
+        raise SystemExit(2)
+
+    heartbeat_queue = HeartbeatQueue(
+        result_queue, heartbeat, heartbeat_interval, taken, done
+    )
+    sender = sender_class(result_data_queue=traced_queue(sender_class, heartbeat_queue))
+    sender.start()
+    is_alive = getattr(sender, "is_alive", None)
+    while not stop_event.is_set():
+        if callable(is_alive) and not is_alive():
+            logging.error(f"{sender_name} sender 스레드가 종료되었습니다.")
+            raise SystemExit(1)
+        stop_event.wait(heartbeat_interval)
+
+    stop = getattr(sender, "stop", None)
+    if callable(stop):
+        stop()
+
+
+class SenderSupervisor:
+    """
+    ResultSender를 자식 프로세스에서 돌리고 heartbeat로 감시하는 supervisor.
+
+    공유 data_queue는 부모 프로세스에 그대로 두고, feeder 스레드가 현재 자식의 multiprocessing
+    queue로 옮긴다. 자식이 죽거나(exit) heartbeat가 hang_timeout 이상 끊기면 지수 backoff 후 재시작한다.
+    재시작할 때도 먼저 stop_event로 멈추게 하고, 안 되면 terminate/kill 한다.
+
+    feeder는 자식 queue에 (seq, 결과)를 넣고 그 사본을 in-flight 목록에 남긴다 (자식 queue 크기만큼).
+    자식이 꺼낸 seq(taken)와 처리를 끝낸 seq(done)를 공유 값으로 알려주므로, 자식을 끝낸 뒤에는
+    이전 queue를 읽지 않고(kill이면 읽다 만 pickle이 남았을 수 있다) in-flight에서 꺼내지 않은 결과를
+    data_queue 앞쪽으로 되돌린다. 강제 종료된 자식이 꺼내서 처리 중이던 결과는 이미 썼을 수 있어
+    다시 보내지 않고 sender_results_dropped_total에 센다.
+    자식이 끝낸 trace는 trace queue로 돌려받아 이 프로세스의 tracer에 기록한다.
+
+    result_data_queue가 SharedRing이면 자식이 ring을 직접 읽는다 (feeder 없음).
+    ring은 supervisor 쪽에서 유지되므로 재시작해도 읽지 않은 결과가 그대로 남는다.
+    """
+
+    def __init__(
+        self,
+        result_data_queue,
+        heartbeat_interval=0.2,
+        hang_timeout=2.0,
+        check_interval=0.05,
+        backoff_initial=0.1,
+        backoff_max=10.0,
+        stable_seconds=30.0,
+        child_queue_size=256,
+    ):
+        self.result_data_queue = result_data_queue
+        # 자식 queue를 작게 두어 밀린 결과는 data_queue(라인별 공정성, overflow policy)에 쌓이게 한다
+        self.child_queue_size = child_queue_size
+        self.shared_ring_name = getattr(result_data_queue, "name", None)
+        self.heartbeat_interval = heartbeat_interval
+        self.hang_timeout = hang_timeout
+        self.check_interval = check_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+
+        self.sender_name = None
+        self.restart_count = 0
+        self.last_restart_seconds = None
+        self.restart_callbacks = []  # callback(sender_name, reason, restart_seconds)
+        self.log_callbacks = []  # callback(message)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._child_queue = None
+        self._seq = itertools.count(1)
+        self._in_flight = collections.deque()  # 자식 queue에 넣은 (seq, 결과)
+        self._taken = self._context.Value("q", 0, lock=False)
+        self._done = self._context.Value("q", 0, lock=False)
+        self._trace_queue = self._context.Queue(maxsize=10000)
+        self._heartbeat = self._context.Value("d", 0.0)
+        self._stop_event = None
+        self._log_queue = self._context.Queue()
+        self._child_lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._shutdown = threading.Event()
+        self._threads = []
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, sender_name: str):
+        self.sender_name = sender_name
+        self._shutdown.clear()
+        self._spawn()
+        if not self._threads:
+            targets = [
+                (self._watch, "SenderSupervisorWatchdog"),
+                (self._forward_logs, "SenderSupervisorLogs"),
+                (self._forward_traces, "SenderSupervisorTraces"),
+            ]
+            if self.shared_ring_name is None:
+                targets.append((self._feed, "SenderSupervisorFeeder"))
+            for target, name in targets:
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def switch(self, sender_name: str):
+        """다른 sender 모듈로 바꿔서 다시 띄웁니다."""
+        self.sender_name = sender_name
+        self._restart("switch")
+
+    def _handoff(self, clean: bool) -> list:
+        """
+        끝난 자식이 꺼내지 않은 결과를 in-flight 목록에서 돌려받습니다 (자식을 끝낸 뒤에 부른다).
+
+        이전 자식 queue는 읽지 않고 닫는다. clean하지 않게 끝난 자식이 처리 중이던 결과는 버린다.
+        """
+        old_queue = self._child_queue
+        if old_queue is None or self.shared_ring_name is not None:
+            return []
+        taken, done = self._taken.value, self._done.value
+        unread = [result for seq, result in self._in_flight if seq > taken]
+        in_progress = sum(1 for seq, _ in self._in_flight if done < seq <= taken)
+        self._in_flight.clear()
+        old_queue.cancel_join_thread()
+        old_queue.close()
+        if unread:
+            metrics.inc("sender_results_handed_over_total", len(unread))
+        if in_progress and not clean:
+            metrics.inc("sender_results_dropped_total", in_progress)
+            logger.warning(
+                f"강제 종료된 sender가 처리 중이던 결과 {in_progress}개를 버립니다."
+            )
+        return unread
+
+    def _spawn(self):
+        if self.shared_ring_name is not None:
+            new_queue = self.shared_ring_name
+            taken = done = None
+        else:
+            new_queue = self._context.Queue(maxsize=self.child_queue_size)
+            taken, done = self._taken, self._done
+            taken.value = done.value = 0
+        self._stop_event = self._context.Event()
+        self._heartbeat.value = 0.0
+        process = self._context.Process(
+            target=run_sender_process,
+            args=(
+                self.sender_name,
+                new_queue,
+                self._heartbeat,
+                self._stop_event,
+                self._log_queue,
+                self.heartbeat_interval,
+                taken,
+                done,
+                self._trace_queue,
+            ),
+            name=f"ResultSender-{self.sender_name}",
+            daemon=True,
+        )
+        process.start()
+        self._child_queue = new_queue
+        self._process = process
+        self._started_at = time.monotonic()
+        metrics.set("sender_process_up", 1)
+
+    def _terminate(self) -> bool:
+        """
+        stop_event로 자식을 멈추고, hang_timeout 안에 끝나지 않으면 terminate/kill 합니다.
+
+        자식이 스스로 끝났으면(clean) True를 반환한다.
+        """
+        process = self._process
+        if process is None:
+            return True
+        if process.is_alive():
+            self._stop_event.set()
+            process.join(timeout=self.hang_timeout)
+        clean = not process.is_alive()
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=1.0)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        metrics.set("sender_process_up", 0)
+        return clean
+
+    def _restart(self, reason: str, expected_process=None):
+        with self._restart_lock:
+            # 감시 스레드와 switch()가 동시에 재시작하지 않도록 확인
+            if expected_process is not None and expected_process is not self._process:
+                return
+            self._restart_locked(reason)
+
+    def _restart_locked(self, reason: str):
+        detected_at = time.perf_counter()
+        with self._child_lock:
+            clean = self._terminate()
+            # 이전 자식이 꺼내지 않은 결과는 data_queue 앞쪽으로 돌려서 새 자식에게 먼저 간다
+            requeue(self.result_data_queue, self._handoff(clean))
+            self._spawn()
+        # 새 자식의 첫 heartbeat까지를 재시작 시간으로 측정한다
+        deadline = time.monotonic() + self.hang_timeout * 5
+        while self._heartbeat.value == 0.0 and time.monotonic() < deadline:
+            if not self._process.is_alive():
+                break
+            time.sleep(0.005)
+        restart_seconds = time.perf_counter() - detected_at
+        self.last_restart_seconds = restart_seconds
+        if reason != "switch":
+            self.restart_count += 1
+            metrics.inc("sender_restarts_total", sender=self.sender_name)
+        metrics.set("sender_restart_seconds", restart_seconds)
+        logger.warning(
+            f"sender 재시작({reason}): {self.sender_name} {restart_seconds * 1000:.0f}ms"
+        )
+        for callback in self.restart_callbacks:
+            callback(self.sender_name, reason, restart_seconds)
+
+    def _feed(self):
+        result = None
+        while not self._shutdown.is_set():
+            if result is None:
+                try:
+                    result = self.result_data_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            # 자식 queue가 가득 차면 lock을 놓고 다시 시도한다 (그 사이 재시작할 수 있게)
+            with self._child_lock:
+                if self._shutdown.is_set():
+                    break
+                seq = next(self._seq)
+                try:
+                    self._child_queue.put((seq, result), timeout=0.1)
+                except queue.Full:
+                    continue
+                self._in_flight.append((seq, result))
+                done = self._done.value
+                while self._in_flight and self._in_flight[0][0] <= done:
+                    self._in_flight.popleft()
+            result = None
+        if result is not None:
+            requeue(self.result_data_queue, [result])
+
+    def _watch(self):
+        backoff = self.backoff_initial
+        while not self._shutdown.wait(self.check_interval):
+            process = self._process
+            if process is None:
+                continue
+            reason = None
+            if not process.is_alive():
+                reason = f"exit code {process.exitcode}"
+            elif (
+                self._heartbeat.value
+                and time.time() - self._heartbeat.value > self.hang_timeout
+            ):
+                reason = "heartbeat timeout"
+            elif (
+                not self._heartbeat.value
+                and time.monotonic() - self._started_at > self.hang_timeout * 5
+            ):
+                reason = "no heartbeat after start"
+            if reason is None:
+                if time.monotonic() - self._started_at > self.stable_seconds:
+                    backoff = self.backoff_initial
+                continue
+            metrics.set("sender_process_up", 0)
+            if self._shutdown.wait(backoff):
+                return
+            self._restart(reason, expected_process=process)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _forward_logs(self):
+        while not self._shutdown.is_set():
+            try:
+                record = self._log_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            message = f"[{self.sender_name}] {record.getMessage()}"
+            for callback in self.log_callbacks:
+                callback(message)
+
+    def _forward_traces(self):
+        while not self._shutdown.is_set():
+            try:
+                trace = self._trace_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            tracer.record(*trace)
+
+    def stop(self):
+        self._shutdown.set()
+        with self._child_lock:
+            clean = self._terminate()
+            # 자식이 읽지 못한 결과는 공유 queue 앞쪽으로 되돌린다
+            requeue(self.result_data_queue, self._handoff(clean))
+            self._process = None
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
@@ -0,0 +1,579 @@
+import logging
+import math
+import queue
+import re
+import threading
+import time
+
+from message_codec import FRAME_FORMATS, message_codec
+from metrics import metrics
+from tracing import timed, tracer
+from traffic_capture import traffic_capture
+from virtual_serial import open_serial_port
+
+logger = logging.getLogger("serial_router")
+
+
+def build_route_table(outputs, line_count=None) -> list:
+    """
+    line_idx -> output index 표를 미리 만든다.
+
+    output i가 line i를 담당하고, output보다 라인이 많으면 순서대로 돌아가며 배정한다.
+    """
+    if not outputs:
+        return []
+    line_count = max(line_count or 0, len(outputs))
+    return [line_idx % len(outputs) for line_idx in range(line_count)]
+
+
+class LatencyHistogram:
+    """log2 bucket(us) latency histogram. bucket i는 [2^i, 2^(i+1)) us"""
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.total = 0
+        self.sum_seconds = 0.0
+
+    def record(self, seconds: float):
+        micros = max(int(seconds * 1e6), 1)
+        bucket = min(micros.bit_length() - 1, self.BUCKETS - 1)
+        self.counts[bucket] += 1
+        self.total += 1
+        self.sum_seconds += seconds
+
+    def percentile(self, percent: float) -> float:
+        """bucket 상한 기준 근사 백분위수(초)"""
+        if not self.total:
+            return 0.0
+        target = math.ceil(self.total * percent / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return (1 << (bucket + 1)) / 1e6
+        return (1 << self.BUCKETS) / 1e6
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "mean": self.sum_seconds / self.total if self.total else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+
+def make_framer(format_value="LF", separator=b";"):
+    """
+    record 목록을 frame 하나로 감싸는 함수를 만든다.
+
+    FormatEnum(또는 값 STX/ETX, CRLF, LF, CR)을 그대로 받는다. record가 여러 개면 separator로
+    잇는다.
+    """
+    prefix, suffix = FRAME_FORMATS.get(
+        getattr(format_value, "value", format_value), (b"", b"")
+    )
+
+    def framer(records):
+        return prefix + separator.join(records) + suffix
+
+    return framer
+
+
+class PortWriter(threading.Thread):
+    """
+    시리얼 포트 하나를 전담하는 writer 스레드.
+
+    포트마다 bounded queue를 따로 가지므로 느린 포트가 다른 포트를 막지 않는다.
+    queue가 가득 차면 기다리지 않고 버리며 backpressure 횟수를 센다.
+
+    coalesce를 켜면 같은 pulse(또는 같은 window 안)의 결과를 frame 하나로 묶어서 쓴다.
+    window는 queue가 쌓이면 늘리고 비면 줄인다. 기본은 꺼져 있다. text 프로토콜은 스케치가
+    frame 안의 record를 separator(`;`)로 나눠 읽을 때만 켠다 (decode_text_records와 같은 방식).
+    binary 프로토콜은 record마다 SYNC/CRC가 있어 이어 붙여도 생성한 스케치가 그대로 읽는다.
+    """
+
+    def __init__(
+        self,
+        port,
+        baudrate,
+        encoder,
+        framer=None,
+        max_queue_size=1024,
+        timeout=1,
+        coalesce=False,
+        coalesce_window=(0.0005, 0.02),
+        max_records_per_frame=16,
+    ):
+        super().__init__(name=f"PortWriter-{port}", daemon=True)
+        self.port = port
+        self.baudrate = baudrate
+        self.encoder = encoder
+        self.framer = framer or make_framer()
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.coalesce = coalesce
+        self.min_window, self.max_window = coalesce_window
+        self.window = self.min_window
+        self.max_records_per_frame = max_records_per_frame
+        self.write_latency = LatencyHistogram()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.encode_errors = 0
+        self.bytes_written = 0
+        self.frames_written = 0
+        self._started_at = None
+        self._pending = None  # 다음 frame으로 넘긴 결과 (pulse가 달라서)
+        self._frame_results = []  # 지금 frame에 들어간 결과 (write 후 trace 마감)
+        self._stop_event = threading.Event()
+        self._serial = None
+        self.error = None  # 포트를 열지 못해 writer가 끝났으면 그 예외
+
+    @property
+    def is_dead(self) -> bool:
+        return self.error is not None
+
+    def submit(self, result: dict, output) -> bool:
+        if self.error is not None:
+            # 포트를 열지 못한 writer에는 쌓지 않고 버린다
+            self.dropped += 1
+            metrics.inc("serial_backpressure_drops_total", port=self.port)
+            return False
+        try:
+            self.queue.put_nowait((result, output))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("serial_backpressure_drops_total", port=self.port)
+            return False
+        self.submitted += 1
+        return True
+
+    def run(self):
+        try:
+            self._serial = open_serial_port(self.port, self.baudrate, self.timeout)
+        except Exception as e:
+            self.error = e
+            logger.error(f"{self.port} open failed: {e}")
+            metrics.inc("serial_open_errors_total", port=self.port)
+            self._discard_queue()
+            return
+        self._started_at = time.perf_counter()
+        try:
+            while not (
+                self._stop_event.is_set()
+                and self.queue.empty()
+                and self._pending is None
+            ):
+                if self.coalesce:
+                    records = self._collect_window()
+                else:
+                    records = self._collect_one()
+                if not records:
+                    continue
+                try:
+                    frame = self.framer(records)
+                except Exception as e:
+                    self._encode_failed(e, len(records))
+                    continue
+                self.write_frame(frame, len(records))
+                write_ns = time.perf_counter_ns()
+                for result in self._frame_results:
+                    tracer.finish(result, write_ns)
+        finally:
+            self._serial.close()
+
+    def _encode(self, result, output):
+        """encoder 예외는 그 결과만 버리고 writer 스레드는 계속 돈다. 실패하면 None"""
+        try:
+            return self.encoder(result, output)
+        except Exception as e:
+            self._encode_failed(e, 1)
+            return None
+
+    def _encode_failed(self, error, records):
+        logger.error(f"{self.port} encode failed, {records} result(s) dropped: {error}")
+        self.dropped += records
+        self.encode_errors += records
+        metrics.inc("serial_encode_errors_total", records, port=self.port)
+
+    def _discard_queue(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.dropped += 1
+
+    def _next(self, timeout):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        return self.queue.get(timeout=timeout)
+
+    def _collect_one(self):
+        try:
+            result, output = self._next(0.1)
+        except queue.Empty:
+            return []
+        record = self._encode(result, output)
+        if record is None:
+            self._frame_results = []
+            return []
+        self._frame_results = [result]
+        return [record]
+
+    def _collect_window(self):
+        """첫 결과부터 window 동안 같은 pulse의 결과를 모은다."""
+        try:
+            result, output = self._next(0.1)
+        except queue.Empty:
+            return []
+        pulse = result.get("pulse")
+        record = self._encode(result, output)
+        if record is None:
+            self._frame_results = []
+            return []
+        self._frame_results = [result]
+        records = [record]
+        deadline = time.perf_counter() + self.window
+        while len(records) < self.max_records_per_frame:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                result, output = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if result.get("pulse") != pulse:
+                self._pending = (result, output)
+                break
+            record = self._encode(result, output)
+            if record is None:
+                continue
+            self._frame_results.append(result)
+            records.append(record)
+        self._adapt_window()
+        return records
+
+    def _adapt_window(self):
+        # queue가 쌓이면 window를 늘려 frame당 record를 늘리고, 비어 있으면 줄여서 지연을 줄인다
+        depth = self.queue.qsize()
+        if depth > self.max_records_per_frame:
+            self.window = min(self.window * 2, self.max_window)
+        elif depth == 0:
+            self.window = max(self.window / 2, self.min_window)
+
+    def write_frame(self, frame: bytes, records: int):
+        start = time.perf_counter()
+        try:
+            self._serial.write(frame)
+        except Exception as e:
+            logger.error(f"{self.port} write failed: {e}")
+            metrics.inc("serial_write_errors_total", port=self.port)
+            return
+        traffic_capture.serial_out(self.port, frame)
+        self.write_latency.record(time.perf_counter() - start)
+        self.written += records
+        self.frames_written += 1
+        self.bytes_written += len(frame)
+        metrics.inc("serial_records_written_total", records, port=self.port)
+        metrics.inc("serial_frames_written_total", port=self.port)
+        metrics.inc("serial_bytes_written_total", len(frame), port=self.port)
+
+    @property
+    def serial(self):
+        """writer가 연 포트 (loopback 검증용, 시작 전이면 None)"""
+        return self._serial
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        elapsed = elapsed or 1.0
+        return {
+            "port": self.port,
+            "queue_depth": self.queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "encode_errors": self.encode_errors,
+            "bytes_written": self.bytes_written,
+            "frames_written": self.frames_written,
+            "bytes_per_second": self.bytes_written / elapsed,
+            "frames_per_second": self.frames_written / elapsed,
+            "records_per_frame": self.written / max(self.frames_written, 1),
+            "coalesce_window": self.window if self.coalesce else None,
+            "error": str(self.error) if self.error is not None else None,
+            "write_latency": self.write_latency.summary(),
+        }
+
+
+# 기본 text record. "," 같은 고정 부분은 한 번만 인코딩해 둔다 (message_codec 참고)
+_default_record = message_codec.template("{pin},{grade}", "ASCII", "None")
+
+
+def default_encoder(result: dict, output) -> bytes:
+    """기본 text record: "<pin>,<grade>" (줄바꿈은 framer가 붙인다)"""
+    return _default_record.render(
+        pin=output.pin, grade=result.get("grade", result.get("count_flag", 0))
+    )
+
+
+def decode_text_records(buffer: bytes, separator=b";"):
+    """
+    default_encoder record를 frame(STX/ETX, CRLF, LF, CR)에서 꺼냅니다.
+
+    반환값은 ([(pin, grade)], 아직 frame이 끝나지 않은 나머지 바이트). 형식이 다른 record는 건너뛴다.
+    """
+    end = max(buffer.rfind(terminator) for terminator in (b"\n", b"\r", b"\x03"))
+    if end < 0:
+        return [], buffer
+    records = []
+    for frame in re.split(rb"[\r\n\x03]", buffer[:end]):
+        for record in frame.strip(b"\x02").split(separator):
+            pin, _, grade = record.partition(b",")
+            if pin.isdigit() and grade.lstrip(b"-").isdigit():
+                records.append((int(pin), int(grade)))
+    return records, buffer[end + 1 :]
+
+
+class SerialOutputRouter:
+    """
+    결과를 line_idx -> output 표로 찾아 해당 포트 writer에 넘긴다.
+
+    같은 포트를 쓰는 output끼리는 writer 하나를 공유한다. framer를 주지 않으면 포트마다
+    그 포트 첫 output의 format(FormatEnum, 없으면 LF)으로 make_framer를 만든다.
+    """
+
+    def __init__(
+        self, outputs, line_count=None, encoder=default_encoder, **writer_options
+    ):
+        self.outputs = list(outputs)
+        self.route_table = build_route_table(self.outputs, line_count)
+        self.writers = {}
+        self.unrouted = 0  # 설정에 없는 라인이라 보내지 않은 결과 수
+        self._output_writers = []
+        for output in self.outputs:
+            writer = self.writers.get(output.port)
+            if writer is None:
+                options = dict(writer_options)
+                if options.get("framer") is None:
+                    options["framer"] = make_framer(getattr(output, "format", "LF"))
+                writer = PortWriter(output.port, output.baudrate, encoder, **options)
+                self.writers[output.port] = writer
+            self._output_writers.append(writer)
+
+    @classmethod
+    def from_config(cls, config, **options):
+        return cls(
+            config.serial_config.outputs, config.program_config.line_count, **options
+        )
+
+    def route(self, result: dict) -> bool:
+        """
+        결과를 담당 output writer에 넘깁니다.
+
+        설정에 없는 line_idx(범위 밖, 정수가 아님)는 다른 라인 출력으로 보내지 않고 False
+        """
+        line_idx = result.get("line_idx", 0)
+        if (
+            not isinstance(line_idx, int)
+            or isinstance(line_idx, bool)
+            or not 0 <= line_idx < len(self.route_table)
+        ):
+            self.unrouted += 1
+            metrics.inc("serial_unrouted_total")
+            logger.warning(f"no output for line_idx {line_idx!r}, result dropped")
+            return False
+        output_idx = self.route_table[line_idx]
+        result["output"] = output_idx
+        tracer.mark(result, "schedule")
+        return self._output_writers[output_idx].submit(result, self.outputs[output_idx])
+
+    def start(self):
+        for writer in self.writers.values():
+            writer.start()
+
+    def stop(self):
+        for writer in self.writers.values():
+            writer.stop()
+
+    def stats(self) -> dict:
+        return {port: writer.stats() for port, writer in self.writers.items()}
+
+
+class RoutingResultSender(threading.Thread):
+    """
+    SerialOutputRouter를 쓰는 ResultSender 기본 클래스.
+
+    플러그인은 이 클래스를 상속해 encode(result, output)만 바꾸면 포트별 writer를 그대로 쓴다.
+    SenderHost/SenderSupervisor가 요구하는 생성자와 start/stop을 그대로 따른다.
+
+    get_arduino_sketch()는 업로드할 스케치 문자열을 반환하고, 만들 스케치가 없으면 None을
+    반환한다 (text 프로토콜은 플러그인이 스케치를 제공한다).
+    """
+
+    sender_name = "routing_result_sender"
+    protocol = "text"  # "binary"면 binary_protocol의 고정 길이 record를 보낸다
+    # binary 스케치가 pulse 번호/micros를 PC로 보고할지 (pulse_clock.py)
+    report_pulses = False
+    fire_grades = None  # binary 스케치가 pin을 움직일 등급 (None이면 모든 등급)
+    traces_results = True  # dequeue/schedule/write mark와 tracer.finish를 직접 남긴다
+    # 여러 결과를 frame 하나로 묶을지. text 스케치가 `;`로 나눠 읽을 때만 켠다 (PortWriter 참고)
+    coalesce = False
+    # frame(records) -> bytes. None이면 포트마다 output.format으로 만든 make_framer를 쓴다
+    frame = None
+
+    def __init__(self, result_data_queue, config=None, **router_options):
+        super().__init__(name=self.sender_name, daemon=True)
+        if config is None:
+            from config_store import config_store
+
+            config = config_store.get().config
+        self.result_data_queue = result_data_queue
+        if self.protocol == "binary":
+            from binary_protocol import binary_framer, make_binary_encoder
+
+            self.encode = make_binary_encoder()
+            self.frame = binary_framer
+        if self.frame is not None:
+            router_options.setdefault("framer", self.frame)
+        router_options.setdefault("coalesce", self.coalesce)
+        self.router = SerialOutputRouter.from_config(
+            config, encoder=self.encode, **router_options
+        )
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def create_default_config(cls):
+        """serial_config의 outputs를 그대로 쓰므로 따로 만들 설정이 없다."""
+
+    @classmethod
+    def check_valid_config(cls, config=None):
+        if config is None:
+            from config_store import config_store
+
+            config = config_store.get().config
+        outputs = config.serial_config.outputs
+        if not outputs:
+            raise ValueError("serial_config.outputs가 비어 있습니다.")
+        for index, output in enumerate(outputs):
+            if not output.port:
+                raise ValueError(f"output {index}의 포트가 지정되지 않았습니다.")
+
+    def encode(self, result: dict, output) -> bytes:
+        return default_encoder(result, output)
+
+    @classmethod
+    def get_arduino_sketch(cls, config=None):
+        """binary 프로토콜이면 schema에서 생성한 스케치를, 아니면 None을 반환합니다."""
+        if cls.protocol != "binary":
+            return None
+        from binary_protocol import generate_binary_sketch
+
+        if config is None:
+            from config_store import config_store
+
+            config = config_store.get().config
+        inputs = config.serial_config.inputs
+        return generate_binary_sketch(
+            config.serial_config.outputs,
+            config.arduino_config.baudrate,
+            encoder_pin=int(inputs[0].pin) if inputs else 2,
+            report_pulses=cls.report_pulses,
+            fire_grades=cls.fire_grades,
+        )
+
+    def run(self):
+        self.router.start()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    result = self.result_data_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self.handle(result)
+        finally:
+            self.router.stop()
+
+    @timed("sender_loop")
+    def handle(self, result):
+        tracer.mark(result, "dequeue")
+        self.router.route(result)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# plugin_registry의 내장 sender (result_sender 플러그인과 같은 `ResultSender` 규약)
+ResultSender = RoutingResultSender
+
+
+if __name__ == "__main__":
+    # 포트 수에 따른 처리량 비교 (가상 포트, 9600 baud)
+    from types import SimpleNamespace
+
+    for port_count in (1, 2, 4):
+        outputs = [
+            SimpleNamespace(
+                port=f"virtual://bench{port_count}_{idx}",
+                baudrate=9600,
+                pin=30 + idx,
+                offset=0,
+            )
+            for idx in range(port_count)
+        ]
+        router = SerialOutputRouter(
+            outputs, line_count=port_count, max_queue_size=100000
+        )
+        router.start()
+        total = 2000
+        start = time.perf_counter()
+        for i in range(total):
+            router.route({"line_idx": i % port_count, "grade": i % 6})
+        while sum(writer.written for writer in router.writers.values()) < total:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        router.stop()
+        print(f"{port_count} port(s): {total / elapsed:.0f} records/s")
+
+    # 한 포트에 4라인, 같은 pulse 결과 묶음 여부 비교 (115200 baud)
+    for coalesce in (False, True):
+        outputs = [
+            SimpleNamespace(
+                port=f"virtual://coalesce_{coalesce}",
+                baudrate=115200,
+                pin=30 + idx,
+                offset=0,
+            )
+            for idx in range(4)
+        ]
+        router = SerialOutputRouter(
+            outputs,
+            line_count=4,
+            max_queue_size=100000,
+            framer=make_framer("STX/ETX"),
+            coalesce=coalesce,
+        )
+        router.start()
+        total = 20000
+        start = time.perf_counter()
+        for i in range(total):
+            router.route({"line_idx": i % 4, "grade": i % 6, "pulse": i // 4})
+        writer = next(iter(router.writers.values()))
+        while writer.written < total:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        router.stop()
+        stats = writer.stats()
+        print(
+            f"coalesce={coalesce}: {total / elapsed:.0f} records/s, "
+            f"{stats['bytes_per_second']:.0f} B/s, "
+            f"{stats['frames_per_second']:.0f} frames/s, "
+            f"{stats['records_per_frame']:.2f} records/frame"
+        )
@@ -1,12 +1,14 @@
+import asyncio
 import json
 import logging
 import sys
+import time
 import traceback
-from queue import Queue
 
 import uvicorn
 from fastapi import (
     FastAPI,
+    HTTPException,
     Request,
     Response,
     WebSocket,
@@ -14,13 +16,61 @@ from fastapi import (
     status,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QVBoxLayout, QWidget
-from server_config_model import RootConfig, ServerConfig, load_server_root_config
+
+from audit_sink import DEFAULT_AUDIT_DB, AuditSink
+from clock_sync import ClockSync
+from config_channel import ConfigChannel
+from config_store import config_store
+from ingest import (
+    FairIngestQueue,
+    IngestRejected,
+    IngestStats,
+    InvalidLineResult,
+    RateLimiter,
+    parse_line_result,
+)
+from line_connections import LineConnectionRegistry, TransportScopeMiddleware
+from metrics import metrics
+from profiling import debug_router, debug_token, require_debug_access
+from pulse_clock import PulseCapture, PulseClock
+from result_history import ResultHistoryStore
+from result_statistics import RollingStatistics
+from tracing import timed, tracer
+from traffic_capture import capture_path, traffic_capture
 
 app = FastAPI()
-data_queue = Queue()  # Shared queue for communication
+app.include_router(debug_router)  # /debug/* (localhost 또는 X-Debug-Token)
+# 라인별 accepted/dropped (ConveyorMessageTab 표와 `/ingest`)
+ingest_stats = IngestStats()
+# sender로 가는 bounded queue. 가득 차면 overflow policy를 따르고 라인별로 돌아가며 꺼낸다
+data_queue = FairIngestQueue(stats=ingest_stats)
+rate_limiter = RateLimiter(stats=ingest_stats)  # 라인(ip)별 초당 결과 수 제한
+result_statistics = RollingStatistics()  # GUI 통계 패널도 같은 객체를 읽는다
+result_sinks = [result_statistics]  # data_queue 외에 결과를 함께 받는 sink
+clock_sync = ClockSync()  # 라인별 시계 offset/rtt (websocket ping)
+# 라인 websocket heartbeat/idle timeout/송신 버퍼 관리 (ping 설정은 uvicorn에도 넘긴다)
+line_connections = LineConnectionRegistry()
+# 라인별 설정 view/ETag, push
+config_channel = ConfigChannel(send=line_connections.send)
+# GUI 등에서 설정을 저장하면 라인 view가 바뀌는 필드일 때만 다시 계산해 push한다
+config_store.subscribe(
+    lambda root_config, changed_paths, version: config_channel.update(
+        root_config.config
+    ),
+    prefixes=(
+        "config.program_config.lines",
+        "config.serial_config.signal_count_per_pulse",
+    ),
+)
+# data_queue에 넣기 전에 결과에 값을 붙이는 함수 (서버 시계 timestamp, pulse 번호 등)
+result_taggers = [clock_sync.tag_result]
+# 컨베이어 encoder pulse 시계 (pulse capture를 켜야 갱신된다)
+pulse_clock = PulseClock()
+pulse_capture = None
+tracer.finish_callbacks.append(traffic_capture.latency)  # capture 중일 때만 기록
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +79,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 라인 연결별 송신 버퍼를 transport에서 읽도록 websocket scope에 transport를 넣는다
+app.add_middleware(TransportScopeMiddleware)
 
 
 # FastAPI 로그 설정
@@ -62,33 +114,265 @@ def read_root():
 
 
 @app.get("/setting")
-def read_root(request: Request):
-    root_config: RootConfig = load_server_root_config()
-    config: ServerConfig = root_config.config
-    client_ip = request.client.host
-    for line in config.program_config.lines:
-        if client_ip == line.ip:
-            return {
-                "line": line.line_idx,
-                "number_of_cut": config.serial_config.signal_count_per_pulse,
-                "subharmonic_signal": config.serial_config.signal_count_per_pulse,
-            }
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+def read_setting(request: Request):
+    if not config_channel.is_loaded:
+        config_channel.update(config_store.get().config)
+    setting = config_channel.setting_for(request.client.host)
+    if setting is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    etag, body = setting
+    if request.headers.get("if-none-match") == etag:
+        metrics.inc("setting_not_modified_total")
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 connected_line_set = set()
 connected_lines = {}
 
 
+def dispatch_result(result: dict) -> bool:
+    """
+    결과를 sender용 data_queue에 넣고 등록된 sink에도 전달합니다.
+
+    queue가 가득 차서 버려지면 False (REJECT policy면 IngestRejected 발생)
+    """
+    for tagger in result_taggers:
+        try:
+            tagger(result)
+        except Exception as e:
+            logger.error(f"Result tagger {tagger} failed: {e}")
+    tracer.mark(result, "enqueue")
+    accepted = data_queue.put_nowait(result) is not False
+    if getattr(data_queue, "stats", None) is not ingest_stats:
+        # 프로세스 분리 모드의 SharedRing은 자체 카운터가 없다
+        ingest_stats.count(
+            result["line_idx"], "accepted" if accepted else "dropped_newest"
+        )
+    if not accepted:
+        return False
+    for sink in result_sinks:
+        try:
+            sink(result)
+        except Exception as e:
+            logger.error(f"Result sink {sink} failed: {e}")
+    return True
+
+
+@app.on_event("startup")
+def register_result_history():
+    result_sinks.append(ResultHistoryStore())
+
+
+@app.on_event("shutdown")
+def close_result_history():
+    for sink in list(result_sinks):
+        if isinstance(sink, ResultHistoryStore):
+            result_sinks.remove(sink)
+            sink.close()
+
+
+@app.on_event("startup")
+async def load_config_channel():
+    config_channel.loop = asyncio.get_running_loop()
+    config_channel.update(config_store.get().config)
+
+
+@app.on_event("startup")
+async def start_line_reaper():
+    line_connections.start_reaper()
+
+
+@app.on_event("startup")
+def log_debug_token():
+    logger.info(f"debug token: {debug_token}")
+
+
+@app.get("/ingest")
+def read_ingest():
+    return {
+        "policy": getattr(data_queue, "policy", None),
+        "depth": data_queue.qsize(),
+        "lines": {
+            str(line_idx): counts
+            for line_idx, counts in ingest_stats.snapshot().items()
+        },
+    }
+
+
+@app.get("/trace/stages")
+def read_trace_stages():
+    return tracer.histogram.summary()
+
+
+@app.get("/trace/chrome")
+def read_chrome_trace():
+    # chrome://tracing 또는 Perfetto에서 열 수 있는 JSON
+    return JSONResponse(
+        tracer.chrome_trace(),
+        headers={"Content-Disposition": 'attachment; filename="result_trace.json"'},
+    )
+
+
+@app.post("/capture/start")
+def start_traffic_capture(request: Request, path: str = None):
+    # 재생: python traffic_replay.py <path> --speed 1|10|max
+    require_debug_access(request)
+    # 파일은 DEFAULT_CAPTURE_DIR 안에만 만든다 (path는 파일 이름만)
+    try:
+        path = capture_path(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        traffic_capture.start(path)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return traffic_capture.status()
+
+
+@app.post("/capture/stop")
+def stop_traffic_capture(request: Request):
+    require_debug_access(request)
+    return traffic_capture.stop()
+
+
+@app.get("/capture")
+def read_traffic_capture():
+    return traffic_capture.status()
+
+
+@app.get("/connections")
+def read_connections():
+    return line_connections.snapshot()
+
+
+def enable_audit_sink(db_path: str = DEFAULT_AUDIT_DB) -> AuditSink:
+    """SQLite audit 기록을 켭니다. 이미 켜져 있으면 기존 sink를 반환"""
+    for sink in result_sinks:
+        if isinstance(sink, AuditSink):
+            return sink
+    audit_sink = AuditSink(db_path)
+    audit_sink.start()
+    result_sinks.append(audit_sink)
+    return audit_sink
+
+
+def disable_audit_sink():
+    for sink in list(result_sinks):
+        if isinstance(sink, AuditSink):
+            result_sinks.remove(sink)
+            sink.stop()
+
+
+def enable_pulse_capture(port: str, baudrate: int, serial_port=None) -> PulseCapture:
+    """입력 채널 pulse 수집을 켜고 결과에 pulse 번호를 붙입니다. 이미 켜져 있으면 기존 스레드 반환"""
+    global pulse_capture
+    if pulse_capture is not None and pulse_capture.is_alive():
+        return pulse_capture
+    pulse_capture = PulseCapture(pulse_clock, port, baudrate, serial_port=serial_port)
+    pulse_capture.start()
+    if pulse_clock.tag_result not in result_taggers:
+        result_taggers.append(pulse_clock.tag_result)
+    return pulse_capture
+
+
+def disable_pulse_capture():
+    global pulse_capture
+    if pulse_clock.tag_result in result_taggers:
+        result_taggers.remove(pulse_clock.tag_result)
+    if pulse_capture is not None:
+        pulse_capture.stop()
+        pulse_capture = None
+
+
+@app.get("/clock_sync")
+def read_clock_sync():
+    return {str(line_idx): clock for line_idx, clock in clock_sync.snapshot().items()}
+
+
+@app.get("/conveyor")
+def read_conveyor():
+    return pulse_clock.snapshot()
+
+
+@app.get("/metrics")
+def read_metrics():
+    metrics.set("ingest_queue_depth", data_queue.qsize())
+    return PlainTextResponse(metrics.render())
+
+
+@app.get("/history/grades")
+def read_grade_history(start: float, end: float = None):
+    history = next(
+        (sink for sink in result_sinks if isinstance(sink, ResultHistoryStore)), None
+    )
+    if history is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return {
+        str(line_idx): counts.tolist()
+        for line_idx, counts in history.grade_histogram(start, end).items()
+    }
+
+
+@app.get("/statistics")
+def read_statistics():
+    return {
+        str(line_idx): {str(window): stats for window, stats in windows.items()}
+        for line_idx, windows in result_statistics.snapshot().items()
+    }
+
+
 async def broadcast_to_lines(data: dict):
     message = json.dumps(data)  # Convert the dictionary to a JSON string
-    for client in connected_lines.values():
-        await client.send_text(message)
+    await line_connections.broadcast(message)
 
 
 async def broadcast_message(message: str):
-    for client in connected_lines:
-        await client.send_text(message)
+    # 멈춘 라인은 send_timeout 뒤 정리되므로 다른 라인 송신을 막지 않는다
+    await line_connections.broadcast(message)
+
+
+@timed("websocket_message")
+async def handle_line_message(connection, line_idx, received_data, received_ns):
+    """라인 메시지 하나 처리 (time_sync 응답, rate limit, 결과 dispatch, 응답 송신)"""
+    websocket = connection.websocket
+    connection.touch()
+    traffic_capture.ws_in(line_idx, received_data, received_ns)
+    if clock_sync.handle_message(line_idx, received_data):
+        # time_sync에 응답하는 라인은 idle timeout으로 끊김을 감지한다
+        connection.answers_heartbeat = True
+        return
+    if not rate_limiter.admit(connection.ip, line_idx):
+        await line_connections.send(
+            websocket, json.dumps({"type": "error", "reason": "rate_limited"})
+        )
+        return
+    try:
+        result = parse_line_result(received_data, line_idx)
+    except InvalidLineResult as e:
+        logger.error(f"invalid result from {connection.ip} (line {line_idx}): {e}")
+        ingest_stats.count(line_idx, "invalid")
+        await line_connections.send(
+            websocket, json.dumps({"type": "error", "reason": "invalid_result"})
+        )
+        return
+    if "sent_at" in result and connection.ping_task is None:
+        # timestamp를 보내는 (JSON) 라인만 time_sync를 안다. 예전 라인에는 보내지 않는다
+        connection.ping_task = asyncio.create_task(
+            clock_sync.run_pings(websocket, line_idx, send=line_connections.send)
+        )
+    tracer.start(result, received_ns)
+    try:
+        dispatch_result(result)
+    except IngestRejected as e:
+        await line_connections.send(
+            websocket, json.dumps({"type": "error", "reason": e.reason})
+        )
+        return
+    logger.info(f"Received data from {connection.ip}: {received_data}")
+    await line_connections.send(websocket, f"Message received: {received_data}")
 
 
 @app.websocket("/")
@@ -101,32 +385,35 @@ async def websocket_endpoint(websocket: WebSocket):
 
     logger.info(f"Client {client_ip} IP.  Total lines: {len(connected_line_set)}")
 
-    # Prepare the data to be broadcasted
-    data = {
+    # 라인별 설정 view는 설정이 바뀔 때 config_channel이 미리 계산해 둔다
+    data = config_channel.view_for(str(client_ip)) or {
         "line_idx": None,
         "number_of_cut": None,
     }
-    root_config: RootConfig = load_server_root_config()
-    config: ServerConfig = root_config.config
-    saved_lines = config.program_config.lines
-    for saved_line in saved_lines:
-        if str(client_ip) == saved_line.ip:
-            data = {
-                "line_idx": saved_line.line_idx,
-                "number_of_cut": config.serial_config.signal_count_per_pulse,
-            }
-    await websocket.send_text(json.dumps(data))
+    connection = line_connections.add(websocket, str(client_ip))
+    config_channel.register(websocket, str(client_ip))
+    line_idx = data["line_idx"] if data["line_idx"] is not None else 0
+    connection.line_idx = line_idx
+    await line_connections.send(websocket, json.dumps(data))
 
     try:
         while True:
             received_data = await websocket.receive_text()
-            data_queue.put({"line_idx": 0, "count_flag": 0})
-            logger.info(f"Received data from {client_ip}: {received_data}")
-            await websocket.send_text(f"Message received: {received_data}")
+            received_ns = time.perf_counter_ns()
+            view = config_channel.view_for(str(client_ip))
+            if view is not None:
+                line_idx = view["line_idx"]  # push로 line_idx가 바뀌었을 수 있다
+                connection.line_idx = line_idx
+            await handle_line_message(connection, line_idx, received_data, received_ns)
     except WebSocketDisconnect:
-        # Remove the line on disconnection
-        # del connected_lines[line_ip]
-        connected_line_set.remove(websocket)
+        pass
+    finally:
+        # 정상 종료가 아니어도(reaper cancel, 송신 오류) 연결 정보는 반드시 정리한다
+        if connection.ping_task is not None:
+            connection.ping_task.cancel()
+        config_channel.unregister(websocket)
+        line_connections.remove(websocket)
+        connected_line_set.discard(websocket)
         logger.info(
             f"Client {client_ip} disconnected. Total lines: {len(connected_line_set)}"
         )
@@ -148,7 +435,14 @@ class FastAPIServerThread(QThread):
 
     def run(self):
         # FastAPI 서버 실행
-        config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
+        config = uvicorn.Config(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            log_level="info",
+            ws_ping_interval=line_connections.ping_interval,
+            ws_ping_timeout=line_connections.ping_timeout,
+        )
         server = uvicorn.Server(config)
 
         # 로그 핸들러 설정
@@ -1,6 +1,8 @@
+# 다른 모듈보다 먼저 import해서 GUI 시작 시간의 기준점으로 쓴다
+from startup_timing import startup_timing  # isort: skip
+
 import asyncio
-import importlib
-import json
+import collections
 import logging
 import os
 import re
@@ -8,15 +10,24 @@ import shutil
 import subprocess
 import sys
 import threading
+import time
 from enum import Enum
 
-import serial.tools.list_ports
-import toml
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon, QIntValidator, QKeyEvent, QKeySequence
+import serial
+from PyQt5.QtCore import QPointF, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import (
+    QIcon,
+    QIntValidator,
+    QKeyEvent,
+    QKeySequence,
+    QPainter,
+    QPen,
+    QPolygonF,
+)
 from PyQt5.QtWidgets import (
     QAction,
     QApplication,
+    QCheckBox,
     QComboBox,
     QDialog,
     QFileDialog,
@@ -24,6 +35,7 @@ from PyQt5.QtWidgets import (
     QFrame,
     QGroupBox,
     QHBoxLayout,
+    QInputDialog,
     QLabel,
     QLineEdit,
     QMessageBox,
@@ -46,12 +58,32 @@ from server_config_model import (
     RootConfig,
     ServerConfig,
     backup_config,
-    load_server_root_config,
-    save_config,
 )
 
-from result_sender_thread import ResultSenderThread
-from server import FastAPIServerThread, broadcast_message
+from calibration import (
+    CalibrationError,
+    OffsetCalibration,
+    apply_calibration,
+    test_grades_for,
+)
+from config_store import ConfigConflict, config_store
+from ingest import DROP_OLDEST, OVERFLOW_POLICIES
+from link_test import BAUDRATES as LINK_BAUDRATES
+from link_test import (
+    LinkTest,
+    LinkTestError,
+    format_report,
+    generate_echo_sketch,
+    recommend_baudrate,
+)
+from message_codec import message_codec
+from plugin_registry import plugin_registry
+from sender_host import SenderHost
+from sender_supervisor import SenderSupervisor
+from test_patterns import PATTERNS, TestPatternRunner
+from virtual_serial import open_serial_port
+
+startup_timing.mark("imports")
 
 
 class NeedPackageEnum(str, Enum):
@@ -67,11 +99,54 @@ class TabIndexEnum(Enum):
     CONVEYOR_MESSAGE = 4
 
 
+# 탭 위젯에 그대로 보이는 설정 필드: config_store 경로 -> (탭, 위젯 이름, setter)
+CONFIG_FIELD_WIDGETS = {
+    "config.program_config.line_count": (
+        TabIndexEnum.LINE_COUNT,
+        "line_edit",
+        "setText",
+    ),
+    "config.arduino_config.test_message": (
+        TabIndexEnum.SERIAL_TEST,
+        "message_edit",
+        "setText",
+    ),
+    "config.arduino_config.baudrate": (
+        TabIndexEnum.SERIAL_TEST,
+        "baudrate_combo",
+        "setCurrentText",
+    ),
+    "config.serial_config.test_message_to_sorter": (
+        TabIndexEnum.SERIAL_TEST,
+        "write_message_edit",
+        "setText",
+    ),
+    "config.serial_config.baudrate": (
+        TabIndexEnum.SERIAL_TEST,
+        "write_baudrate_combo",
+        "setCurrentText",
+    ),
+    "config.serial_config.test_message_encode_type": (
+        TabIndexEnum.SERIAL_TEST,
+        "encoder_combo",
+        "setCurrentText",
+    ),
+    "config.serial_config.test_message_format_type": (
+        TabIndexEnum.SERIAL_TEST,
+        "format_combo",
+        "setCurrentText",
+    ),
+}
+
+
 class LineCountTab(QWidget):
+    ipconfig_loaded = pyqtSignal(str)
+
     def __init__(self, parent=None, tab_widget=None, main_widget=None):
         super(LineCountTab, self).__init__(parent)
         self.tab_widget = tab_widget
         self.main_widget = main_widget
+        self.ipconfig_loaded.connect(self.show_ipconfig_result)
         self.initUI()
 
     def initUI(self):
@@ -97,9 +172,12 @@ class LineCountTab(QWidget):
         self.ipconfig_text = QTextEdit()
         self.ipconfig_text.setReadOnly(True)
 
-        # ipconfig 명령 실행 결과 가져오기
-        ipconfig_result = self.get_ipconfig_result()
-        self.ipconfig_text.setPlainText(ipconfig_result)
+        # ipconfig 명령은 느리므로 다른 스레드에서 실행하고 끝나면 채운다
+        self.ipconfig_text.setPlainText("ipconfig 실행 중...")
+        threading.Thread(
+            target=lambda: self.ipconfig_loaded.emit(self.get_ipconfig_result()),
+            daemon=True,
+        ).start()
 
         ipconfig_layout.addWidget(ipconfig_label)
         ipconfig_layout.addWidget(self.ipconfig_text)
@@ -116,6 +194,9 @@ class LineCountTab(QWidget):
         self.setLayout(layout)
         self.line_edit.setFocus()
 
+    def show_ipconfig_result(self, ipconfig_result):
+        self.ipconfig_text.setPlainText(ipconfig_result)
+
     def get_ipconfig_result(self):
         try:
             # Windows에서 ipconfig 명령 실행 (Linux/Mac에서는 ifconfig 사용)
@@ -135,7 +216,7 @@ class LineCountTab(QWidget):
             return
 
         # self.save_line_count(int(line_count))
-        before_root_config: RootConfig = load_server_root_config()
+        before_root_config: RootConfig = config_store.checkout()
         before_config: ServerConfig = before_root_config.config
         before_line_count = before_config.program_config.line_count
         is_read_configured = before_config.serial_config.is_read_configured
@@ -187,6 +268,7 @@ class LineCountTab(QWidget):
             result_sender = getattr(result_sender_module, "ResultSender", None)
             if result_sender:
                 result_sender.create_default_config()
+                config_store.reload()
             else:
                 QMessageBox.critical(
                     self,
@@ -197,12 +279,17 @@ class LineCountTab(QWidget):
             QMessageBox.information(
                 self, "완료", "설정이 성공적으로 변경되었습니다. 프로그램 재실행합니다."
             )
-            self.main_widget.arduino_upload_tab.initUI()
+            # 아직 만들지 않은 탭은 처음 볼 때 새 설정으로 만들어진다
+            arduino_upload_tab = self.main_widget.lazy_tabs[
+                TabIndexEnum.ARDUINO_UPLOAD.value
+            ]
+            if arduino_upload_tab.is_built:
+                arduino_upload_tab.widget().initUI()
         except ImportError as e:
             QMessageBox.critical(self, "오류 관리자 문의 필요", f"모듈 저장 실패: {e}")
 
     def save_line_count(self, line_count):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.checkout()
         config: ServerConfig = root_config.config
         if config is not None:
             config.program_config.line_count = line_count
@@ -236,8 +323,10 @@ class UploadDialog(QDialog):
 
     def refreshPorts(self):
         """Refresh the list of available serial ports."""
+        from serial.tools import list_ports
+
         self.port_combo.clear()
-        ports = list(serial.tools.list_ports.comports())
+        ports = list(list_ports.comports())
         port_names = [port.device for port in ports]
         self.port_combo.addItems(port_names)
         if not port_names:
@@ -272,14 +361,20 @@ class CustomLineEdit(QLineEdit):
 
 
 class SerialTestTab(QWidget):
+    link_sketch_uploaded = pyqtSignal(bool, str)
+    link_test_finished = pyqtSignal(object)
+
     def __init__(self, parent=None, tab_widget=None, main_widget=None):
         super(SerialTestTab, self).__init__(parent)
         self.tab_widget = tab_widget
         self.main_widget = main_widget
         self.serial_connection = None
         self.write_serial_connection = None
+        message_codec.add_config(config_store.get().config)
         self.initUI()
         self.process_running = False
+        self.link_sketch_uploaded.connect(self.show_link_sketch_upload)
+        self.link_test_finished.connect(self.show_link_test_result)
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -411,6 +506,25 @@ class SerialTestTab(QWidget):
         self.write_button.clicked.connect(self.write_serial_message)
         layout.addWidget(self.write_button)
 
+        self.link_test_label = QLabel(
+            "<h3><b>링크 품질 테스트</b> (처리량, 왕복 지연, 오류/손실률)</h3>"
+            "echo 스케치를 쓰기 확인용 포트에 올린 뒤, 쓰기 확인용 보드레이트까지 보드레이트별로 측정"
+        )
+        layout.addWidget(self.link_test_label)
+        link_test_layout = QHBoxLayout()
+        self.link_sketch_button = QPushButton("echo 스케치 업로드")
+        self.link_sketch_button.clicked.connect(self.upload_link_test_sketch)
+        link_test_layout.addWidget(self.link_sketch_button)
+        self.link_required_spin = QSpinBox()
+        self.link_required_spin.setRange(0, 100000)
+        self.link_required_spin.setPrefix("필요 처리량 ")
+        self.link_required_spin.setSuffix(" byte/s")
+        link_test_layout.addWidget(self.link_required_spin)
+        self.link_test_button = QPushButton("링크 테스트 실행")
+        self.link_test_button.clicked.connect(self.run_link_test)
+        link_test_layout.addWidget(self.link_test_button)
+        layout.addLayout(link_test_layout)
+
         self.setLayout(layout)
 
         layout.addLayout(button_layout)
@@ -423,9 +537,11 @@ class SerialTestTab(QWidget):
             QMessageBox.warning(self, "입력 오류", "한글은 입력할 수 없습니다.")
 
     def update_port_list(self):
+        from serial.tools import list_ports
+
         self.port_combo.clear()
         self.write_port_combo.clear()
-        ports = list(serial.tools.list_ports.comports())
+        ports = list(list_ports.comports())
         port_names = [port.device for port in ports]
         self.port_combo.addItems(port_names)
         self.write_port_combo.addItems(port_names)
@@ -468,7 +584,7 @@ class SerialTestTab(QWidget):
             self.main_widget.update_log("Disconnected.")
 
     def write_serial_message(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.checkout()
         config: ServerConfig = root_config.config
         port = self.write_port_combo.currentText()
         baudrate = int(self.write_baudrate_combo.currentText())
@@ -479,11 +595,10 @@ class SerialTestTab(QWidget):
             if not self.validate_serial_connection():
                 return
 
-            encoded_message = self.get_encoded_message()
-            if not encoded_message:
+            formatted_message = self.get_framed_message()
+            if not formatted_message:
                 return
 
-            formatted_message = self.format_message(encoded_message)
             self.write_serial_connection.write(formatted_message)
             QMessageBox.information(
                 self, "Success", f"Message sent successfully. {formatted_message}"
@@ -577,37 +692,96 @@ class SerialTestTab(QWidget):
             check=True,
         )
 
-    def get_encoded_message(self):
+    def get_framed_message(self):
         selected_encoder = self.encoder_combo.currentText()
+        selected_format = self.format_combo.currentText()
         message = self.write_message_edit.text()
-        print(message, "message")
         try:
-            encoding_methods = {
-                "ASCII": "ascii",
-                "UTF-8": "utf-8",
-                "UTF-16": "utf-16",
-                "ISO-8859-1": "iso-8859-1",
-                "UTF-32": "utf-32",
-            }
-            # return message.encode(encoding_methods.get(selected_encoder, "utf-8"))
-            return message.encode(selected_encoder)
-        except UnicodeEncodeError as e:
-            QMessageBox.critical(self, "Encoding Error", f"Encoding failed: {e}")
-            return False
-        except Exception as e:
+            return message_codec.frame(message, selected_encoder, selected_format)
+        except (UnicodeEncodeError, LookupError) as e:
             QMessageBox.critical(self, "Encoding Error", f"Encoding failed: {e}")
             return False
 
-    def format_message(self, encoded_message):
-        selected_format = self.format_combo.currentText()
+    def link_test_baudrates(self) -> list:
+        max_baudrate = int(self.write_baudrate_combo.currentText())
+        return [baudrate for baudrate in LINK_BAUDRATES if baudrate <= max_baudrate]
+
+    def upload_link_test_sketch(self):
+        port = self.write_port_combo.currentText()
+        if not port:
+            QMessageBox.warning(self, "Warning", "Please select a port to upload.")
+            return
+        with open("link_test_echo.ino", "w", encoding="utf-8") as f:
+            f.write(generate_echo_sketch(LINK_BAUDRATES[0], ("Serial", "Serial1")))
+        self.link_sketch_button.setEnabled(False)
+        self.main_widget.update_log(f"{port} echo 스케치 업로드 시작")
+
+        def upload():
+            for command in (
+                ["arduino-cli", "compile", "--fqbn", "arduino:avr:mega"],
+                ["arduino-cli", "upload", "-p", port, "--fqbn", "arduino:avr:mega"],
+            ):
+                process = subprocess.run(
+                    command + ["link_test_echo.ino"], capture_output=True, text=True
+                )
+                if process.returncode != 0:
+                    self.link_sketch_uploaded.emit(
+                        False, f"{port} 업로드 실패: {process.stderr}"
+                    )
+                    return
+            self.link_sketch_uploaded.emit(True, f"{port} echo 스케치 업로드 성공")
 
-        format_methods = {
-            "STX/ETX": lambda msg: b"\x02" + msg + b"\x03",
-            "CRLF": lambda msg: msg + b"\r\n",
-            "LF": lambda msg: msg + b"\n",
-            "CR": lambda msg: msg + b"\r",
-        }
-        return format_methods.get(selected_format, lambda msg: msg)(encoded_message)
+        threading.Thread(target=upload, daemon=True).start()
+
+    def show_link_sketch_upload(self, is_succeed, message):
+        self.link_sketch_button.setEnabled(True)
+        self.main_widget.update_log(message)
+        if is_succeed:
+            QMessageBox.information(self, "업로드 성공", message)
+        else:
+            QMessageBox.warning(self, "업로드 실패", message)
+
+    def run_link_test(self):
+        port_name = self.write_port_combo.currentText()
+        if not port_name:
+            QMessageBox.warning(self, "Warning", "Please select a port.")
+            return
+        baudrates = self.link_test_baudrates()
+        required = self.link_required_spin.value()
+        self.link_test_button.setEnabled(False)
+        self.main_widget.update_log(f"{port_name} 링크 테스트 시작: {baudrates}")
+
+        def run():
+            try:
+                # echo 스케치는 가장 낮은 보드레이트로 시작한다
+                port = open_serial_port(port_name, LINK_BAUDRATES[0], timeout=0.1)
+                try:
+                    results = LinkTest(port).run(baudrates)
+                finally:
+                    port.close()
+            except (serial.SerialException, LinkTestError, OSError) as e:
+                self.link_test_finished.emit({"error": str(e)})
+                return
+            self.link_test_finished.emit(
+                {
+                    "port": port_name,
+                    "results": results,
+                    "recommended": recommend_baudrate(results, required),
+                }
+            )
+
+        threading.Thread(target=run, name="LinkTest", daemon=True).start()
+
+    def show_link_test_result(self, report):
+        self.link_test_button.setEnabled(True)
+        if "error" in report:
+            QMessageBox.warning(self, "링크 테스트 실패", report["error"])
+            return
+        text = f"{report['port']} 링크 테스트\n{format_report(report['results'])}"
+        if report["recommended"] is not None:
+            text += f"\n추천 보드레이트: {report['recommended']}"
+        self.text_edit.append(text)
+        self.main_widget.update_log(text)
 
     def on_prev(self):
         current_index = self.tab_widget.currentIndex()
@@ -615,7 +789,7 @@ class SerialTestTab(QWidget):
 
     def on_next(self):
 
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
 
         if not config.arduino_config.is_upload_port_assigned:
@@ -693,8 +867,10 @@ class UploadDialog(QDialog):
         self.setLayout(layout)
 
     def load_ports(self):
+        from serial.tools import list_ports
+
         self.port_combo.clear()
-        ports = list(serial.tools.list_ports.comports())
+        ports = list(list_ports.comports())
         self.port_combo.addItems([port.device for port in ports])
         if not ports:
             QMessageBox.warning(
@@ -705,8 +881,6 @@ class UploadDialog(QDialog):
 
     def upload_to_all_ports(self):
         ports = [self.port_combo.itemText(i) for i in range(self.port_combo.count())]
-        root_config: RootConfig = load_server_root_config()
-        config: ServerConfig = root_config.config
         message = self.parent().message_edit.text()
         baudrate = self.parent().baudrate_combo.currentText()
         if not message:
@@ -718,27 +892,22 @@ class UploadDialog(QDialog):
         from threading import Thread
 
         for port in ports:
-            Thread(
-                target=self.upload_sketch, args=(port, root_config), daemon=True
-            ).start()
+            Thread(target=self.upload_sketch, args=(port,), daemon=True).start()
 
     def upload_to_selected_port(self):
         port = self.port_combo.currentText()
-        root_config: RootConfig = load_server_root_config()
-        config: ServerConfig = root_config.config
         message = self.parent().message_edit.text()
         baudrate = self.parent().baudrate_combo.currentText()
 
         self.parent().create_arduino_sketch(message, baudrate)
         if port:
-            self.upload_sketch(port, root_config)
+            self.upload_sketch(port)
         else:
             QMessageBox.warning(self, "Warning", "Please select a port to upload.")
             return
 
-    def upload_sketch(self, port, root_config: RootConfig):
+    def upload_sketch(self, port):
         self.upload_port.emit(port)
-        config = root_config.config
         upload_process = subprocess.Popen(
             [
                 "arduino-cli",
@@ -756,16 +925,25 @@ class UploadDialog(QDialog):
         stdout, stderr = upload_process.communicate()
 
         if upload_process.returncode == 0:
-            config.arduino_config.port = port
-            config.arduino_config.baudrate = int(
-                self.parent().baudrate_combo.currentText()
-            )
-            config.arduino_config.test_message = self.parent().message_edit.text()
-            config.arduino_config.is_upload_port_assigned = True
-            config.serial_config.is_production_sketch_uploaded = False
-            config.serial_config.is_read_configured = False
-            config.serial_config.is_send_configured = False
-            is_saved = self.parent().main_widget.save_root_config(root_config)
+            baudrate = int(self.parent().baudrate_combo.currentText())
+            test_message = self.parent().message_edit.text()
+
+            def assign_upload_port(root_config: RootConfig):
+                config = root_config.config
+                config.arduino_config.port = port
+                config.arduino_config.baudrate = baudrate
+                config.arduino_config.test_message = test_message
+                config.arduino_config.is_upload_port_assigned = True
+                config.serial_config.is_production_sketch_uploaded = False
+                config.serial_config.is_read_configured = False
+                config.serial_config.is_send_configured = False
+
+            # 여러 포트의 업로드 스레드가 동시에 저장해도 config_store가 차례로 적용한다
+            try:
+                config_store.update(assign_upload_port)
+            except Exception as e:
+                self.uploaded_port.emit(False, f"{port} 업로드 성공, 저장 실패: {e}")
+                return
             self.uploaded_port.emit(True, f"{port} 업로드 성공 및 저장 완료!")
         else:
             self.uploaded_port.emit(False, f"{port} 업로드 실패: {stderr}")
@@ -798,7 +976,9 @@ class ArduinoUploadTab(QWidget):
         self.initUI()
 
     def initUI(self):
-        self.root_config: RootConfig = load_server_root_config()
+        from serial.tools import list_ports
+
+        self.root_config: RootConfig = config_store.get()
         self.config: ServerConfig = self.root_config.config
         # 기존 레이아웃 제거 (있을 경우)
         if self.layout() is not None:
@@ -824,7 +1004,7 @@ class ArduinoUploadTab(QWidget):
 
         self.input_fields = []
 
-        available_ports = [port.device for port in serial.tools.list_ports.comports()]
+        available_ports = [port.device for port in list_ports.comports()]
         available_baudrates = [9600, 19200, 38400, 57600, 115200]
         available_input_pins = range(2, 10)
 
@@ -961,9 +1141,9 @@ class ArduinoUploadTab(QWidget):
         self.setLayout(layout)
 
     def validate_inputs(self):
-        before_root_config: RootConfig = load_server_root_config()
+        before_root_config: RootConfig = config_store.get()
         self.save_config()
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.checkout()
         config: ServerConfig = root_config.config
         result_sender_module = config.serial_config.production_result_sender_module
         if not config.serial_config.production_result_sender_module:
@@ -1002,6 +1182,15 @@ class ArduinoUploadTab(QWidget):
             self.main_widget.save_root_config(before_root_config)
             self.initUI()
             return
+        if arduino_sketch is None:
+            QMessageBox.critical(
+                self,
+                "업로드 불가",
+                "이 모듈은 업로드할 아두이노 스케치를 제공하지 않습니다.",
+            )
+            self.main_widget.save_root_config(before_root_config)
+            self.initUI()
+            return
 
         with open("main_program_test.ino", "w", encoding="utf-8") as f:
             f.write(arduino_sketch)
@@ -1055,7 +1244,7 @@ class ArduinoUploadTab(QWidget):
         QMessageBox.information(self, "Success", "Uploaded arduino sketch!!")
 
     def save_config(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.checkout()
         config: ServerConfig = root_config.config
         serial_input_config_list = []
         serial_output_config_list = []
@@ -1091,7 +1280,7 @@ class ArduinoUploadTab(QWidget):
         self.tab_widget.setCurrentIndex(current_index - 1)
 
     def on_next(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
         if not config.serial_config.is_production_sketch_uploaded:
             QMessageBox.warning(
@@ -1111,6 +1300,11 @@ class TableHeaders(Enum):
 
 
 class ConveyorMessageTab(QWidget):
+    # 보정은 별도 스레드에서 돌고 진행률/결과는 signal로 GUI 스레드에 넘긴다
+    calibration_progress = pyqtSignal(int, int)
+    calibration_finished = pyqtSignal(object)
+    test_pattern_finished = pyqtSignal(object)
+
     def __init__(
         self,
         parent=None,
@@ -1124,11 +1318,14 @@ class ConveyorMessageTab(QWidget):
         self.main_widget = main_widget
         self.loop = loop
         self.result_data_queue = result_data_queue
-        self.result_sender_thread = None
+        self.calibration_dialog = None
+        self.calibration_progress.connect(self.update_calibration_progress)
+        self.calibration_finished.connect(self.show_calibration_result)
+        self.test_pattern_finished.connect(self.show_test_pattern_result)
         self.initUI()
 
     def initUI(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         self.config: ServerConfig = root_config.config
 
         if self.layout() is not None:
@@ -1143,10 +1340,11 @@ class ConveyorMessageTab(QWidget):
         # Create the table
         self.table = QTableWidget()
         self.table.setRowCount(self.config.program_config.line_count)
-        self.table.setColumnCount(4)  # Status, IP, Line Index, Test 등급
+        # Status, IP, Line Index, Test 등급, 수신, 버림(rate limit/overflow)
+        self.table.setColumnCount(6)
 
         self.table.setHorizontalHeaderLabels(
-            ["Status", "IP", "Line Index", "Test 등급"]
+            ["Status", "IP", "Line Index", "Test 등급", "수신", "버림"]
         )
         from server import connected_line_set
 
@@ -1169,10 +1367,16 @@ class ConveyorMessageTab(QWidget):
             line_idx_item = QTableWidgetItem(str(line.line_idx))
             self.table.setItem(idx, 2, line_idx_item)
 
-            #
-            test_grade_item = QTableWidgetItem(0)
+            # 보정(선별기 offset 맞춤)에 쓰는 등급
+            test_grade_item = QTableWidgetItem("0")
             self.table.setItem(idx, 3, test_grade_item)
 
+            for column in (4, 5):
+                count_item = QTableWidgetItem("0")
+                count_item.setFlags(Qt.ItemIsEnabled)
+                self.table.setItem(idx, column, count_item)
+        self.refresh_ingest_counts()
+
         # Save Button to store the IP and Line Index
         save_button = QPushButton("Save")
         save_button.clicked.connect(self.save_config)
@@ -1191,6 +1395,90 @@ class ConveyorMessageTab(QWidget):
         self.sync_offset_button.clicked.connect(self.sync_offset_to_sorter)
         layout.addWidget(self.sync_offset_button)
 
+        # Test 등급/무작위 등급을 선택 라인(없으면 전체)으로 보내 출력 loopback을 검증한다
+        pattern_layout = QHBoxLayout()
+        pattern_layout.addWidget(QLabel("Test pattern:"))
+        self.pattern_combo = QComboBox()
+        self.pattern_combo.addItems(PATTERNS)
+        pattern_layout.addWidget(self.pattern_combo)
+        self.pattern_rate = QSpinBox()
+        self.pattern_rate.setRange(1, 20000)
+        self.pattern_rate.setValue(100)
+        self.pattern_rate.setSuffix(" 개/s")
+        pattern_layout.addWidget(self.pattern_rate)
+        self.pattern_seconds = QSpinBox()
+        self.pattern_seconds.setRange(1, 600)
+        self.pattern_seconds.setValue(5)
+        self.pattern_seconds.setSuffix(" 초")
+        pattern_layout.addWidget(self.pattern_seconds)
+        self.pattern_run_button = QPushButton("패턴 실행")
+        self.pattern_run_button.clicked.connect(lambda: self.run_test_pattern(False))
+        pattern_layout.addWidget(self.pattern_run_button)
+        self.pattern_max_button = QPushButton("최대 속도 찾기")
+        self.pattern_max_button.clicked.connect(lambda: self.run_test_pattern(True))
+        pattern_layout.addWidget(self.pattern_max_button)
+        layout.addLayout(pattern_layout)
+
+        # 등급 추적용 SQLite 기록 (선택)
+        from audit_sink import AuditSink
+        from server import pulse_clock, result_sinks, result_taggers
+
+        self.audit_checkbox = QCheckBox("결과 audit 기록 (SQLite)")
+        self.audit_checkbox.setChecked(
+            any(isinstance(sink, AuditSink) for sink in result_sinks)
+        )
+        self.audit_checkbox.toggled.connect(self.toggle_audit_sink)
+        layout.addWidget(self.audit_checkbox)
+
+        # 프로덕션 스케치(report_pulses)가 보내는 encoder pulse 수집
+        self.pulse_capture_checkbox = QCheckBox("입력 pulse 수집 (컨베이어 속도/지터)")
+        self.pulse_capture_checkbox.setChecked(pulse_clock.tag_result in result_taggers)
+        self.pulse_capture_checkbox.toggled.connect(self.toggle_pulse_capture)
+        layout.addWidget(self.pulse_capture_checkbox)
+
+        # sender를 별도 프로세스로 실행하면 죽거나 멈췄을 때 자동으로 재시작한다
+        self.sender_process_checkbox = QCheckBox(
+            "sender 별도 프로세스 실행 (자동 재시작)"
+        )
+        self.sender_process_checkbox.setChecked(self.main_widget.use_sender_process)
+        self.sender_process_checkbox.toggled.connect(self.toggle_sender_process)
+        layout.addWidget(self.sender_process_checkbox)
+
+        # data_queue가 가득 찼을 때의 처리 방법
+        policy_layout = QHBoxLayout()
+        policy_layout.addWidget(QLabel("수신 queue overflow 처리:"))
+        self.overflow_policy_combo = QComboBox()
+        self.overflow_policy_combo.addItems(OVERFLOW_POLICIES)
+        self.overflow_policy_combo.setCurrentText(
+            getattr(self.result_data_queue, "policy", DROP_OLDEST)
+        )
+        self.overflow_policy_combo.setEnabled(hasattr(self.result_data_queue, "policy"))
+        self.overflow_policy_combo.currentTextChanged.connect(
+            self.change_overflow_policy
+        )
+        policy_layout.addWidget(self.overflow_policy_combo)
+        layout.addLayout(policy_layout)
+
+        if self.main_widget.control_client is not None:
+            # client 모드에서는 server 객체가 API 서버 프로세스에 있어 여기서 바꿔도 반영되지 않는다
+            for widget in (
+                self.sync_button,
+                self.sync_offset_button,
+                self.pattern_run_button,
+                self.pattern_max_button,
+                self.audit_checkbox,
+                self.pulse_capture_checkbox,
+                self.sender_process_checkbox,
+                self.overflow_policy_combo,
+            ):
+                widget.setEnabled(False)
+                widget.setToolTip("client 모드에서는 쓸 수 없습니다")
+
+        if getattr(self, "ingest_timer", None) is None:
+            self.ingest_timer = QTimer(self)
+            self.ingest_timer.timeout.connect(self.refresh_ingest_counts)
+            self.ingest_timer.start(1000)
+
         # Previous Button
         self.prev_button = QPushButton("Previous")
         self.prev_button.clicked.connect(self.on_prev)
@@ -1216,55 +1504,328 @@ class ConveyorMessageTab(QWidget):
         self.setLayout(layout)
 
     def sync_offset_to_sorter(self):
-        root_config: RootConfig = load_server_root_config()
-        config: ServerConfig = root_config.config
+        # sender를 한 번 프로세스로 띄웠으면 start_result_sender도 계속 프로세스로 띄운다
+        if (
+            self.main_widget.use_sender_process
+            or self.main_widget.sender_supervisor is not None
+        ):
+            QMessageBox.warning(
+                self,
+                "보정 불가",
+                "sender를 별도 프로세스로 실행하면 선별기 보드의 동작 보고를 받을 수 없습니다.\n"
+                "프로그램 내부 스레드 모드에서 보정해 주세요.",
+            )
+            return
+        import server
 
-        result_sender_module = self.main_widget.get_result_sender_module(
-            config.serial_config.production_result_sender_module
+        rate = server.pulse_clock.snapshot().get("rate")
+        if server.pulse_capture is None or not rate:
+            QMessageBox.warning(
+                self,
+                "보정 불가",
+                "입력 pulse 수집을 켜고 컨베이어를 돌린 뒤 보정해 주세요.\n"
+                "선별기 스케치는 binary 프로토콜 + pulse 보고로 올려야 합니다.",
+            )
+            return
+        # 이미 실행 중인 sender가 있으면 SenderHost가 결과 손실 없이 교체(재로딩)한다
+        is_running = self.main_widget.sender_host.sender is not None
+        self.main_widget.start_result_sender(reload=is_running)
+
+        config: ServerConfig = config_store.get().config
+        camera_delay = (
+            config.serial_config.inputs[0].camera_delay
+            if config.serial_config.inputs
+            else 0
+        )
+        # 카메라 -> 선별기 거리는 설정에서 거꾸로 구하지 않고 사용자가 잰 값을 받는다
+        distances = {}
+        for output_idx, output in enumerate(config.serial_config.outputs):
+            if output.port != server.pulse_capture.port:
+                continue
+            distance, ok = QInputDialog.getInt(
+                self,
+                "카메라 -> 선별기 거리",
+                f"Output {output_idx} ({output.port}, pin {output.pin})까지의 "
+                "encoder pulse 수를 입력하세요.",
+                round(output.offset + camera_delay / 1000 * rate),
+                0,
+                1_000_000,
+            )
+            if not ok:
+                return
+            distances[output_idx] = distance
+        calibration = OffsetCalibration(
+            config,
+            self.result_data_queue.put_nowait,
+            pulse_clock=server.pulse_clock,
+            pulse_capture=server.pulse_capture,
+            distances=distances,
+        )
+        test_grades = test_grades_for(config, self.read_test_grades())
+        self.calibration_dialog = QProgressDialog(
+            "Test 등급 결과로 선별기 지연을 측정하는 중...",
+            None,
+            0,
+            len(test_grades) * calibration.samples_per_line,
+            self,
         )
-        result_sender_class = getattr(result_sender_module, "ResultSender", None)
-        # TODO result_sender는 스레드고 self.result_sender_thread로 지정한다.
-        # result_sender스레드가 지정되어 있다면 강제 종료시킨다.
-        if self.result_sender_thread and self.result_sender_thread.is_alive():
-            self.result_sender_thread.stop()
-            self.result_sender_thread.join()
+        self.calibration_dialog.setWindowTitle("offset 보정")
+        self.calibration_dialog.show()
 
-        try:
-            self.result_sender_thread = ResultSenderThread(
-                result_data_queue=self.result_data_queue
+        def run():
+            try:
+                report = calibration.run(
+                    test_grades, progress=self.calibration_progress.emit
+                )
+            except CalibrationError as e:
+                report = {"error": str(e)}
+            self.calibration_finished.emit(report)
+
+        threading.Thread(target=run, name="OffsetCalibration", daemon=True).start()
+
+    def read_test_grades(self) -> dict:
+        """표의 Test 등급 열 (line_idx -> 등급). 비어 있거나 숫자가 아니면 0"""
+        grades = {}
+        for row in range(self.table.rowCount()):
+            line_idx_item = self.table.item(row, 2)
+            grade_item = self.table.item(row, 3)
+            try:
+                line_idx = int(line_idx_item.text())
+            except (AttributeError, ValueError):
+                continue
+            try:
+                grades[line_idx] = int(grade_item.text())
+            except (AttributeError, ValueError):
+                grades[line_idx] = 0
+        return grades
+
+    def update_calibration_progress(self, done, total):
+        if self.calibration_dialog is not None:
+            self.calibration_dialog.setMaximum(total)
+            self.calibration_dialog.setValue(done)
+
+    def show_calibration_result(self, report):
+        if self.calibration_dialog is not None:
+            self.calibration_dialog.close()
+            self.calibration_dialog = None
+        if "error" in report:
+            QMessageBox.warning(self, "보정 실패", report["error"])
+            return
+        lines = [
+            f"컨베이어 {report['pulse_rate']:.1f} pulse/s, "
+            f"서버->선별기 {report['pipeline_ms']:.1f} ms",
+            f"camera_delay: {report['camera_delay']['current']} -> "
+            f"{report['camera_delay']['solved']} ms",
+        ]
+        for output_report in report["outputs"]:
+            if not output_report.get("samples"):
+                lines.append(f"Output {output_report['output']}: 측정 없음")
+                continue
+            if output_report["offset"]["solved"] is None:
+                lines.append(
+                    f"Output {output_report['output']} ({output_report['port']}): "
+                    f"지연 {output_report['delay_pulses_p50']:.0f} pulse, 거리 없음"
+                )
+                continue
+            lines.append(
+                f"Output {output_report['output']} ({output_report['port']}): "
+                f"offset {output_report['offset']['current']} -> "
+                f"{output_report['offset']['solved']}, "
+                f"지연 {output_report['delay_pulses_p5']:.0f}~"
+                f"{output_report['delay_pulses_p95']:.0f} pulse, "
+                f"허용 범위 {output_report['within_tolerance'] * 100:.0f}%"
+            )
+        self.main_widget.update_log("\n".join(lines))
+        answer = QMessageBox.question(
+            self,
+            "offset 보정 결과",
+            "\n".join(lines) + "\n\n이 값으로 설정을 저장할까요?",
+        )
+        if answer != QMessageBox.Yes:
+            return
+        root_config: RootConfig = config_store.checkout()
+        apply_calibration(root_config.config, report)
+        if self.main_widget.save_root_config(root_config):
+            # binary 프로토콜은 record마다 offset을 보내지만 text 스케치는 다시 올려야 한다
+            self.main_widget.update_log(
+                "offset 저장 완료. text 프로토콜 스케치는 다시 업로드하세요."
             )
-            self.result_sender_thread.log_signal.connect(self.main_widget.update_log)
-            self.result_sender_thread.start()
-        except Exception as e:
-            if self.result_sender_thread and self.result_sender_thread.is_alive():
-                self.result_sender_thread.stop()
-                self.result_sender_thread.join()
-            print(e)
 
-    def fruit_from_gpu(self):
-        root_config: RootConfig = load_server_root_config()
-        config: ServerConfig = root_config.config
+    def selected_line_indexes(self) -> list:
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        rows = rows or range(self.table.rowCount())
+        line_indexes = []
+        for row in rows:
+            try:
+                line_indexes.append(int(self.table.item(row, 2).text()))
+            except (AttributeError, ValueError):
+                continue
+        return line_indexes
+
+    def run_test_pattern(self, find_max):
+        sender = self.main_widget.sender_host.sender
+        router = getattr(sender, "router", None)
+        if router is None:
+            QMessageBox.warning(
+                self,
+                "검증 불가",
+                "실행 중인 sender가 없거나 포트별 writer(RoutingResultSender)를 쓰지 않습니다.",
+            )
+            return
+        lines = self.selected_line_indexes()
+        if not lines:
+            QMessageBox.warning(self, "라인 없음", "보낼 라인이 없습니다.")
+            return
+        runner = TestPatternRunner(
+            self.result_data_queue.put_nowait,
+            router,
+            getattr(sender, "protocol", "text"),
+        )
+        pattern = self.pattern_combo.currentText()
+        grades = self.read_test_grades()
+        rate = self.pattern_rate.value()
+        seconds = self.pattern_seconds.value()
+        self.pattern_run_button.setEnabled(False)
+        self.pattern_max_button.setEnabled(False)
+        self.main_widget.update_log(
+            f"test pattern {pattern} 시작: 라인 {lines}, "
+            + ("최대 속도 찾기" if find_max else f"{rate}개/s {seconds}초")
+        )
 
-        from server_config_app import connected_line_set
-
-        saved_lines = config.program_config.lines
-        for ws in connected_line_set:
-            for saved_line in saved_lines:
-                if str(ws.client.host) == saved_line.ip:
-                    data = {
-                        "line_idx": saved_line.line_idx,
-                        "number_of_cut": config.serial_config.signal_count_per_pulse,
-                    }
-                    asyncio.run_coroutine_threadsafe(
-                        self.send_message_to_line(ws, data), self.loop
+        def run():
+            try:
+                if find_max:
+                    report = runner.find_max_rate(
+                        pattern, lines, grades, start_rate=rate, seconds=seconds
                     )
+                else:
+                    report = runner.run(pattern, lines, grades, rate, seconds)
+            except RuntimeError as e:
+                report = {"error": str(e)}
+            self.test_pattern_finished.emit(report)
+
+        threading.Thread(target=run, name="TestPattern", daemon=True).start()
+
+    def show_test_pattern_result(self, report):
+        self.pattern_run_button.setEnabled(True)
+        self.pattern_max_button.setEnabled(True)
+        if "error" in report:
+            QMessageBox.warning(self, "test pattern 실패", report["error"])
+            return
+        runs = report.get("runs", [report])
+        lines = []
+        for run in runs:
+            lines.append(
+                f"{run['pattern']} {run['rate']:.0f}개/s: "
+                + ("OK" if run["ok"] else "실패")
+                + f" (버림 {run['dropped']})"
+            )
+            for port, port_report in run["ports"].items():
+                latency_max = port_report.get("latency_max")
+                lines.append(
+                    f"  {port}: 수신 {port_report.get('received', 0)}"
+                    f"/{port_report.get('expected', 0)}, "
+                    f"누락 {port_report.get('missing', 0)}, "
+                    f"순서 {port_report.get('out_of_order', 0)}, "
+                    f"지연 {port_report.get('late', 0)}, "
+                    f"최대 {latency_max * 1000 if latency_max else 0:.1f} ms"
+                )
+        if "max_rate" in report:
+            lines.append(
+                f"유지 가능한 최대 속도: {report['max_rate'] or 0:.0f}개/s "
+                f"(보드레이트 한계 {report['sorter_limit']:.0f}개/s)"
+            )
+        self.main_widget.update_log("\n".join(lines))
+        QMessageBox.information(self, "test pattern 결과", "\n".join(lines[-12:]))
+
+    def toggle_sender_process(self, checked):
+        self.main_widget.use_sender_process = checked
+        self.main_widget.update_log(
+            "다음 sender 시작부터 별도 프로세스로 실행합니다."
+            if checked
+            else "다음 sender 시작부터 프로그램 내부 스레드로 실행합니다."
+        )
+
+    def change_overflow_policy(self, policy):
+        self.result_data_queue.policy = policy
+        self.main_widget.update_log(f"수신 queue overflow 처리: {policy}")
+
+    def refresh_ingest_counts(self):
+        if not self.isVisible():
+            return
+        from server import ingest_stats
+
+        counts = ingest_stats.snapshot()
+        for row in range(self.table.rowCount()):
+            line_idx_item = self.table.item(row, 2)
+            if line_idx_item is None:
+                continue
+            try:
+                line_counts = counts.get(int(line_idx_item.text()))
+            except ValueError:
+                continue
+            if line_counts is None:
+                continue
+            dropped = sum(
+                value for field, value in line_counts.items() if field != "accepted"
+            )
+            self.table.item(row, 4).setText(str(line_counts["accepted"]))
+            self.table.item(row, 5).setText(str(dropped))
+
+    def toggle_audit_sink(self, checked):
+        from server import disable_audit_sink, enable_audit_sink
+
+        if checked:
+            audit_sink = enable_audit_sink()
+            self.main_widget.update_log(f"audit 기록 시작: {audit_sink.db_path}")
+        else:
+            disable_audit_sink()
+            self.main_widget.update_log("audit 기록 중지")
+
+    def toggle_pulse_capture(self, checked):
+        from server import disable_pulse_capture, enable_pulse_capture
+
+        if not checked:
+            disable_pulse_capture()
+            self.main_widget.update_log("입력 pulse 수집 중지")
+            return
+        config: ServerConfig = config_store.get().config
+        if not config.serial_config.inputs:
+            QMessageBox.warning(self, "입력 설정 없음", "시리얼 입력 설정이 없습니다.")
+            self.pulse_capture_checkbox.setChecked(False)
+            return
+        input_config = config.serial_config.inputs[0]
+        serial_port = None
+        if any(
+            output.port == input_config.port for output in config.serial_config.outputs
+        ):
+            # 같은 COM 포트는 두 번 열 수 없으므로 결과 출력 writer가 연 포트를 같이 읽는다
+            router = getattr(self.main_widget.sender_host.sender, "router", None)
+            writer = router.writers.get(input_config.port) if router else None
+            serial_port = writer.serial if writer is not None else None
+            if serial_port is None:
+                QMessageBox.warning(
+                    self,
+                    "포트 사용 중",
+                    f"{input_config.port}는 결과 출력 포트입니다.\n"
+                    "sender(RoutingResultSender)를 프로그램 내부에서 실행한 뒤 켜 주세요.",
+                )
+                self.pulse_capture_checkbox.setChecked(False)
+                return
+        enable_pulse_capture(
+            input_config.port, input_config.baudrate, serial_port=serial_port
+        )
+        self.main_widget.update_log(f"입력 pulse 수집 시작: {input_config.port}")
 
-    async def send_message_to_line(self, ws, data: dict):
-        data = json.dumps(data)
-        await ws.send_text(data)
+    def fruit_from_gpu(self):
+        from server import config_channel
+
+        # 연결된 라인에 현재 설정 view 전체를 다시 push 한다
+        config: ServerConfig = config_store.get().config
+        config_channel.update(config, force=True)
 
     def save_config(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.checkout()
         config: ServerConfig = root_config.config
         lines = []
         for row in range(self.table.rowCount()):
@@ -1306,6 +1867,8 @@ class ConveyorMessageTab(QWidget):
         self.initUI()
 
     async def send_message_to_lines(self, message):
+        from server import broadcast_message
+
         await broadcast_message(message)
 
     def update_status(self, ip, is_connected):
@@ -1333,7 +1896,7 @@ class SpecificationUploadTab(QWidget):
         self.initUI()
 
     def initUI(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
 
         if self.layout() is not None:
@@ -1349,17 +1912,12 @@ class SpecificationUploadTab(QWidget):
         self.sender_combo = QComboBox()
         self.main_layout.addWidget(self.sender_combo)
         serial_result_sender = config.serial_config.production_result_sender_module
-        if self.main_widget.is_package_importable(
-            f"{NeedPackageEnum.ResultSender.value}"
-        ):
-            sender_module = importlib.import_module(
-                f"{NeedPackageEnum.ResultSender.value}"
-            )
-            all_senders = getattr(sender_module, "__all_senders__", [])
-            self.sender_combo.clear()
-            self.sender_combo.addItem("----")
-            self.sender_combo.addItems(all_senders)
-            self.sender_combo.setCurrentText(str(serial_result_sender))
+        # 내장 sender(routing_result_sender)는 result_sender 패키지가 없어도 목록에 나온다
+        all_senders = plugin_registry.senders()
+        self.sender_combo.clear()
+        self.sender_combo.addItem("----")
+        self.sender_combo.addItems(all_senders)
+        self.sender_combo.setCurrentText(str(serial_result_sender))
         self.initializing = True
         self.sender_combo.currentTextChanged.connect(self.on_sender_combo_change)
 
@@ -1398,6 +1956,7 @@ class SpecificationUploadTab(QWidget):
                 f"Failed to update dependencies: {update_error}\n관리자 문의 필요",
             )
         else:
+            plugin_registry.invalidate()
             QMessageBox.information(self, "완료", "업데이트 완료.")
             self.initUI()
 
@@ -1405,7 +1964,7 @@ class SpecificationUploadTab(QWidget):
         if self.initializing:
             self.initializing = False
             return
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
         current_value = self.sender_combo.currentText()
         production_serial = config.serial_config.production_result_sender_module
@@ -1435,6 +1994,7 @@ class SpecificationUploadTab(QWidget):
             result_sender = getattr(result_sender_module, "ResultSender", None)
             if result_sender:
                 result_sender.create_default_config()
+                config_store.reload()
             else:
                 QMessageBox.critical(
                     self,
@@ -1443,12 +2003,15 @@ class SpecificationUploadTab(QWidget):
                 )
                 return
             # 설정을 실제로 업데이트
-            root_config: RootConfig = load_server_root_config()
+            root_config: RootConfig = config_store.checkout()
             config: ServerConfig = root_config.config
             config.serial_config.production_result_sender_module = current_value
             is_saved = self.main_widget.save_root_config(root_config)
             if not is_saved:
                 return
+            # 동작 중인 sender가 있으면 새 모듈로 바로 교체
+            if self.main_widget.sender_host.sender is not None:
+                self.main_widget.start_result_sender(result_sender_name=current_value)
             self.sender_combo.setCurrentText(current_value)
             QMessageBox.information(
                 self, "완료", f"설정이 '{current_value}'로 성공적으로 변경되었습니다."
@@ -1474,6 +2037,8 @@ class SpecificationUploadTab(QWidget):
         self.process_toml_file(file_name)
 
     def process_toml_file(self, file_path):
+        import toml
+
         try:
             with open(file_path, "r") as toml_file:
                 toml_data = toml.load(toml_file)
@@ -1488,27 +2053,24 @@ class SpecificationUploadTab(QWidget):
             QMessageBox.information(self, "완료", "프로그램 다운로드 프로세스 완료")
 
     def update_senders_dropdown(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
         # TODO 기존 sender_combo 초기화
         self.sender_combo.clear()
-        try:
-            sender_module = importlib.import_module(
-                f"{NeedPackageEnum.ResultSender.value}"
-            )
-            all_senders = getattr(sender_module, "__all_senders__", [])
+        if plugin_registry.is_available(NeedPackageEnum.ResultSender.value):
+            all_senders = plugin_registry.senders()
             print(all_senders, "all_senders")
             self.sender_combo.addItems(all_senders)
-        except ImportError:
+        else:
             QMessageBox.warning(
                 self,
                 "Module Error",
                 "result_sender module not found or does not have __all_senders__ attribute.",
             )
-        else:
-            self.sender_combo.setCurrentText(
-                str(config.serial_config.production_result_sender_module)
-            )
+            return
+        self.sender_combo.setCurrentText(
+            str(config.serial_config.production_result_sender_module)
+        )
 
     def install_dependencies(self, dependencies):
         backup_pyproject = "pyproject.toml.bak"
@@ -1560,6 +2122,7 @@ class SpecificationUploadTab(QWidget):
                 )
 
         else:
+            plugin_registry.invalidate()
             print("Dependencies installed successfully.")
             QMessageBox.information(self, "완료", "모든 패키지 설치 완료.")
             self.initUI()
@@ -1616,7 +2179,7 @@ class SpecificationUploadTab(QWidget):
                 self, "설치 필요", f"패키지 [{', '.join(missing_packages)}]가 없습니다."
             )
             return
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
         if not config.serial_config.production_result_sender_module:
             QMessageBox.critical(
@@ -1640,6 +2203,8 @@ class SpecificationUploadTab(QWidget):
 
 
 def merge_toml_files(existing_toml_path, new_toml_path):
+    import toml
+
     with open(existing_toml_path, "r") as f:
         existing_toml = toml.load(f)
 
@@ -1655,56 +2220,210 @@ def merge_toml_files(existing_toml_path, new_toml_path):
     return merged_toml
 
 
-from multiprocessing import Queue
+class StatisticsPanel(QGroupBox):
+    """라인별 rolling window 통계(과일 수, 등급 분포, 도착 간격)를 주기적으로 보여주는 패널"""
 
-from server import data_queue
+    def __init__(self, parent=None, statistics=None, refresh_ms=1000):
+        super(StatisticsPanel, self).__init__("라인별 실시간 통계", parent)
+        self.statistics = statistics
+        self.initUI()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+
+    def initUI(self):
+        from result_statistics import STATISTICS_WINDOWS
+
+        self.windows = STATISTICS_WINDOWS
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget()
+        headers = ["Line"]
+        for window in self.windows:
+            headers.append(f"{window}s 개수")
+        headers += [
+            "1분 개/초",
+            "1분 등급 분포",
+            "1분 평균 간격(ms)",
+            "1분 간격 편차(ms)",
+        ]
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def refresh(self):
+        if self.statistics is None or not self.isVisible():
+            return
+        snapshot = self.statistics.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, (line_idx, windows) in enumerate(sorted(snapshot.items())):
+            minute = windows[60]
+            grades = ", ".join(
+                f"{grade}:{count}"
+                for grade, count in enumerate(minute["grades"])
+                if count
+            )
+            values = [str(line_idx)]
+            values += [str(windows[window]["count"]) for window in self.windows]
+            values += [
+                f"{minute['rate']:.2f}",
+                grades,
+                f"{minute['gap_mean'] * 1000:.1f}",
+                f"{minute['gap_std'] * 1000:.1f}",
+            ]
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(value))
+                else:
+                    item.setText(value)
+
+
+class SparklineWidget(QWidget):
+    """최근 값들을 선 하나로 그리는 작은 그래프"""
+
+    def __init__(self, parent=None, length=120):
+        super(SparklineWidget, self).__init__(parent)
+        self.values = collections.deque(maxlen=length)
+        self.setMinimumHeight(60)
+
+    def append(self, value: float):
+        self.values.append(value)
+        self.update()
+
+    def paintEvent(self, event):
+        if len(self.values) < 2:
+            return
+        painter = QPainter(self)
+        painter.setPen(QPen(Qt.darkGreen, 2))
+        low, high = min(self.values), max(self.values)
+        span = (high - low) or 1.0
+        width, height = self.width() - 1, self.height() - 1
+        step = width / (self.values.maxlen - 1)
+        painter.drawPolyline(
+            QPolygonF(
+                [
+                    QPointF(i * step, height - (value - low) / span * height)
+                    for i, value in enumerate(self.values)
+                ]
+            )
+        )
+
+
+class ConveyorPanel(QGroupBox):
+    """입력 pulse로 계산한 컨베이어 속도(pulse/초), 지터, 아두이노 시계 drift를 보여주는 패널"""
+
+    def __init__(self, parent=None, clock=None, refresh_ms=500):
+        super(ConveyorPanel, self).__init__("컨베이어 pulse", parent)
+        self.clock = clock
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel("pulse 수집 대기 중")
+        self.speed_graph = SparklineWidget(self)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.speed_graph)
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+
+    def refresh(self):
+        if self.clock is None or not self.isVisible():
+            return
+        snapshot = self.clock.snapshot()
+        if not snapshot.get("pulses"):
+            return
+        latency = snapshot["latency"]
+        self.summary_label.setText(
+            f"속도 {snapshot['rate']:.2f} pulse/s | "
+            f"간격 {snapshot['interval_mean'] * 1000:.1f}ms "
+            f"(지터 {snapshot['jitter'] * 1000:.2f}ms) | "
+            f"drift {snapshot['drift_ppm']:.0f}ppm | "
+            f"시리얼 지연(최소 대비) {latency * 1000 if latency is not None else 0:.1f}ms"
+        )
+        self.speed_graph.append(snapshot["rate"])
 
 
 # class SignalSettings(QTabWidget):
+class LazyTab(QWidget):
+    """처음 보일 때 factory()로 실제 탭을 만들어 넣는 자리 표시 위젯"""
+
+    def __init__(self, factory, parent=None):
+        super(LazyTab, self).__init__(parent)
+        self.factory = factory
+        self.build_seconds = None
+        self._widget = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    @property
+    def is_built(self) -> bool:
+        return self._widget is not None
+
+    def widget(self) -> QWidget:
+        if self._widget is None:
+            start = time.perf_counter()
+            self._widget = self.factory()
+            self.layout().addWidget(self._widget)
+            self.build_seconds = time.perf_counter() - start
+        return self._widget
+
+
 class SignalSettings(QWidget):
-    def __init__(self, loop=None):
+    # 다른 스레드에서 오는 로그를 GUI 스레드로 넘기는 시그널
+    sender_log_signal = pyqtSignal(str)
+    # config_store 구독자는 저장한 스레드에서 불리므로 GUI 스레드로 넘긴다 (바뀐 경로, version)
+    config_changed = pyqtSignal(object, int)
+
+    def __init__(self, loop=None, control_client=None):
         super().__init__()
         self.loop = loop
-        self.result_data_queue = data_queue
-        self.initUI()
-        self.setup_logging()
+        # control_client가 있으면 process_mode.py로 띄운 API 서버/sender의 client로 동작한다
+        self.control_client = control_client
+        # server 모듈(FastAPI app, 통계)을 불러온 뒤 start_backend()에서 채운다
+        self.result_data_queue = None
+        self.sender_host = None
+        self.server_thread = None
+        self.result_sender_thread = None
+        self.use_sender_process = False
+        self.sender_supervisor = None
+        self.sender_log_signal.connect(self.update_log)
+        self.config_changed.connect(self.on_config_changed)
+        config_store.subscribe(
+            lambda root_config, changed_paths, version: self.config_changed.emit(
+                changed_paths, version
+            )
+        )
+        with startup_timing.section("UI"):
+            self.initUI()
         self.setup_shortcuts()
-        self.load_previous_settings()
-        self.server_thread.start()
         self.need_packages = [package_enum.value for package_enum in NeedPackageEnum]
+        # 첫 화면을 그린 다음에 server를 불러오고 시작한다
+        QTimer.singleShot(0, self.start_backend)
 
     def initUI(self):
         # 메인 레이아웃 설정
-        main_layout = QVBoxLayout(self)
+        self.main_layout = QVBoxLayout(self)
 
-        # 탭 위젯을 위한 섹션
+        # 탭 위젯을 위한 섹션. 탭은 처음 볼 때 만든다 (LazyTab)
         self.previous_index = 0
         self.tab_widget = QTabWidget(self)
-        self.line_count_tab = LineCountTab(
-            self, tab_widget=self.tab_widget, main_widget=self
-        )
-        self.serial_test_tab = SerialTestTab(
-            self, tab_widget=self.tab_widget, main_widget=self
-        )
-        self.specification_upload_tab = SpecificationUploadTab(
-            self, tab_widget=self.tab_widget, main_widget=self
-        )
-        self.arduino_upload_tab = ArduinoUploadTab(
-            self, tab_widget=self.tab_widget, main_widget=self
-        )
-        self.conveyor_message_tab = ConveyorMessageTab(
-            self,
-            tab_widget=self.tab_widget,
-            main_widget=self,
-            loop=self.loop,
-            result_data_queue=self.result_data_queue,
-        )
-
-        self.tab_widget.addTab(self.line_count_tab, "라인 개수 입력")
-        self.tab_widget.addTab(self.serial_test_tab, "시리얼 테스트")
-        self.tab_widget.addTab(self.specification_upload_tab, "명세서 업로드")
-        self.tab_widget.addTab(self.arduino_upload_tab, "프로덕션 아두이노 코드 업로드")
-        self.tab_widget.addTab(self.conveyor_message_tab, "선별기 메시지 전송")
+        self.lazy_tabs = [
+            LazyTab(self.build_line_count_tab, self),
+            LazyTab(self.build_serial_test_tab, self),
+            LazyTab(self.build_specification_upload_tab, self),
+            LazyTab(self.build_arduino_upload_tab, self),
+            LazyTab(self.build_conveyor_message_tab, self),
+        ]
+        tab_titles = [
+            "라인 개수 입력",
+            "시리얼 테스트",
+            "명세서 업로드",
+            "프로덕션 아두이노 코드 업로드",
+            "선별기 메시지 전송",
+        ]
+        for lazy_tab, title in zip(self.lazy_tabs, tab_titles):
+            self.tab_widget.addTab(lazy_tab, title)
 
         # self.tab_widget.setTabEnabled(TabIndexEnum.SERIAL_TEST.value, False)
         # self.tab_widget.setTabEnabled(TabIndexEnum.SPECIFICATION_UPLOAD.value, False)
@@ -1712,14 +2431,151 @@ class SignalSettings(QWidget):
         # self.tab_widget.setTabEnabled(TabIndexEnum.CONVEYOR_MESSAGE.value, False)
 
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        # on_tab_changed가 다른 탭으로 돌려보낼 수 있으므로 그 다음에 현재 탭을 만든다
+        self.tab_widget.currentChanged.connect(self.build_current_tab)
         # 탭 위젯을 메인 레이아웃에 추가
-        main_layout.addWidget(self.tab_widget)
-        self.server_thread = FastAPIServerThread()
+        self.main_layout.addWidget(self.tab_widget)
         # 로그 섹션 추가
         self.log_text_edit = QTextEdit()
         self.log_text_edit.setReadOnly(True)  # 로그 창은 읽기 전용으로 설정
+        self.main_layout.addWidget(self.log_text_edit)
+        self.build_current_tab()
+
+    def start_backend(self):
+        """server를 불러와 data_queue/sender host/패널을 연결하고 API 서버를 시작합니다."""
+        if self.result_data_queue is not None:
+            return
+        startup_timing.mark("first paint")
+        with startup_timing.section("import server"):
+            from server import (
+                FastAPIServerThread,
+                data_queue,
+                pulse_clock,
+                result_statistics,
+            )
+        # server가 import 때 logging 설정을 먼저 하므로 그 다음에 부른다 (기존 순서 유지)
+        self.setup_logging()
+        self.result_data_queue = data_queue
+        self.sender_host = SenderHost(self.result_data_queue)
+        self.server_thread = FastAPIServerThread()
         self.server_thread.log_signal.connect(self.update_log)
-        main_layout.addWidget(self.log_text_edit)
+
+        with startup_timing.section("panels"):
+            # 라인별 통계 패널
+            if self.control_client is None:
+                statistics = result_statistics
+            else:
+                from process_mode import RemoteStatistics
+
+                statistics = RemoteStatistics()
+            self.statistics_panel = StatisticsPanel(self, statistics=statistics)
+            self.main_layout.addWidget(self.statistics_panel)
+
+            # 컨베이어 pulse 패널
+            if self.control_client is None:
+                clock = pulse_clock
+            else:
+                from process_mode import RemoteConveyor
+
+                clock = RemoteConveyor()
+            self.conveyor_panel = ConveyorPanel(self, clock=clock)
+            self.main_layout.addWidget(self.conveyor_panel)
+
+        with startup_timing.section("previous settings"):
+            self.load_previous_settings()
+        if self.control_client is None:
+            self.server_thread.start()
+        else:
+            self.start_control_polling()
+        startup_timing.mark("ready")
+        self.update_log(startup_timing.report())
+
+    def build_current_tab(self, *_):
+        lazy_tab = self.lazy_tabs[self.tab_widget.currentIndex()]
+        if lazy_tab.is_built:
+            return
+        lazy_tab.widget()
+        self.update_log(
+            f"탭 생성 {self.tab_widget.tabText(self.tab_widget.currentIndex())}: "
+            f"{lazy_tab.build_seconds * 1000:.0f}ms"
+        )
+
+    def restore_config_fields(self, tab, tab_index, changed_paths=None):
+        """CONFIG_FIELD_WIDGETS 중 tab에 있는 필드를 현재 설정으로 채웁니다 (changed_paths만)."""
+        root_config: RootConfig = config_store.get()
+        for path, (index, widget_name, setter) in CONFIG_FIELD_WIDGETS.items():
+            if index != tab_index:
+                continue
+            if changed_paths is not None and path not in changed_paths:
+                continue
+            value = root_config
+            for name in path.split("."):
+                value = getattr(value, name)
+            text = value.value if isinstance(value, Enum) else str(value)
+            getattr(getattr(tab, widget_name), setter)(text)
+
+    def on_config_changed(self, changed_paths, version):
+        """저장된 설정 중 이미 만든 탭에 보이는 필드만 다시 채웁니다."""
+        if self.control_client is not None:
+            # API 서버 프로세스가 설정 파일을 다시 읽도록 알린다
+            try:
+                self.control_client.request("config_committed", version=version)
+            except (OSError, RuntimeError) as e:
+                self.update_log(f"**제어 소켓 오류**: {e}")
+        for tab_index in {index for index, _, _ in CONFIG_FIELD_WIDGETS.values()}:
+            lazy_tab = self.lazy_tabs[tab_index.value]
+            if lazy_tab.is_built:
+                self.restore_config_fields(lazy_tab.widget(), tab_index, changed_paths)
+
+    def build_line_count_tab(self):
+        tab = LineCountTab(self, tab_widget=self.tab_widget, main_widget=self)
+        self.restore_config_fields(tab, TabIndexEnum.LINE_COUNT)
+        return tab
+
+    def build_serial_test_tab(self):
+        tab = SerialTestTab(self, tab_widget=self.tab_widget, main_widget=self)
+        self.restore_config_fields(tab, TabIndexEnum.SERIAL_TEST)
+        return tab
+
+    def build_specification_upload_tab(self):
+        # sender 목록과 현재 sender는 탭이 직접 채운다
+        return SpecificationUploadTab(
+            self, tab_widget=self.tab_widget, main_widget=self
+        )
+
+    def build_arduino_upload_tab(self):
+        return ArduinoUploadTab(self, tab_widget=self.tab_widget, main_widget=self)
+
+    def build_conveyor_message_tab(self):
+        # data_queue/sender host를 쓰므로 server를 먼저 불러온다
+        self.start_backend()
+        return ConveyorMessageTab(
+            self,
+            tab_widget=self.tab_widget,
+            main_widget=self,
+            loop=self.loop,
+            result_data_queue=self.result_data_queue,
+        )
+
+    @property
+    def line_count_tab(self) -> LineCountTab:
+        return self.lazy_tabs[TabIndexEnum.LINE_COUNT.value].widget()
+
+    @property
+    def serial_test_tab(self) -> SerialTestTab:
+        return self.lazy_tabs[TabIndexEnum.SERIAL_TEST.value].widget()
+
+    @property
+    def specification_upload_tab(self) -> SpecificationUploadTab:
+        return self.lazy_tabs[TabIndexEnum.SPECIFICATION_UPLOAD.value].widget()
+
+    @property
+    def arduino_upload_tab(self) -> ArduinoUploadTab:
+        return self.lazy_tabs[TabIndexEnum.ARDUINO_UPLOAD.value].widget()
+
+    @property
+    def conveyor_message_tab(self) -> ConveyorMessageTab:
+        return self.lazy_tabs[TabIndexEnum.CONVEYOR_MESSAGE.value].widget()
 
     def update_log(self, log_message):
         self.log_text_edit.append(log_message)
@@ -1731,7 +2587,7 @@ class SignalSettings(QWidget):
         self.previous_index = tab_index
 
     def on_tab_changed(self, index):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
 
         condition_list = [
@@ -1781,18 +2637,9 @@ class SignalSettings(QWidget):
         self.previous_index = index
 
     def load_previous_settings(self):
-        root_config: RootConfig = load_server_root_config()
+        root_config: RootConfig = config_store.get()
         config: ServerConfig = root_config.config
         serial_result_sender = config.serial_config.production_result_sender_module
-        if self.is_package_importable(f"{NeedPackageEnum.ResultSender.value}"):
-            sender_module = importlib.import_module(
-                f"{NeedPackageEnum.ResultSender.value}"
-            )
-            all_senders = getattr(sender_module, "__all_senders__", [])
-            self.specification_upload_tab.sender_combo.clear()
-            self.specification_upload_tab.sender_combo.addItem("----")
-            self.specification_upload_tab.sender_combo.addItems(all_senders)
-        self.line_count_tab.line_edit.setText(str(config.program_config.line_count))
 
         if int(config.program_config.line_count):
             self.update_log("라인 수 지정 완료!")
@@ -1806,31 +2653,11 @@ class SignalSettings(QWidget):
         else:
             self.update_log("**업로드 아두이노 포트 지정 필요**")
 
-        self.serial_test_tab.message_edit.setText(config.arduino_config.test_message)
-        self.serial_test_tab.baudrate_combo.setCurrentText(
-            str(config.arduino_config.baudrate)
-        )
-        self.serial_test_tab.write_message_edit.setText(
-            config.serial_config.test_message_to_sorter
-        )
-        self.serial_test_tab.write_baudrate_combo.setCurrentText(
-            str(config.serial_config.baudrate)
-        )
-
-        self.serial_test_tab.encoder_combo.setCurrentText(
-            config.serial_config.test_message_encode_type.value
-        )
-        self.serial_test_tab.format_combo.setCurrentText(
-            config.serial_config.test_message_format_type.value
-        )
         serial_result_sender_module = self.get_result_sender_module(
             f"{serial_result_sender}"
         )
 
         if serial_result_sender and serial_result_sender_module:
-            self.specification_upload_tab.sender_combo.setCurrentText(
-                serial_result_sender
-            )
             self.tab_widget.setTabEnabled(TabIndexEnum.ARDUINO_UPLOAD.value, True)
             self.update_log("프로덕션 모듈 선택 완료!")
         else:
@@ -1841,15 +2668,84 @@ class SignalSettings(QWidget):
             self.update_log("프로덕션 아두이노 코드 업로드 완료!")
         else:
             self.update_log("**프로덕션 아두이노 코드 업로드 필요**")
+        self.log_plugin_import_times()
+
+    def start_result_sender(self, result_sender_name=None, reload=False):
+        """ResultSender를 시작하거나, 이미 실행 중이면 새 sender로 교체합니다."""
+        if self.control_client is not None:
+            try:
+                name = self.control_client.request(
+                    "switch_sender", sender_name=result_sender_name
+                )
+                self.update_log(f"sender 프로세스 전환 요청: {name}")
+            except (OSError, RuntimeError) as e:
+                self.update_log(f"**제어 소켓 오류**: {e}")
+            return
+        if self.use_sender_process or self.sender_supervisor is not None:
+            self.start_supervised_sender(result_sender_name)
+            return
+        from result_sender_thread import ResultSenderThread
+
+        sender_thread = self.result_sender_thread
+        if sender_thread is not None and sender_thread.isRunning():
+            self.update_log("ResultSender 전환이 진행 중입니다.")
+            return
+        self.result_sender_thread = ResultSenderThread(
+            result_data_queue=self.result_data_queue,
+            sender_host=self.sender_host,
+            result_sender_name=result_sender_name,
+            reload=reload,
+        )
+        self.result_sender_thread.log_signal.connect(self.update_log)
+        self.result_sender_thread.start()
+
+    def start_supervised_sender(self, result_sender_name=None):
+        """sender를 자식 프로세스로 실행합니다. 이미 실행 중이면 다시 띄웁니다."""
+        if not result_sender_name:
+            root_config: RootConfig = config_store.get()
+            config: ServerConfig = root_config.config
+            result_sender_name = config.serial_config.production_result_sender_module
+        if self.sender_host.sender is not None:
+            # 스레드로 돌던 sender는 남은 결과를 data_queue로 돌려놓고 멈춘다
+            self.sender_host.stop()
+        if self.sender_supervisor is None:
+            self.sender_supervisor = SenderSupervisor(self.result_data_queue)
+            self.sender_supervisor.log_callbacks.append(self.sender_log_signal.emit)
+            self.sender_supervisor.restart_callbacks.append(self.on_sender_restarted)
+            self.sender_supervisor.start(result_sender_name)
+            self.update_log(f"{result_sender_name} sender 프로세스 시작")
+            return
+        threading.Thread(
+            target=self.sender_supervisor.switch,
+            args=(result_sender_name,),
+            daemon=True,
+        ).start()
+
+    def start_control_polling(self):
+        """client 모드에서 제어 소켓의 로그를 주기적으로 가져옵니다."""
+        self.control_log_index = 0
+        self.control_timer = QTimer(self)
+        self.control_timer.timeout.connect(self.poll_control_logs)
+        self.control_timer.start(500)
+
+    def poll_control_logs(self):
+        try:
+            logs = self.control_client.request("logs", since=self.control_log_index)
+        except (OSError, RuntimeError):
+            return
+        self.control_log_index = logs["next"]
+        for line in logs["lines"]:
+            self.update_log(line)
+
+    def on_sender_restarted(self, sender_name, reason, restart_seconds):
+        self.sender_log_signal.emit(
+            f"**{sender_name} sender 재시작** ({reason}, {restart_seconds * 1000:.0f}ms, "
+            f"누적 {self.sender_supervisor.restart_count}회)"
+        )
 
     def get_result_sender_module(self, result_sender: str):
         """ResultSender가 있는 모듈을 반환합니다"""
-        target_module = (
-            f"{NeedPackageEnum.ResultSender.value}.all_senders.{result_sender}"
-        )
-        if not self.is_package_importable(target_module):
-            return None
-        return importlib.import_module(target_module)
+        return plugin_registry.get_module(result_sender)
 
     def setup_logging(self):
         logging.basicConfig(
@@ -1902,11 +2798,11 @@ class SignalSettings(QWidget):
         return missing_packages
 
     def is_package_importable(self, package_name):
-        try:
-            importlib.import_module(package_name)
-            return True
-        except ImportError:
-            return False
+        return plugin_registry.is_available(package_name)
+
+    def log_plugin_import_times(self):
+        for module_name, seconds in plugin_registry.import_times().items():
+            self.update_log(f"플러그인 import {module_name}: {seconds * 1000:.1f}ms")
 
     def restart_program(self):
         """현재 실행 중인 프로그램을 재실행합니다."""
@@ -1918,8 +2814,21 @@ class SignalSettings(QWidget):
             sys.exit(1)  # 재실행에 실패한 경우 프로그램을 종료
 
     def save_root_config(self, root_config: RootConfig):
+        """
+        config_store.checkout()으로 받아 고친 설정을 저장합니다.
+
+        그 사이 다른 곳에서 같은 필드를 바꿨으면 저장하지 않는다. 라인 push(config_channel)와 탭
+        갱신은 config_store 구독자가 한다.
+        """
         try:
-            save_config(root_config)
+            config_store.commit(root_config)
+        except ConfigConflict as e:
+            QMessageBox.warning(
+                self,
+                "저장 충돌",
+                f"다른 곳에서 같은 설정을 먼저 바꿨습니다. 다시 시도해 주세요.\n{', '.join(e.paths)}",
+            )
+            return False
         except Exception as e:
             QMessageBox.critical(self, "저장 오류", f"저장 오류. 관리자 문의 필요 {e}")
             return False
@@ -1942,7 +2851,12 @@ if __name__ == "__main__":
     backup_config()
     # TODO test_status를 True로 변경하고 종료 시에는 반드시 test_status를 false로 변경한다.
     app = QApplication(sys.argv)
-    ex = SignalSettings(loop=new_loop)
+    control_client = None
+    if "--client" in sys.argv:
+        from control_channel import ControlClient
+
+        control_client = ControlClient()
+    ex = SignalSettings(loop=new_loop, control_client=control_client)
     ex.show()
     sys.exit(app.exec_())
 
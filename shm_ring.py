@@ -0,0 +1,114 @@
+import json
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+# header: write_index, read_index, dropped (각각 uint64) + slot 크기, slot 개수
+_HEADER = struct.Struct("<QQQII")
+_LENGTH = struct.Struct("<I")
+_WRITE_OFFSET = 0
+_READ_OFFSET = 8
+_DROPPED_OFFSET = 16
+
+
+class SharedRing:
+    """
+    프로세스 간 결과 전달용 공유 메모리 ring (producer 1개, consumer 1개).
+
+    slot마다 길이(uint32) + JSON 바이트를 저장한다. 가득 차거나 slot보다 큰 결과는 put이 기다리지
+    않고 버린 개수만 센다.
+    queue.Queue와 같은 get/put/qsize를 제공하므로 SenderHost나 ResultSender에 그대로 넘길 수 있다.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self._memory = memory
+        self._buffer = memory.buf
+        self.owner = owner
+        _, _, _, self.slot_size, self.capacity = _HEADER.unpack_from(self._buffer, 0)
+        self._data_offset = _HEADER.size
+
+    @classmethod
+    def create(cls, name=None, capacity=65536, slot_size=512):
+        memory = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER.size + capacity * slot_size
+        )
+        _HEADER.pack_into(memory.buf, 0, 0, 0, 0, slot_size, capacity)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def _load(self, offset) -> int:
+        return struct.unpack_from("<Q", self._buffer, offset)[0]
+
+    def _store(self, offset, value):
+        struct.pack_into("<Q", self._buffer, offset, value)
+
+    @property
+    def dropped(self) -> int:
+        return self._load(_DROPPED_OFFSET)
+
+    def qsize(self) -> int:
+        return self._load(_WRITE_OFFSET) - self._load(_READ_OFFSET)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def put_nowait(self, item: dict) -> bool:
+        payload = json.dumps(item, separators=(",", ":"), default=str).encode()
+        write_index = self._load(_WRITE_OFFSET)
+        if (
+            len(payload) > self.slot_size - _LENGTH.size
+            or write_index - self._load(_READ_OFFSET) >= self.capacity
+        ):
+            self._store(_DROPPED_OFFSET, self.dropped + 1)
+            return False
+        offset = self._data_offset + (write_index % self.capacity) * self.slot_size
+        _LENGTH.pack_into(self._buffer, offset, len(payload))
+        self._buffer[offset + _LENGTH.size : offset + _LENGTH.size + len(payload)] = (
+            payload
+        )
+        # 데이터를 다 쓴 뒤에 write index를 올려야 consumer가 읽을 수 있다
+        self._store(_WRITE_OFFSET, write_index + 1)
+        return True
+
+    def put(self, item: dict, block=True, timeout=None) -> bool:
+        return self.put_nowait(item)
+
+    def get_nowait(self) -> dict:
+        read_index = self._load(_READ_OFFSET)
+        if read_index == self._load(_WRITE_OFFSET):
+            raise queue.Empty
+        offset = self._data_offset + (read_index % self.capacity) * self.slot_size
+        (length,) = _LENGTH.unpack_from(self._buffer, offset)
+        start = offset + _LENGTH.size
+        item = json.loads(bytes(self._buffer[start : start + length]))
+        self._store(_READ_OFFSET, read_index + 1)
+        return item
+
+    def get(self, block=True, timeout=None) -> dict:
+        if not block:
+            return self.get_nowait()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sleep = 0.0001
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+            # 공유 메모리에는 알림이 없으므로 짧게 쉬면서 polling 한다
+            time.sleep(sleep)
+            sleep = min(sleep * 2, 0.002)
+
+    def close(self):
+        self._buffer = None
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
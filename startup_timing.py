@@ -0,0 +1,42 @@
+"""
+GUI 시작 시간 측정.
+
+이 모듈을 처음 import한 시각을 0으로 보고 구간(section)과 시점(mark)을 기록한다.
+server_config_app.py가 가장 먼저 import해서 import 시간까지 잰다.
+"""
+
+import contextlib
+import time
+
+
+class StartupTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = []  # (이름, 걸린 초)
+        self.marks = []  # (이름, 시작부터 초)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections.append((name, time.perf_counter() - start))
+
+    def mark(self, name: str):
+        self.marks.append((name, self.elapsed()))
+
+    def report(self) -> str:
+        sections = ", ".join(
+            f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.sections
+        )
+        marks = ", ".join(
+            f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.marks
+        )
+        return f"시작 구간: {sections}\n시작 시점: {marks}"
+
+
+startup_timing = StartupTiming()
@@ -0,0 +1,291 @@
+"""
+선별기 출력 검증용 고속 test pattern 생성기.
+
+선택한 라인에 합성 등급 결과를 정해진 속도로 data_queue(-> sender)에 바로 넣고(이력/통계/audit sink는
+거치지 않는다), 출력 포트의 loopback(가상 포트는 기본 loopback, 실제 포트는 TX-RX 연결 또는 echo
+스케치)으로 돌아온 record가 보낸 순서대로, max_latency 안에 모두 나왔는지 확인한다.
+
+pattern
+    round_robin  선택 라인을 돌아가며 라인별 Test 등급
+    burst        burst_size개를 한꺼번에 보내고 쉬기 (평균 속도는 rate)
+    random       라인과 등급(0~5) 무작위
+
+find_max_rate()는 속도를 두 배씩 올리다가 실패하면 그 사이를 이분 탐색해서 유지 가능한 최대 속도를 찾는다.
+"""
+
+import collections
+import logging
+import random
+import threading
+import time
+
+from binary_protocol import result_record_codec
+from ingest import IngestRejected
+from serial_router import build_route_table, decode_text_records
+
+logger = logging.getLogger("test_patterns")
+
+PATTERNS = ("round_robin", "burst", "random")
+GRADE_COUNT = 6
+
+
+def pattern_events(pattern, lines, grades=None, count=100, seed=None) -> list:
+    """pattern에 따라 (line_idx, grade) count개를 만듭니다."""
+    if pattern not in PATTERNS:
+        raise ValueError(f"unknown pattern {pattern}")
+    grades = grades or {}
+    lines = list(lines)
+    if pattern == "random":
+        generator = random.Random(seed)
+        return [
+            (generator.choice(lines), generator.randrange(GRADE_COUNT))
+            for _ in range(count)
+        ]
+    return [
+        (lines[index % len(lines)], grades.get(lines[index % len(lines)], 0))
+        for index in range(count)
+    ]
+
+
+def pattern_times(pattern, count, rate, burst_size=8) -> list:
+    """시작 기준 송신 시각(초). burst는 burst_size개를 같은 시각에 보낸다."""
+    if pattern == "burst":
+        return [(index // burst_size) * burst_size / rate for index in range(count)]
+    return [index / rate for index in range(count)]
+
+
+def max_output_rate(output, protocol="text") -> float:
+    """보드레이트로 낼 수 있는 출력 하나의 최대 record/s (1byte = 10bit, record당 frame 하나)"""
+    if protocol == "binary":
+        record_size = result_record_codec.size
+    else:
+        record_size = len(f"{output.pin},0\n")
+    return int(output.baudrate) / 10 / record_size
+
+
+class OutputVerifier(threading.Thread):
+    """
+    출력 포트 하나로 돌아온 record를 기대 순서와 맞춰 봅니다.
+
+    expect()로 (key, 보낸 시각)을 쌓고, 읽은 record가 맨 앞과 같으면 순서대로 나온 것이다.
+    다르면 뒤에서 같은 key를 찾아 그 앞은 누락으로 센다.
+    """
+
+    def __init__(self, port, protocol="text", max_latency=0.05):
+        super().__init__(
+            name=f"OutputVerifier-{getattr(port, 'port', port)}", daemon=True
+        )
+        self.port = port
+        self.protocol = protocol
+        self.max_latency = max_latency
+        self.counts = collections.Counter()
+        self.latencies = []
+        self._expected = collections.deque()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def expect(self, key, sent_at):
+        with self._lock:
+            self._expected.append((key, sent_at))
+            self.counts["expected"] += 1
+
+    def run(self):
+        buffer = b""
+        while not self._stop_event.is_set():
+            data = self.port.read(max(1, self.port.in_waiting))
+            if not data:
+                continue
+            received_at = time.perf_counter()
+            if self.protocol == "binary":
+                records, buffer = result_record_codec.decode_buffer(buffer + data)
+                keys = [(record["pin"], record["line"]) for record in records]
+            else:
+                keys, buffer = decode_text_records(buffer + data)
+            for key in keys:
+                self._match(key, received_at)
+
+    def _match(self, key, received_at):
+        with self._lock:
+            if not self._expected:
+                self.counts["unexpected"] += 1
+                return
+            index = next(
+                (
+                    i
+                    for i, (expected, _) in enumerate(self._expected)
+                    if expected == key
+                ),
+                None,
+            )
+            if index is None:
+                self.counts["unexpected"] += 1
+                return
+            if index:
+                self.counts["out_of_order"] += 1
+                self.counts["missing"] += index
+            for _ in range(index):
+                self._expected.popleft()
+            _, sent_at = self._expected.popleft()
+        latency = received_at - sent_at
+        self.latencies.append(latency)
+        self.counts["received"] += 1
+        if latency > self.max_latency:
+            self.counts["late"] += 1
+
+    def finish(self, wait=0.5) -> dict:
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._expected:
+                    break
+            time.sleep(0.01)
+        self._stop_event.set()
+        self.join(timeout=2)
+        with self._lock:
+            self.counts["missing"] += len(self._expected)
+            self._expected.clear()
+        latencies = sorted(self.latencies)
+        return {
+            **self.counts,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class TestPatternRunner:
+    """
+    test pattern을 보내고 출력 포트별로 검증합니다.
+
+    put은 결과 하나를 data_queue에 넣는 함수(data_queue.put_nowait, OffsetCalibration과 같다).
+    dispatch_result를 쓰면 합성 결과가 운영 이력/통계/audit에 섞인다. router는 실행 중인
+    sender의 SerialOutputRouter다 (포트 writer가 연 포트를 그대로 읽는다).
+    """
+
+    def __init__(self, put, router, protocol="text", max_latency=0.05):
+        self.put = put
+        self.router = router
+        self.protocol = protocol
+        self.max_latency = max_latency
+
+    def _ports(self):
+        ports = {}
+        for port_name, writer in self.router.writers.items():
+            if writer.serial is None:
+                raise RuntimeError(f"{port_name} writer가 아직 포트를 열지 않았습니다.")
+            ports[port_name] = writer.serial
+        return ports
+
+    def sorter_max_rate(self, lines) -> float:
+        """선택 라인을 고르게 보낼 때 출력 보드레이트가 허용하는 최대 결과/s (검색 상한)"""
+        outputs = self.router.outputs
+        route_table = self.router.route_table
+        shares = collections.Counter(
+            route_table[line % len(route_table)] for line in lines
+        )
+        return min(
+            max_output_rate(outputs[index], self.protocol) * len(lines) / share
+            for index, share in shares.items()
+        )
+
+    def run(
+        self,
+        pattern,
+        lines,
+        grades=None,
+        rate=100.0,
+        seconds=5.0,
+        burst_size=8,
+        seed=None,
+    ) -> dict:
+        lines = list(lines)
+        count = max(int(rate * seconds), 1)
+        events = pattern_events(pattern, lines, grades, count, seed)
+        times = pattern_times(pattern, count, rate, burst_size)
+        outputs = self.router.outputs
+        route_table = self.router.route_table or build_route_table(outputs)
+        ports = self._ports()
+        verifiers = {}
+        for port_name, port in ports.items():
+            port.reset_input_buffer()
+            verifiers[port_name] = OutputVerifier(port, self.protocol, self.max_latency)
+            verifiers[port_name].start()
+        dropped = 0
+        started = time.perf_counter()
+        for (line_idx, grade), offset in zip(events, times):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            output = outputs[route_table[line_idx % len(route_table)]]
+            key = (
+                int(output.pin),
+                grade if self.protocol != "binary" else line_idx & 0xFF,
+            )
+            sent_at = time.perf_counter()
+            verifiers[output.port].expect(key, sent_at)
+            result = {
+                "line_idx": line_idx,
+                "grade": grade,
+                "count_flag": grade,
+                "received_at": time.time(),
+                "test_pattern": pattern,
+            }
+            try:
+                accepted = self.put(result) is not False
+            except IngestRejected:
+                accepted = False
+            if not accepted:
+                dropped += 1
+        elapsed = time.perf_counter() - started
+        ports_report = {
+            port_name: verifier.finish(wait=max(self.max_latency * 4, 0.5))
+            for port_name, verifier in verifiers.items()
+        }
+        failures = sum(
+            report.get(key, 0)
+            for report in ports_report.values()
+            for key in ("missing", "out_of_order", "late", "unexpected")
+        )
+        return {
+            "pattern": pattern,
+            "rate": rate,
+            "sent": count,
+            "achieved_rate": count / elapsed if elapsed else None,
+            "dropped": dropped,
+            "ports": ports_report,
+            "ok": failures == 0 and dropped == 0,
+        }
+
+    def find_max_rate(
+        self,
+        pattern,
+        lines,
+        grades=None,
+        start_rate=50.0,
+        seconds=3.0,
+        steps=6,
+        **options,
+    ) -> dict:
+        """두 배씩 올려 실패 지점을 찾고 이분 탐색으로 유지 가능한 최대 속도를 찾습니다."""
+        limit = self.sorter_max_rate(lines)
+        runs = []
+        good, bad = None, None
+        rate = min(start_rate, limit)
+        while bad is None and (good is None or good < limit):
+            report = self.run(pattern, lines, grades, rate, seconds, **options)
+            runs.append(report)
+            if report["ok"]:
+                good = rate
+                rate = min(rate * 2, limit)
+                if rate == good:
+                    break
+            else:
+                bad = rate
+        for _ in range(steps if bad is not None and good is not None else 0):
+            rate = (good + bad) / 2
+            report = self.run(pattern, lines, grades, rate, seconds, **options)
+            runs.append(report)
+            if report["ok"]:
+                good = rate
+            else:
+                bad = rate
+        return {"max_rate": good, "sorter_limit": limit, "runs": runs}
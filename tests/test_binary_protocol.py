@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from binary_protocol import (
+    FIRE_INPUT,
+    crc8,
+    fire_input,
+    generate_binary_sketch,
+    pulse_record_codec,
+    result_record_codec,
+)
+
+
+def test_result_record_round_trip():
+    values = {"seq": 255, "line": 2, "pin": 7, "grade": 3, "offset": 0xFFFF}
+    record = result_record_codec.encode_dict(values)
+    assert len(record) == result_record_codec.size
+    assert record[0] == result_record_codec.sync
+    assert record[-1] == crc8(record[1:-1])
+    assert result_record_codec.decode(record) == values
+
+
+def test_pulse_record_round_trip_at_uint32_limit():
+    record = pulse_record_codec.encode(fire_input(9), 0xFFFFFFFF, 0)
+    assert pulse_record_codec.decode(record) == {
+        "input": FIRE_INPUT | 9,
+        "count": 0xFFFFFFFF,
+        "timestamp_us": 0,
+    }
+
+
+def test_corrupted_record_is_rejected():
+    record = bytearray(result_record_codec.encode(1, 0, 7, 3, 1234))
+    record[2] ^= 0x01
+    with pytest.raises(ValueError, match="crc"):
+        result_record_codec.decode(bytes(record))
+    with pytest.raises(ValueError, match="framing"):
+        result_record_codec.decode(b"\x00" + bytes(record[1:]))
+
+
+def test_decode_buffer_skips_noise_and_keeps_partial_record():
+    first = pulse_record_codec.encode(0, 1, 100)
+    corrupted = bytearray(pulse_record_codec.encode(0, 2, 200))
+    corrupted[-1] ^= 0xFF
+    second = pulse_record_codec.encode(0, 3, 300)
+    stream = b"\x00\x01" + first + bytes(corrupted) + second
+    records, rest = pulse_record_codec.decode_buffer(stream + second[:4])
+    assert [record["count"] for record in records] == [1, 3]
+    assert rest == second[:4]
+    records, rest = pulse_record_codec.decode_buffer(rest + second[4:])
+    assert [record["count"] for record in records] == [3]
+    assert rest == b""
+    assert [record["count"] for record in pulse_record_codec.iter_decode(stream)] == [
+        1,
+        3,
+    ]
+
+
+def test_sketch_reports_fire_pulses_only_with_report_pulses():
+    outputs = [SimpleNamespace(pin=5)]
+    assert "sendPulseRecord" not in generate_binary_sketch(outputs)
+    sketch = generate_binary_sketch(outputs, report_pulses=True)
+    assert f"sendPulseRecord(0x{FIRE_INPUT:02X} | firePin[i], pulses" in sketch
@@ -0,0 +1,135 @@
+from types import SimpleNamespace
+
+import pytest
+
+from binary_protocol import fire_input
+from calibration import OffsetCalibration, apply_calibration
+from metrics import metrics
+from pulse_clock import UINT32_RANGE
+from serial_router import build_route_table
+
+BOARD_PORT = "virtual://calibration-board"
+RATE = 100.0
+LINE_LATENCY = 0.1  # 10 pulse
+
+
+class _FrozenClock:
+    """컨베이어가 멈춘 것처럼 pulse_at이 항상 같은 번호를 돌려주는 PulseClock"""
+
+    def __init__(self, pulse):
+        self.pulse = pulse
+
+    def pulse_at(self, wall_time):
+        return self.pulse
+
+    def snapshot(self):
+        return {"rate": RATE}
+
+
+class _Board:
+    """받은 결과를 offset + 보드별 지연 뒤에 동작했다고 보고하는 선별기 보드"""
+
+    def __init__(self, config, clock, latencies):
+        self.port = BOARD_PORT
+        self.event_callbacks = []
+        self.outputs = config.serial_config.outputs
+        self.route_table = build_route_table(
+            self.outputs, config.program_config.line_count
+        )
+        self.clock = clock
+        self.latencies = latencies
+        self.offsets = []
+
+    def is_alive(self):
+        return True
+
+    def put(self, result):
+        output_idx = self.route_table[result["line_idx"]]
+        self.offsets.append(result["offset"])
+        count = (
+            self.clock.pulse_at(result["received_at"])
+            + self.latencies[output_idx]
+            + result["offset"]
+        ) % UINT32_RANGE
+        record = {
+            "input": fire_input(self.outputs[output_idx].pin),
+            "count": count,
+            "timestamp_us": 0,
+        }
+        for callback in list(self.event_callbacks):
+            callback(record, result["received_at"])
+
+
+def _config(offsets):
+    outputs = [
+        SimpleNamespace(port=BOARD_PORT, pin=pin, offset=offset)
+        for pin, offset in zip((5, 6), offsets)
+    ]
+    return SimpleNamespace(
+        serial_config=SimpleNamespace(
+            outputs=outputs, inputs=[SimpleNamespace(camera_delay=0)]
+        ),
+        program_config=SimpleNamespace(line_count=2, lines=[]),
+    )
+
+
+@pytest.fixture
+def line_latency():
+    saved = metrics.collect("line_result_latency_seconds")
+    for labels in saved:
+        metrics.set("line_result_latency_seconds", LINE_LATENCY, **dict(labels))
+    for line_idx in (0, 1):
+        metrics.set("line_result_latency_seconds", LINE_LATENCY, line=line_idx)
+    yield
+    for labels, value in saved.items():
+        metrics.set("line_result_latency_seconds", value, **dict(labels))
+
+
+@pytest.mark.parametrize("start_pulse", [1000, UINT32_RANGE - 5])
+def test_solves_offsets_from_wrong_config(line_latency, start_pulse):
+    # 설정 offset은 일부러 틀린 값. 실제 거리는 300, 400 pulse
+    config = _config(offsets=(50, 50))
+    board = _Board(config, _FrozenClock(start_pulse), latencies={0: 20, 1: 40})
+    calibration = OffsetCalibration(
+        config,
+        board.put,
+        pulse_clock=board.clock,
+        pulse_capture=board,
+        distances={0: 300, 1: 400},
+        samples_per_line=5,
+        interval=0,
+        timeout=0.5,
+    )
+    report = calibration.run({0: 1, 1: 1})
+
+    assert set(board.offsets) == {0}
+    assert board.event_callbacks == []
+    assert report["camera_delay"]["solved"] == 400  # 라인 100ms + 서버->보드 300ms
+    solved = [output["offset"]["solved"] for output in report["outputs"]]
+    # 라인 10 pulse + 서버->보드 20/40 pulse + offset = 거리
+    assert solved == [270, 350]
+
+    apply_calibration(config, report)
+    assert [output.offset for output in config.serial_config.outputs] == [270, 350]
+    assert config.serial_config.inputs[0].camera_delay == 400
+
+
+def test_output_without_distance_is_not_applied(line_latency):
+    config = _config(offsets=(50, 60))
+    board = _Board(config, _FrozenClock(1000), latencies={0: 20, 1: 40})
+    calibration = OffsetCalibration(
+        config,
+        board.put,
+        pulse_clock=board.clock,
+        pulse_capture=board,
+        distances={0: 300},
+        samples_per_line=3,
+        interval=0,
+        timeout=0.5,
+    )
+    report = calibration.run({0: 1, 1: 1})
+
+    assert report["outputs"][1]["samples"] == 3
+    assert report["outputs"][1]["offset"]["solved"] is None
+    apply_calibration(config, report)
+    assert config.serial_config.outputs[1].offset == 60
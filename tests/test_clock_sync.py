@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from clock_sync import SYNC_REPLY_TYPE, ClockSync, make_sync_reply
+
+
+def test_valid_reply_adds_sample():
+    clock_sync = ClockSync()
+    request = clock_sync.make_request(0)
+    assert clock_sync.handle_message(0, make_sync_reply(request))
+    assert 0 in clock_sync.clocks
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {},
+        {"t1": "later", "t2": 1.0},
+        {"t1": None, "t2": 1.0},
+        {"t1": "nan", "t2": 1.0},
+        {"t1": 1.0, "t2": [2.0]},
+    ],
+)
+def test_malformed_reply_is_ignored(fields):
+    clock_sync = ClockSync()
+    seq = json.loads(clock_sync.make_request(0))["seq"]
+    reply = json.dumps({"type": SYNC_REPLY_TYPE, "seq": seq, **fields})
+    assert clock_sync.handle_message(0, reply)
+    assert 0 not in clock_sync.clocks
+
+
+def test_unhashable_seq_is_ignored():
+    clock_sync = ClockSync()
+    reply = json.dumps({"type": SYNC_REPLY_TYPE, "seq": [1], "t1": 1.0, "t2": 1.0})
+    assert clock_sync.handle_message(0, reply)
@@ -0,0 +1,143 @@
+import pytest
+from pydantic import BaseModel
+
+from config_store import ConfigConflict, ConfigStore
+
+
+class SerialConfig(BaseModel):
+    port: str = "COM1"
+    baudrate: int = 9600
+
+
+class ProgramConfig(BaseModel):
+    line_count: int = 2
+    outputs: list = []
+
+
+class ServerConfig(BaseModel):
+    serial_config: SerialConfig = SerialConfig()
+    program_config: ProgramConfig = ProgramConfig()
+
+
+class RootConfig(BaseModel):
+    config: ServerConfig = ServerConfig()
+
+
+@pytest.fixture
+def saved():
+    return []
+
+
+@pytest.fixture
+def store(saved):
+    return ConfigStore(load=RootConfig, save=saved.append)
+
+
+def test_commit_bumps_version_and_saves(store, saved):
+    draft = store.checkout()
+    draft.config.serial_config.baudrate = 115200
+    assert store.commit(draft) == 2
+    assert store.config.serial_config.baudrate == 115200
+    assert len(saved) == 1
+
+
+def test_commit_without_changes_keeps_version(store, saved):
+    assert store.commit(store.checkout()) == 1
+    assert saved == []
+
+
+def test_concurrent_drafts_merge_different_fields(store):
+    first = store.checkout()
+    second = store.checkout()
+    first.config.serial_config.baudrate = 115200
+    second.config.program_config.line_count = 4
+    store.commit(first)
+    assert store.commit(second) == 3
+    assert store.config.serial_config.baudrate == 115200
+    assert store.config.program_config.line_count == 4
+
+
+def test_concurrent_drafts_same_field_conflict(store):
+    first = store.checkout()
+    second = store.checkout()
+    first.config.serial_config.port = "COM3"
+    second.config.serial_config.port = "COM4"
+    store.commit(first)
+    with pytest.raises(ConfigConflict) as excinfo:
+        store.commit(second)
+    assert excinfo.value.paths == ["config.serial_config.port"]
+    assert store.config.serial_config.port == "COM3"
+
+
+def test_same_value_on_both_sides_is_not_a_conflict(store):
+    first = store.checkout()
+    second = store.checkout()
+    first.config.serial_config.port = "COM3"
+    second.config.serial_config.port = "COM3"
+    store.commit(first)
+    assert store.commit(second) == 2
+
+
+def test_expected_version_mismatch_raises(store):
+    draft = store.checkout()
+    draft.config.program_config.line_count = 4
+    store.commit(draft)
+    with pytest.raises(ConfigConflict):
+        store.update(
+            lambda root_config: setattr(
+                root_config.config.serial_config, "baudrate", 19200
+            ),
+            expected_version=1,
+        )
+    assert store.config.serial_config.baudrate == 9600
+
+
+def test_recommit_same_draft_uses_new_base(store):
+    draft = store.checkout()
+    draft.config.program_config.line_count = 4
+    store.commit(draft)
+    draft.config.program_config.outputs = [1, 2]
+    assert store.commit(draft) == 3
+    assert store.config.program_config.line_count == 4
+
+
+def test_foreign_object_replaces_whole_config(store):
+    old = store.get()
+    draft = store.checkout()
+    draft.config.serial_config.baudrate = 115200
+    store.commit(draft)
+    assert store.commit(old) == 3
+    assert store.config.serial_config.baudrate == 9600
+
+
+def test_many_checkouts_do_not_drop_the_base(store):
+    draft = store.checkout()
+    others = [store.checkout() for _ in range(200)]
+    other = others[-1]
+    other.config.serial_config.baudrate = 115200
+    store.commit(other)
+    draft.config.program_config.line_count = 4
+    store.commit(draft)
+    assert store.config.serial_config.baudrate == 115200
+    assert store.config.program_config.line_count == 4
+
+
+def test_dropped_drafts_are_forgotten(store):
+    for _ in range(10):
+        store.checkout()
+    assert store._drafts == {}
+
+
+def test_subscriber_prefix_filter(store):
+    calls = []
+    store.subscribe(
+        lambda root_config, changed, version: calls.append(changed),
+        prefixes=["config.serial_config"],
+    )
+    store.update(
+        lambda root_config: setattr(root_config.config.program_config, "line_count", 4)
+    )
+    store.update(
+        lambda root_config: setattr(root_config.config.serial_config, "port", "COM9")
+    )
+    assert calls == [{"config.serial_config.port"}]
@@ -0,0 +1,91 @@
+import queue
+
+import pytest
+
+from ingest import (
+    DROP_NEWEST,
+    DROP_OLDEST,
+    REJECT,
+    FairIngestQueue,
+    IngestRejected,
+    RateLimiter,
+    TokenBucket,
+)
+
+
+def _result(line_idx, seq):
+    return {"line_idx": line_idx, "seq": seq}
+
+
+def _drain(ingest_queue):
+    items = []
+    while True:
+        try:
+            item = ingest_queue.get_nowait()
+        except queue.Empty:
+            return items
+        items.append((item["line_idx"], item["seq"]))
+
+
+def test_get_round_robins_between_lines():
+    ingest_queue = FairIngestQueue(maxsize=10)
+    for seq in range(3):
+        ingest_queue.put_nowait(_result(0, seq))
+    ingest_queue.put_nowait(_result(1, 0))
+    ingest_queue.put_nowait(_result(2, 0))
+    assert _drain(ingest_queue) == [(0, 0), (1, 0), (2, 0), (0, 1), (0, 2)]
+
+
+def test_drop_oldest_drops_from_busiest_line():
+    ingest_queue = FairIngestQueue(maxsize=3, policy=DROP_OLDEST)
+    ingest_queue.put_nowait(_result(0, 0))
+    ingest_queue.put_nowait(_result(0, 1))
+    ingest_queue.put_nowait(_result(1, 0))
+    assert ingest_queue.put_nowait(_result(1, 1))
+    assert ingest_queue.stats.snapshot()[0]["dropped_oldest"] == 1
+    assert _drain(ingest_queue) == [(0, 1), (1, 0), (1, 1)]
+
+
+def test_drop_newest_and_reject():
+    ingest_queue = FairIngestQueue(maxsize=1, policy=DROP_NEWEST)
+    ingest_queue.put_nowait(_result(0, 0))
+    assert ingest_queue.put_nowait(_result(1, 0)) is False
+    assert ingest_queue.stats.snapshot()[1]["dropped_newest"] == 1
+
+    ingest_queue = FairIngestQueue(maxsize=1, policy=REJECT)
+    ingest_queue.put_nowait(_result(0, 0))
+    with pytest.raises(IngestRejected):
+        ingest_queue.put(_result(1, 0), timeout=0.01)
+    assert ingest_queue.stats.snapshot()[1]["rejected"] == 1
+
+
+def test_requeue_goes_before_new_results():
+    ingest_queue = FairIngestQueue(maxsize=2)
+    ingest_queue.put_nowait(_result(0, 2))
+    ingest_queue.requeue([_result(0, 0), _result(0, 1), _result(1, 0)])
+    assert ingest_queue.qsize() == 4
+    assert ingest_queue.stats.snapshot()[0]["accepted"] == 1
+    assert _drain(ingest_queue) == [(1, 0), (0, 0), (0, 1), (0, 2)]
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=10.0, burst=2.0)
+    start = bucket.updated
+    assert bucket.allow(start)
+    assert bucket.allow(start)
+    assert not bucket.allow(start)
+    assert not bucket.allow(start + 0.05)
+    assert bucket.allow(start + 0.1)
+    # 오래 쉬어도 burst까지만 쌓인다
+    assert [bucket.allow(start + 10) for _ in range(3)] == [True, True, False]
+
+
+def test_rate_limiter_counts_limited_results_per_line():
+    limiter = RateLimiter(rate=0.001, burst=1.0)
+    assert limiter.admit("10.0.0.1", 0)
+    assert not limiter.admit("10.0.0.1", 0)
+    assert limiter.admit("10.0.0.2", 1)
+    assert limiter.stats.snapshot() == {
+        0: dict.fromkeys(limiter.stats.FIELDS, 0) | {"rate_limited": 1}
+    }
+    assert RateLimiter(rate=None).admit("10.0.0.1", 0)
@@ -0,0 +1,37 @@
+import pytest
+
+from message_codec import MessageCodec, ParameterizedMessage
+from serial_router import make_framer
+
+
+def test_template_renders_past_preallocated_buffer():
+    message = ParameterizedMessage("{pin},{grade}", "ASCII", "CRLF", size=4)
+    assert message.render(pin=12, grade=3) == b"12,3\r\n"
+    assert message.render(pin=123456789, grade=5) == b"123456789,5\r\n"
+    assert message.render(pin=1, grade=2) == b"1,2\r\n"
+
+
+def test_template_matches_codec_frame():
+    codec = MessageCodec()
+    template = codec.template("grade {grade}", "UTF-8", "STX/ETX")
+    assert template is codec.template("grade {grade}", "UTF-8", "STX/ETX")
+    assert template.render(grade=4) == codec.frame("grade 4", "UTF-8", "STX/ETX")
+
+
+def test_template_refuses_bom_encodings():
+    with pytest.raises(ValueError):
+        MessageCodec().template("{grade}", "UTF-16", "LF")
+
+
+def test_caches_are_bounded():
+    codec = MessageCodec(max_entries=8)
+    for index in range(100):
+        codec.frame(f"message {index}", "ASCII", "LF")
+    assert len(codec._frames) <= 8
+    assert len(codec._encoded) <= 8
+    assert codec.frame("message 99", "ASCII", "LF") == b"message 99\n"
+
+
+def test_framer_follows_format():
+    assert make_framer("LF")([b"1,2", b"3,4"]) == b"1,2;3,4\n"
+    assert make_framer("STX/ETX")([b"1,2"]) == b"\x021,2\x03"
@@ -0,0 +1,17 @@
+from plugin_registry import PluginRegistry
+
+
+def test_broken_plugin_is_skipped(tmp_path, monkeypatch):
+    package = tmp_path / "broken_senders"
+    (package / "all_senders").mkdir(parents=True)
+    (package / "__init__.py").write_text("__all_senders__ = ['broken', 'working']\n")
+    (package / "all_senders" / "__init__.py").write_text("")
+    (package / "all_senders" / "broken.py").write_text("raise RuntimeError('boom')\n")
+    (package / "all_senders" / "working.py").write_text("ResultSender = object\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = PluginRegistry(package="broken_senders", builtins={})
+    assert registry.senders() == ["broken", "working"]
+    assert registry.get_sender_class("broken") is None
+    assert isinstance(registry.import_error("broken"), RuntimeError)
+    assert registry.get_sender_class("working") is object
@@ -0,0 +1,30 @@
+import multiprocessing
+import threading
+
+import config_store
+from process_mode import watch_config_version
+
+
+def test_api_process_reloads_on_version_bump(monkeypatch):
+    reloaded = threading.Event()
+
+    def reload():
+        reloaded.set()
+        return {"config.program_config.line_count"}
+
+    monkeypatch.setattr(config_store.config_store, "reload", reload)
+    config_version = multiprocessing.Value("q", 0)
+    stop_event = threading.Event()
+    watcher = threading.Thread(
+        target=watch_config_version,
+        args=(config_version, stop_event, 0.01),
+        daemon=True,
+    )
+    watcher.start()
+    try:
+        assert not reloaded.wait(0.05)
+        config_version.value += 1
+        assert reloaded.wait(1.0)
+    finally:
+        stop_event.set()
+        watcher.join(1.0)
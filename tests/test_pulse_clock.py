@@ -0,0 +1,57 @@
+import time
+
+from binary_protocol import fire_input, pulse_record_codec
+from pulse_clock import UINT32_RANGE, PulseCapture, PulseClock
+from virtual_serial import get_virtual_port
+
+INTERVAL_US = 10_000  # 100 pulse/s
+
+
+def _feed(clock, first_count, first_us, host_start, pulses):
+    for index in range(pulses):
+        clock.add_sample(
+            (first_count + index) % UINT32_RANGE,
+            (first_us + index * INTERVAL_US) % UINT32_RANGE,
+            host_start + index * INTERVAL_US / 1e6,
+        )
+
+
+def test_uint32_overflow_is_unwrapped():
+    clock = PulseClock(fit_interval=8)
+    # pulse 번호와 micros가 둘 다 중간에 overflow 된다
+    _feed(clock, UINT32_RANGE - 50, UINT32_RANGE - 300_000, 1000.0, 100)
+    assert clock._pulses == list(range(UINT32_RANGE - 50, UINT32_RANGE + 50))
+    assert abs(clock.snapshot()["rate"] - 100.0) < 1e-3
+    assert clock.pulse_at(1000.505) == UINT32_RANGE
+    assert abs(clock.pulse_time(UINT32_RANGE + 10) - 1000.6) < 1e-3
+
+
+def test_reset_restarts_from_board_numbers():
+    clock = PulseClock(fit_interval=8)
+    _feed(clock, 5000, 7_000_000, 1000.0, 100)
+    # 아두이노가 reset 되어 pulse 번호와 micros가 처음부터 다시 시작한다
+    _feed(clock, 0, 1_000, 1002.0, 50)
+    assert clock._pulses == list(range(50))
+    assert abs(clock.snapshot()["rate"] - 100.0) < 1e-3
+    assert clock.pulse_at(1002.255) == 25
+
+
+def test_capture_sends_fire_reports_to_callbacks():
+    port = get_virtual_port("virtual://pulse-clock-test", 115200, timeout=0.01)
+    clock = PulseClock()
+    capture = PulseCapture(clock, port=port.port, serial_port=port, timeout=0.01)
+    events = []
+    capture.event_callbacks.append(lambda record, host_time: events.append(record))
+    capture.start()
+    try:
+        port.inject(pulse_record_codec.encode(0, 1, 100))
+        port.inject(pulse_record_codec.encode(fire_input(5), 1, 150))
+        port.inject(pulse_record_codec.encode(0, 2, 10_100))
+        deadline = time.monotonic() + 2.0
+        while (clock.total_samples < 2 or not events) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        capture.stop()
+        capture.join(timeout=1.0)
+    assert clock.total_samples == 2
+    assert events == [{"input": fire_input(5), "count": 1, "timestamp_us": 150}]
@@ -0,0 +1,44 @@
+import os
+import time
+
+from result_history import ResultHistoryStore, segment_key
+
+
+def test_sink_writes_off_the_caller_thread(tmp_path):
+    store = ResultHistoryStore(str(tmp_path), flush_interval=0.05)
+    now = time.time()
+    for index in range(100):
+        store({"line_idx": index % 4, "grade": index % 6, "received_at": now})
+    store.close()
+    reopened = ResultHistoryStore(str(tmp_path))
+    histogram = reopened.grade_histogram(now - 1, now + 1)
+    assert sum(int(counts.sum()) for counts in histogram.values()) == 100
+
+
+def test_full_queue_counts_drops(tmp_path):
+    store = ResultHistoryStore(str(tmp_path), max_queue_size=1)
+    store._start_writer = lambda: None  # writer 없이 queue만 채운다
+    store({"line_idx": 0, "grade": 1})
+    store({"line_idx": 0, "grade": 1})
+    assert store.dropped == 1
+
+
+def test_old_segments_are_pruned(tmp_path):
+    old = segment_key(time.time() - 10 * 3600)
+    os.makedirs(tmp_path / old)
+    (tmp_path / old / "count.bin").write_bytes(b"\0" * 8)
+    store = ResultHistoryStore(str(tmp_path), retention_hours=2)
+    store.append(time.time(), 0, 1)
+    store.close()
+    assert not (tmp_path / old).exists()
+
+
+def test_size_limit_keeps_current_segment(tmp_path):
+    for hours in (3, 2):
+        key = segment_key(time.time() - hours * 3600)
+        os.makedirs(tmp_path / key)
+        (tmp_path / key / "timestamp.bin").write_bytes(b"\0" * 1000)
+    store = ResultHistoryStore(str(tmp_path), retention_hours=None, max_bytes=1)
+    store.append(time.time(), 0, 1)
+    store.close()
+    assert os.listdir(tmp_path) == [segment_key(time.time())]
@@ -0,0 +1,37 @@
+from result_statistics import RollingStatistics
+
+
+def test_window_counts_and_grades():
+    statistics = RollingStatistics(max_lines=2, max_grades=4, windows=(10, 60))
+    for index in range(5):
+        statistics.record(0, index % 2, 1000.0 + index)
+    statistics.record(0, 9, 1030.0)  # 범위 밖 등급은 마지막 칸으로
+    statistics.record(5, 1, 1030.0)  # 범위 밖 라인은 무시
+    snapshot = statistics.snapshot(now=1030.5)
+    assert set(snapshot) == {0}
+    assert snapshot[0][10]["count"] == 1
+    assert snapshot[0][60]["count"] == 6
+    assert snapshot[0][60]["grades"] == [3, 2, 0, 1]
+    assert snapshot[0][60]["rate"] == 6 / 60
+
+
+def test_ring_slot_is_reused_after_wraparound():
+    statistics = RollingStatistics(max_lines=1, max_grades=2, windows=(10,))
+    assert statistics.bucket_count == 11
+    statistics.record(0, 1, 1000.0)
+    statistics.record(0, 1, 1000.5)
+    # bucket_count 만큼 지나면 같은 ring 칸을 쓰므로 예전 값은 지워져야 한다
+    statistics.record(0, 0, 1011.0)
+    snapshot = statistics.snapshot(now=1011.5)[0][10]
+    assert snapshot["count"] == 1
+    assert snapshot["grades"] == [1, 0]
+    assert statistics.snapshot(now=1000.5)[0][10]["count"] == 0
+
+
+def test_gap_mean_and_std():
+    statistics = RollingStatistics(max_lines=1, windows=(10,))
+    for timestamp in (1000.0, 1001.0, 1003.0, 1006.0):
+        statistics.record(0, 0, timestamp)
+    snapshot = statistics.snapshot(now=1006.0)[0][10]
+    assert snapshot["gap_mean"] == 2.0
+    assert abs(snapshot["gap_std"] - (2 / 3) ** 0.5) < 1e-9
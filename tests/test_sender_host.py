@@ -0,0 +1,76 @@
+import queue
+import threading
+import time
+
+from ingest import FairIngestQueue
+from sender_host import SenderHost
+
+
+class _RecordingSender(threading.Thread):
+    """받은 결과를 받은 순서대로 written에 적는 ResultSender"""
+
+    traces_results = True
+    written = []
+
+    def __init__(self, result_data_queue):
+        super().__init__(daemon=True)
+        self.result_data_queue = result_data_queue
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                result = self.result_data_queue.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            time.sleep(0.0002)
+            self.written.append((self.name, result["seq"]))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_swap_hands_over_every_result_once():
+    _RecordingSender.written = []
+    data_queue = FairIngestQueue(maxsize=10000)
+    host = SenderHost(data_queue, sender_queue_size=32)
+    host.swap(_RecordingSender)
+    total = 2000
+    try:
+        for seq in range(total):
+            data_queue.put_nowait({"line_idx": 0, "seq": seq})
+            if seq % 500 == 250:
+                report = host.swap(_RecordingSender, watermark=16)
+                assert report.handed_over <= 32
+        assert _wait_for(lambda: len(_RecordingSender.written) >= total)
+    finally:
+        host.stop()
+    seqs = [seq for _, seq in _RecordingSender.written]
+    assert sorted(seqs) == list(range(total))
+    # 라인 하나의 결과는 교체를 거쳐도 순서가 유지된다
+    assert seqs == list(range(total))
+    assert len({name for name, _ in _RecordingSender.written}) > 1
+
+
+def test_stop_returns_unsent_results_to_data_queue():
+    class _IdleSender(_RecordingSender):
+        def run(self):
+            self._stop_event.wait()
+
+    data_queue = FairIngestQueue(maxsize=100)
+    host = SenderHost(data_queue)
+    host.swap(_IdleSender)
+    for seq in range(5):
+        data_queue.put_nowait({"line_idx": 0, "seq": seq})
+    assert _wait_for(lambda: data_queue.empty())
+    host.stop()
+    assert [data_queue.get_nowait()["seq"] for _ in range(5)] == list(range(5))
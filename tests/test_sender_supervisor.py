@@ -0,0 +1,49 @@
+import multiprocessing
+import queue
+
+from ingest import FairIngestQueue
+from sender_supervisor import HeartbeatQueue, SenderSupervisor
+
+
+def _value():
+    return multiprocessing.Value("q", 0, lock=False)
+
+
+def test_heartbeat_queue_reports_taken_and_done():
+    child_queue = queue.Queue()
+    taken, done = _value(), _value()
+    heartbeat = multiprocessing.Value("d", 0.0)
+    heartbeat_queue = HeartbeatQueue(child_queue, heartbeat, 0.05, taken, done)
+    child_queue.put((1, {"line_idx": 0}))
+    child_queue.put((2, {"line_idx": 1}))
+
+    assert heartbeat_queue.get(timeout=1) == {"line_idx": 0}
+    assert (taken.value, done.value) == (1, 0)
+    assert heartbeat_queue.get(timeout=1) == {"line_idx": 1}
+    assert (taken.value, done.value) == (2, 1)
+    assert heartbeat.value > 0
+
+
+def _supervisor_with_in_flight(results, taken, done):
+    data_queue = FairIngestQueue()
+    supervisor = SenderSupervisor(data_queue)
+    supervisor._child_queue = supervisor._context.Queue()
+    supervisor._in_flight.extend(enumerate(results, 1))
+    supervisor._taken.value = taken
+    supervisor._done.value = done
+    return supervisor
+
+
+def test_forced_restart_hands_over_unread_results():
+    results = [{"line_idx": 0, "grade": grade} for grade in range(5)]
+    supervisor = _supervisor_with_in_flight(results, taken=2, done=1)
+
+    # 2번은 kill될 때 처리 중이었으므로 다시 보내지 않는다
+    assert supervisor._handoff(clean=False) == results[2:]
+    assert not supervisor._in_flight
+
+
+def test_clean_stop_hands_over_unread_results():
+    results = [{"line_idx": 1, "grade": grade} for grade in range(3)]
+    supervisor = _supervisor_with_in_flight(results, taken=0, done=0)
+    assert supervisor._handoff(clean=True) == results
@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+from serial_router import SerialOutputRouter
+
+
+def _output(port, pin):
+    return SimpleNamespace(port=port, baudrate=115200, pin=pin, format="lf")
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_unknown_line_is_not_routed():
+    router = SerialOutputRouter(
+        [_output("virtual://router-a", 2), _output("virtual://router-b", 3)],
+        line_count=2,
+    )
+    assert router.route({"line_idx": 5, "grade": 1}) is False
+    assert router.route({"line_idx": -1, "grade": 1}) is False
+    assert router.route({"line_idx": "0", "grade": 1}) is False
+    assert router.unrouted == 3
+    assert all(writer.submitted == 0 for writer in router.writers.values())
+
+
+def test_writer_survives_bad_result():
+    def encoder(result, output):
+        if result.get("bad"):
+            raise ValueError("bad result")
+        return f"{output.pin},{result['grade']}".encode()
+
+    router = SerialOutputRouter(
+        [_output("virtual://router-bad", 4)], line_count=1, encoder=encoder
+    )
+    writer = router.writers["virtual://router-bad"]
+    router.start()
+    try:
+        assert router.route({"line_idx": 0, "bad": True})
+        assert router.route({"line_idx": 0, "grade": 2})
+        assert _wait_for(lambda: writer.written == 1)
+        assert writer.is_alive()
+        assert writer.encode_errors == 1
+        assert writer.serial.written[-1][1].startswith(b"4,2")
+    finally:
+        router.stop()
+
+
+def test_default_encoder_and_port_format():
+    output = _output("virtual://router-crlf", 7)
+    output.format = "CRLF"
+    router = SerialOutputRouter([output], line_count=1)
+    writer = router.writers["virtual://router-crlf"]
+    router.start()
+    try:
+        assert router.route({"line_idx": 0, "grade": 3})
+        assert _wait_for(lambda: writer.written == 1)
+        assert writer.serial.written[-1][1] == b"7,3\r\n"
+    finally:
+        router.stop()
@@ -0,0 +1,52 @@
+import queue
+
+import pytest
+
+from shm_ring import SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(capacity=4, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def test_round_trip_across_wraparound(ring):
+    received = []
+    for index in range(10):
+        assert ring.put_nowait({"line_idx": index % 3, "seq": index})
+        if index % 3 == 2:
+            while not ring.empty():
+                received.append(ring.get_nowait()["seq"])
+    while not ring.empty():
+        received.append(ring.get_nowait()["seq"])
+    assert received == list(range(10))
+    assert ring.dropped == 0
+
+
+def test_full_ring_drops_instead_of_blocking(ring):
+    for index in range(4):
+        assert ring.put({"seq": index})
+    assert ring.put_nowait({"seq": 4}) is False
+    assert ring.dropped == 1
+    assert ring.qsize() == 4
+    assert [ring.get_nowait()["seq"] for _ in range(4)] == [0, 1, 2, 3]
+    with pytest.raises(queue.Empty):
+        ring.get(timeout=0.01)
+
+
+def test_oversized_item_is_dropped(ring):
+    assert ring.put_nowait({"text": "x" * 100}) is False
+    assert ring.dropped == 1
+    assert ring.empty()
+
+
+def test_attached_ring_reads_what_owner_wrote(ring):
+    other = SharedRing.attach(ring.name)
+    try:
+        ring.put_nowait({"seq": 1})
+        assert other.get(timeout=1.0) == {"seq": 1}
+        assert ring.empty()
+    finally:
+        other.close()
@@ -0,0 +1,41 @@
+import queue
+
+from tracing import TRACE_SPANS, TracedQueue, Tracer
+
+
+def _counts(tracer):
+    return {span: stats["count"] for span, stats in tracer.histogram.summary().items()}
+
+
+def test_traced_queue_records_dequeue_only():
+    tracer = Tracer(sample_every=1)
+    finished = []
+    tracer.finish_callbacks.append(lambda result, total_ns: finished.append(total_ns))
+    result_queue = queue.Queue()
+    result = {"line_idx": 0}
+    tracer.start(result)
+    tracer.mark(result, "enqueue")
+    result_queue.put(result)
+
+    assert TracedQueue(result_queue, tracer).get(timeout=1) is result
+    counts = _counts(tracer)
+    assert counts["receive->enqueue"] == 1
+    assert counts["enqueue->dequeue"] == 1
+    assert counts["dequeue_only"] == 1
+    assert counts["dequeue->schedule"] == counts["schedule->write"] == 0
+    assert counts["total"] == 0
+    assert finished == []
+    assert result["trace_ns"][-1] == 0
+
+
+def test_finish_records_total():
+    tracer = Tracer()
+    result = {"line_idx": 1}
+    tracer.start(result)
+    for stage in ("enqueue", "dequeue", "schedule"):
+        tracer.mark(result, stage)
+    tracer.finish(result)
+    counts = _counts(tracer)
+    assert counts["total"] == 1
+    assert counts["dequeue_only"] == 0
+    assert sum(counts[span] for span in TRACE_SPANS[:4]) == 4
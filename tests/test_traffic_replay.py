@@ -0,0 +1,78 @@
+import json
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from traffic_capture import TrafficCapture
+from traffic_replay import compare, load_capture, replay
+from virtual_serial import open_serial_port
+
+PORT = "virtual://replay-plugin-0"
+
+
+class EchoSender(threading.Thread):
+    """result_data_queue만 받는 플러그인 sender (포트는 스스로 연다)"""
+
+    def __init__(self, result_data_queue):
+        super().__init__(daemon=True)
+        self.result_data_queue = result_data_queue
+        self._stop_event = threading.Event()
+
+    def run(self):
+        serial = open_serial_port(PORT, 115200, 0.1)
+        while not self._stop_event.is_set():
+            try:
+                result = self.result_data_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            serial.write(f"3,{result['grade']}\n".encode())
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _config(port=PORT):
+    output = SimpleNamespace(port=port, baudrate=115200, pin=3)
+    return SimpleNamespace(serial_config=SimpleNamespace(outputs=[output]))
+
+
+def _write_capture(path):
+    capture = TrafficCapture()
+    capture.start(str(path))
+    for grade, reply in (
+        (1, "Message received: ..."),
+        (2, json.dumps({"type": "error", "reason": "rate_limited"})),
+        (4, "Message received: ..."),
+    ):
+        capture.ws_in(0, json.dumps({"grade": grade}))
+        capture.ws_out(0, reply)
+        if "error" not in reply:
+            capture.serial_out(PORT, f"3,{grade}\n".encode())
+    capture.stop()
+
+
+def test_capture_flags_rejected_frames(tmp_path):
+    _write_capture(tmp_path / "flags.aiocap")
+    capture = load_capture(str(tmp_path / "flags.aiocap"))
+    assert [result[3] for result in capture["results"]] == [None, "rate_limited", None]
+
+
+def test_replay_with_plugin_sender(tmp_path):
+    _write_capture(tmp_path / "plugin.aiocap")
+    capture = load_capture(str(tmp_path / "plugin.aiocap"))
+
+    replayed = replay(
+        capture, speed=None, config=_config(), sender_class=EchoSender, settle=0.2
+    )
+    report = compare(capture, replayed)
+    assert report["serial_equal"], report["serial"]
+    assert report["skipped"] == {"rate_limited": 1}
+
+
+def test_plugin_sender_refuses_real_ports(tmp_path):
+    _write_capture(tmp_path / "real.aiocap")
+    capture = load_capture(str(tmp_path / "real.aiocap"))
+    with pytest.raises(ValueError):
+        replay(capture, config=_config("COM4"), sender_class=EchoSender)
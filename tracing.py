@@ -0,0 +1,274 @@
+"""
+결과 하나의 websocket 수신 -> serial write 구간별 latency tracing.
+
+결과 dict에 trace_id와 단계별 perf_counter_ns 목록(trace_ns)을 붙여 파이프라인을 따라 보낸다.
+perf_counter는 시스템 전체 monotonic 시계라서 sender가 다른 프로세스여도 같은 기준이다.
+마지막 단계(write)에서 구간별 histogram에 기록하고, sample_every개 중 하나는 전체 trace를
+보관해서 Chrome trace(`chrome://tracing`, Perfetto) JSON으로 내보낸다.
+write를 알 수 없는 sender(플러그인)의 trace는 dequeue에서 끝내고, 수신 -> dequeue를 따로
+"dequeue_only" 구간에 기록한다 (dequeue->write, total에는 들어가지 않는다).
+"""
+
+import collections
+import functools
+import inspect
+import itertools
+import math
+import threading
+import time
+
+from metrics import metrics
+
+TRACE_STAGES = ("receive", "enqueue", "dequeue", "schedule", "write")
+_STAGE_INDEX = {stage: index for index, stage in enumerate(TRACE_STAGES)}
+# histogram 구간: 앞 단계 -> 이 단계, 전체, write 없이 끝난 trace의 수신 -> dequeue
+TRACE_SPANS = [
+    f"{TRACE_STAGES[i]}->{TRACE_STAGES[i + 1]}" for i in range(len(TRACE_STAGES) - 1)
+] + ["total", "dequeue_only"]
+_TOTAL_SPAN = TRACE_SPANS.index("total")
+_DEQUEUE_ONLY_SPAN = TRACE_SPANS.index("dequeue_only")
+
+
+class StageHistogram:
+    """
+    스레드별 log2(us) bucket 배열을 따로 두는 histogram.
+
+    기록하는 스레드끼리 같은 배열을 건드리지 않으므로 lock이 없다. 읽을 때만 합친다.
+    """
+
+    BUCKETS = 32
+
+    def __init__(self, spans=TRACE_SPANS):
+        self.spans = list(spans)
+        self._local = threading.local()
+        self._shards = []  # 스레드별 [span][bucket] 배열
+        self._shards_lock = threading.Lock()  # 스레드가 처음 기록할 때 한 번만 쓴다
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [[0] * self.BUCKETS for _ in self.spans]
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, span_index: int, nanoseconds: int):
+        micros = max(nanoseconds // 1000, 1)
+        bucket = min(micros.bit_length() - 1, self.BUCKETS - 1)
+        self._shard()[span_index][bucket] += 1
+
+    def merged(self) -> list:
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged = [[0] * self.BUCKETS for _ in self.spans]
+        for shard in shards:
+            for span_index, counts in enumerate(shard):
+                for bucket, count in enumerate(counts):
+                    merged[span_index][bucket] += count
+        return merged
+
+    def summary(self) -> dict:
+        summary = {}
+        for span, counts in zip(self.spans, self.merged()):
+            total = sum(counts)
+            summary[span] = {
+                "count": total,
+                "p50": self._percentile(counts, total, 50),
+                "p90": self._percentile(counts, total, 90),
+                "p99": self._percentile(counts, total, 99),
+            }
+        return summary
+
+    @staticmethod
+    def _percentile(counts, total, percent) -> float:
+        """bucket 상한 기준 근사 백분위수(초)"""
+        if not total:
+            return 0.0
+        target = math.ceil(total * percent / 100)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return (1 << (bucket + 1)) / 1e6
+        return (1 << len(counts)) / 1e6
+
+
+class Tracer:
+    def __init__(self, sample_every=100, max_samples=5000, enabled=True):
+        self.enabled = enabled
+        self.sample_every = sample_every
+        self.histogram = StageHistogram()
+        # deque.append는 thread-safe라서 sample 보관에도 lock이 필요 없다
+        self.samples = collections.deque(maxlen=max_samples)
+        self._ids = itertools.count(1)
+        # callback(result, total_ns) (traffic capture, replay)
+        self.finish_callbacks = []
+        # forward(trace_id, line_idx, trace_ns)가 있으면 끝난 trace를 여기서 기록하지 않고 넘긴다
+        # (sender 자식 프로세스 -> supervisor의 tracer.record)
+        self.forward = None
+
+    def start(self, result: dict, received_ns: int = None):
+        """websocket에서 받은 시각으로 trace를 시작합니다."""
+        if not self.enabled:
+            return
+        trace_ns = [0] * len(TRACE_STAGES)
+        trace_ns[0] = received_ns or time.perf_counter_ns()
+        result["trace_id"] = next(self._ids)
+        result["trace_ns"] = trace_ns
+
+    def mark(self, result: dict, stage: str, now_ns: int = None):
+        trace_ns = result.get("trace_ns")
+        if trace_ns is None:
+            return
+        trace_ns[_STAGE_INDEX[stage]] = now_ns or time.perf_counter_ns()
+
+    def finish(self, result: dict, now_ns: int = None):
+        """serial write가 끝난 시각을 기록하고 histogram/sample에 넣습니다."""
+        trace_ns = result.get("trace_ns")
+        if trace_ns is None:
+            return
+        trace_ns[-1] = now_ns or time.perf_counter_ns()
+        self.record(result["trace_id"], result.get("line_idx", 0), trace_ns)
+        total_ns = trace_ns[-1] - trace_ns[0]
+        for callback in self.finish_callbacks:
+            callback(result, total_ns)
+
+    def finish_dequeued(self, result: dict, now_ns: int = None):
+        """
+        write 시각을 모르는 sender가 결과를 꺼낸 시각으로 trace를 끝냅니다.
+
+        receive->enqueue, enqueue->dequeue는 그대로 기록하고 수신 -> dequeue는 dequeue_only에
+        넣는다. write 구간과 total, finish_callbacks(write latency)에는 넣지 않는다.
+        """
+        trace_ns = result.get("trace_ns")
+        if trace_ns is None:
+            return
+        trace_ns[_STAGE_INDEX["dequeue"]] = now_ns or time.perf_counter_ns()
+        self.record(result["trace_id"], result.get("line_idx", 0), trace_ns)
+
+    def record(self, trace_id: int, line_idx: int, trace_ns: list):
+        """
+        끝난 trace 하나를 histogram/sample에 넣습니다.
+
+        write가 0이면 dequeue에서 끝난 trace(finish_dequeued)로 본다.
+        """
+        if self.forward is not None:
+            self.forward(trace_id, line_idx, list(trace_ns))
+            return
+        last = len(trace_ns) if trace_ns[-1] else _STAGE_INDEX["dequeue"] + 1
+        previous = trace_ns[0]
+        for index in range(1, last):
+            if trace_ns[index]:
+                # 건너뛴 단계(예: schedule 없는 sender)는 다음 단계 구간에 포함된다
+                self.histogram.record(index - 1, trace_ns[index] - previous)
+                previous = trace_ns[index]
+        if trace_ns[-1]:
+            self.histogram.record(_TOTAL_SPAN, trace_ns[-1] - trace_ns[0])
+        else:
+            self.histogram.record(_DEQUEUE_ONLY_SPAN, previous - trace_ns[0])
+        if trace_id % self.sample_every == 0:
+            self.samples.append((trace_id, line_idx, list(trace_ns)))
+
+    def chrome_trace(self) -> dict:
+        """보관한 trace를 Chrome trace event 형식으로 (라인별 thread, 단계별 구간)"""
+        events = []
+        for trace_id, line_idx, trace_ns in list(self.samples):
+            marks = [(stage, ns) for stage, ns in zip(TRACE_STAGES, trace_ns) if ns]
+            for (stage, start_ns), (next_stage, end_ns) in zip(marks, marks[1:]):
+                events.append(
+                    {
+                        "name": f"{stage}->{next_stage}",
+                        "cat": "result",
+                        "ph": "X",
+                        "ts": start_ns / 1000,
+                        "dur": (end_ns - start_ns) / 1000,
+                        "pid": 1,
+                        "tid": line_idx,
+                        "args": {"trace_id": trace_id},
+                    }
+                )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+tracer = Tracer()
+
+
+class TracedQueue:
+    """
+    dequeue/write mark를 직접 남기지 않는 sender(플러그인)에 넘기는 queue proxy.
+
+    sender가 결과를 꺼내는 순간을 dequeue로 기록하고 trace를 끝낸다. 플러그인이 언제 serial에
+    썼는지는 알 수 없으므로 write는 남기지 않는다 (Tracer.finish_dequeued).
+    """
+
+    def __init__(self, result_queue, tracer=tracer):
+        self._queue = result_queue
+        self._tracer = tracer
+
+    def get(self, block=True, timeout=None):
+        result = self._queue.get(block, timeout)
+        if isinstance(result, dict):
+            self._tracer.finish_dequeued(result)
+        return result
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def __getattr__(self, name):
+        return getattr(self._queue, name)
+
+
+def traced_queue(sender_class, result_queue):
+    """sender_class가 trace를 직접 끝내지 않으면(traces_results) TracedQueue로 감싼다"""
+    if getattr(sender_class, "traces_results", False):
+        return result_queue
+    return TracedQueue(result_queue)
+
+
+metrics.describe("timed_calls_total", "@timed 구간 호출 수")
+metrics.describe("timed_seconds_total", "@timed 구간 누적 시간")
+
+_timings = {}  # name -> StageHistogram (구간 하나)
+
+
+def timed(name: str):
+    """함수(동기/async) 실행 시간을 metrics와 `/debug/timings`에 기록하는 decorator"""
+    histogram = _timings.setdefault(name, StageHistogram([name]))
+
+    def record(elapsed_ns):
+        histogram.record(0, elapsed_ns)
+        metrics.inc("timed_calls_total", section=name)
+        metrics.inc("timed_seconds_total", elapsed_ns / 1e9, section=name)
+
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter_ns()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    record(time.perf_counter_ns() - start)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def timing_summary() -> dict:
+    summary = {}
+    for histogram in list(_timings.values()):
+        summary.update(histogram.summary())
+    return summary
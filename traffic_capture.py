@@ -0,0 +1,230 @@
+"""
+운영 트래픽 capture 파일 (websocket 수신/송신 frame, serial write, 결과별 latency).
+
+capture를 켜면 모든 기록이 bounded queue를 거쳐 writer 스레드에서 파일로 쓰인다. hot path는
+기다리지 않고, queue가 가득 차면 버린 개수만 센다. 꺼져 있을 때 record()는 속성 하나만 확인한다.
+
+파일 형식 (little endian)
+
+    header  b"AIOCAP" + version u16 + 시작 perf_counter_ns i64 + 시작 time.time() f64
+    record  kind u8, channel u16, timestamp_ns i64 (perf_counter_ns), length u32, data
+
+channel은 "line:3", "COM4" 같은 이름을 처음 나올 때 CHANNEL record로 번호에 묶는다.
+LATENCY record의 data는 결과 하나의 수신 -> serial write 전체 시간(ns, i64)이다.
+sender를 별도 프로세스로 돌리는 모드에서는 serial write/latency가 그 프로세스에서 일어나므로
+스레드 모드에서만 모두 기록된다.
+"""
+
+import collections
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger("traffic_capture")
+
+DEFAULT_CAPTURE_DIR = os.path.expanduser("~/aiofarm_captures")
+
+MAGIC = b"AIOCAP"
+VERSION = 1
+HEADER = struct.Struct("<6sHqd")
+RECORD_HEADER = struct.Struct("<BHqI")
+LATENCY = struct.Struct("<q")
+
+CHANNEL = 0
+WS_IN = 1
+WS_OUT = 2
+SERIAL_OUT = 3
+LATENCY_NS = 4
+KIND_NAMES = {
+    CHANNEL: "channel",
+    WS_IN: "ws_in",
+    WS_OUT: "ws_out",
+    SERIAL_OUT: "serial_out",
+    LATENCY_NS: "latency",
+}
+
+metrics.describe("capture_records_total", "capture 파일에 쓴 record 수")
+metrics.describe("capture_dropped_total", "queue가 가득 차서 버린 capture record 수")
+
+CaptureRecord = collections.namedtuple(
+    "CaptureRecord", ["kind", "channel", "timestamp_ns", "data"]
+)
+
+
+def capture_path(name: str = None, directory: str = None) -> str:
+    """
+    capture 파일 경로. name은 디렉터리 없는 파일 이름만 받는다 (HTTP로 받은 이름을 그대로 쓰므로).
+
+    name이 없으면 시작 시각으로 만든다.
+    """
+    directory = directory or DEFAULT_CAPTURE_DIR
+    name = name or time.strftime("capture_%Y%m%d_%H%M%S.aiocap")
+    if name in (".", "..") or "\\" in name or os.path.basename(name) != name:
+        raise ValueError(f"invalid capture file name: {name!r}")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def line_channel(line_idx) -> str:
+    return f"line:{line_idx}"
+
+
+class TrafficCapture:
+    """capture 파일 writer. start/stop 사이의 record만 기록합니다."""
+
+    def __init__(self, max_queue_size=100000, flush_interval=0.2):
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._queue is not None
+
+    def start(self, path: str):
+        with self._lock:
+            if self.active:
+                raise RuntimeError(f"capture already running: {self.path}")
+            capture_file = open(path, "wb")
+            capture_file.write(
+                HEADER.pack(MAGIC, VERSION, time.perf_counter_ns(), time.time())
+            )
+            self.path = path
+            self.recorded = 0
+            self.dropped = 0
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._queue, capture_file),
+                name="TrafficCapture",
+                daemon=True,
+            )
+            self._thread.start()
+        logger.info(f"traffic capture started: {path}")
+
+    def stop(self) -> dict:
+        with self._lock:
+            capture_queue, thread = self._queue, self._thread
+            self._queue = None
+            self._thread = None
+        if capture_queue is not None:
+            capture_queue.put(None)
+            thread.join()
+            logger.info(f"traffic capture stopped: {self.path}")
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "path": self.path,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+        }
+
+    def record(self, kind: int, channel: str, data: bytes, timestamp_ns=None):
+        capture_queue = self._queue
+        if capture_queue is None:
+            return
+        item = (kind, channel, timestamp_ns or time.perf_counter_ns(), data)
+        try:
+            capture_queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("capture_dropped_total")
+
+    def ws_in(self, line_idx, message: str, timestamp_ns=None):
+        if self._queue is not None:
+            self.record(WS_IN, line_channel(line_idx), message.encode(), timestamp_ns)
+
+    def ws_out(self, line_idx, message: str):
+        if self._queue is not None:
+            self.record(WS_OUT, line_channel(line_idx), message.encode())
+
+    def serial_out(self, port: str, frame: bytes, timestamp_ns=None):
+        if self._queue is not None:
+            self.record(SERIAL_OUT, port, bytes(frame), timestamp_ns)
+
+    def latency(self, result: dict, total_ns: int):
+        """tracer.finish_callbacks에 등록하는 callback"""
+        if self._queue is not None:
+            self.record(
+                LATENCY_NS,
+                line_channel(result.get("line_idx", 0)),
+                LATENCY.pack(total_ns),
+            )
+
+    def _run(self, capture_queue, capture_file):
+        channels = {}
+        last_flush = time.monotonic()
+        with capture_file:
+            while True:
+                try:
+                    item = capture_queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    kind, channel, timestamp_ns, data = item
+                    channel_id = channels.get(channel)
+                    if channel_id is None:
+                        channel_id = channels[channel] = len(channels)
+                        name = channel.encode()
+                        capture_file.write(
+                            RECORD_HEADER.pack(CHANNEL, channel_id, 0, len(name))
+                        )
+                        capture_file.write(name)
+                    capture_file.write(
+                        RECORD_HEADER.pack(kind, channel_id, timestamp_ns, len(data))
+                    )
+                    capture_file.write(data)
+                    self.recorded += 1
+                    metrics.inc("capture_records_total")
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    capture_file.flush()
+                    last_flush = time.monotonic()
+
+
+def read_header(capture_file) -> dict:
+    magic, version, started_ns, started_at = HEADER.unpack(
+        capture_file.read(HEADER.size)
+    )
+    if magic != MAGIC:
+        raise ValueError("not a traffic capture file")
+    if version != VERSION:
+        raise ValueError(f"unsupported capture version {version}")
+    return {"version": version, "started_ns": started_ns, "started_at": started_at}
+
+
+def read_capture(path: str):
+    """capture 파일의 record를 순서대로 (channel은 이름으로 바꿔서) 돌려줍니다."""
+    channels = {}
+    with open(path, "rb") as capture_file:
+        read_header(capture_file)
+        while True:
+            header = capture_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return  # 끝 (쓰다가 끊긴 마지막 record는 버린다)
+            kind, channel_id, timestamp_ns, length = RECORD_HEADER.unpack(header)
+            data = capture_file.read(length)
+            if len(data) < length:
+                return
+            if kind == CHANNEL:
+                channels[channel_id] = data.decode()
+                continue
+            yield CaptureRecord(
+                kind, channels.get(channel_id, str(channel_id)), timestamp_ns, data
+            )
+
+
+traffic_capture = TrafficCapture()
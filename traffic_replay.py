@@ -0,0 +1,309 @@
+"""
+traffic capture 재생 도구 (성능/동작 회귀 확인용).
+
+capture 파일(traffic_capture.py)의 websocket 수신 frame을 지금 코드의 결과 파이프라인
+(parse_line_result -> data_queue -> sender -> serial writer)에 다시 넣고, 가상 시리얼 포트로
+나온 바이트를 capture 때 실제 포트에 쓴 바이트와 비교한다. latency 분포도 함께 비교한다.
+
+    python traffic_replay.py capture.aiocap --speed 1      # 원래 속도
+    python traffic_replay.py capture.aiocap --speed 10     # 10배 빠르게
+    python traffic_replay.py capture.aiocap --speed max    # 기다리지 않고
+
+출력 포트는 설정의 각 output 포트 이름 앞에 `virtual://replay/`를 붙인 가상 포트로 바꾼다.
+coalesce를 켠 sender는 재생 속도에 따라 frame 경계가 달라질 수 있으므로 1배속으로 비교한다.
+빠르게 재생하면 결과가 보드레이트보다 빨리 쌓여 latency가 늘어나는 것이 정상이므로 latency 비교도
+1배속 결과로 판단한다.
+binary 프로토콜의 seq는 포트마다 sender를 시작할 때 0부터 다시 세므로, 운영 중에 시작한 capture와
+비교할 때는 양쪽 모두 첫 record 기준 상대 seq로 바꿔서 비교한다 (빠진 record는 그대로 드러난다).
+capture 때 rate limit/overflow 등으로 거절한 frame(서버가 {"type": "error"}로 답한 frame)은 다시
+보내지 않고 사유별로 세어 보고한다.
+바이트가 다르거나 p99 latency가 허용 비율을 넘으면 종료 코드 1.
+
+--sender 플러그인은 SenderHost처럼 result_data_queue만 받고 포트를 설정에서 직접 연다. 실제
+선별기를 움직이지 않도록 모든 output 포트가 virtual:// 포트인 설정에서만 재생하고, 그 포트에
+쓴 바이트를 비교한다. 플러그인은 write 시각을 알 수 없으므로 latency는 비교하지 않는다.
+"""
+
+import argparse
+import copy
+import json
+import math
+import sys
+import time
+
+from binary_protocol import result_record_codec
+from clock_sync import SYNC_REPLY_TYPE
+from ingest import FairIngestQueue, InvalidLineResult, parse_line_result
+from serial_router import RoutingResultSender
+from tracing import traced_queue, tracer
+from traffic_capture import LATENCY, LATENCY_NS, SERIAL_OUT, WS_IN, WS_OUT, read_capture
+from virtual_serial import VIRTUAL_PORT_PREFIX, get_virtual_port
+
+REPLAY_PORT_PREFIX = VIRTUAL_PORT_PREFIX + "replay/"
+
+
+def _error_reason(text: str):
+    """서버가 결과를 거절하며 보낸 {"type": "error", "reason": ...}이면 reason, 아니면 None"""
+    if not text.startswith("{"):
+        return None
+    try:
+        reply = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(reply, dict) and reply.get("type") == "error":
+        return str(reply.get("reason"))
+    return None
+
+
+def load_capture(path: str) -> dict:
+    """
+    재생에 필요한 부분만 모읍니다: 결과 frame, 포트별 출력 바이트, latency.
+
+    results는 (timestamp_ns, line_idx, text, 거절 사유 또는 None). 라인 메시지는 연결마다 차례로
+    처리하므로 같은 라인의 다음 응답(WS_OUT)이 그 frame에 대한 응답이다.
+    """
+    capture = {"results": [], "serial": {}, "latencies": [], "ws_frames": 0}
+    awaiting_reply = {}  # channel -> 응답을 기다리는 results index
+    for record in read_capture(path):
+        if record.kind == WS_IN:
+            capture["ws_frames"] += 1
+            text = record.data.decode()
+            if SYNC_REPLY_TYPE in text:
+                continue  # 시계 동기화 응답은 결과가 아니다
+            line_idx = int(record.channel.split(":", 1)[1])
+            awaiting_reply[record.channel] = len(capture["results"])
+            capture["results"].append([record.timestamp_ns, line_idx, text, None])
+        elif record.kind == WS_OUT and record.channel in awaiting_reply:
+            text = record.data.decode(errors="replace")
+            reason = _error_reason(text)
+            if reason is not None:
+                capture["results"][awaiting_reply.pop(record.channel)][3] = reason
+            elif text.startswith("Message received"):
+                del awaiting_reply[record.channel]
+        elif record.kind == SERIAL_OUT:
+            capture["serial"].setdefault(record.channel, bytearray()).extend(
+                record.data
+            )
+        elif record.kind == LATENCY_NS:
+            capture["latencies"].append(LATENCY.unpack(record.data)[0])
+    return capture
+
+
+def replay(capture: dict, speed=1.0, config=None, sender_class=None, settle=1.0):
+    """
+    capture의 결과를 speed 배속으로(None이면 최대 속도) 다시 보냅니다.
+
+    RoutingResultSender 계열은 output 포트를 replay 가상 포트로 바꾼 config로 만든다. 그 밖의
+    sender(플러그인)는 SenderHost처럼 result_data_queue만 넘기고, 설정의 포트가 모두 virtual://
+    포트여야 한다 (아니면 ValueError).
+    """
+    if config is None:
+        from server_config_model import load_server_root_config
+
+        config = load_server_root_config().config
+    config = copy.deepcopy(config)
+    sender_class = sender_class or RoutingResultSender
+    routing = issubclass(sender_class, RoutingResultSender)
+    original_ports = {}
+    serial = {}
+    for output in config.serial_config.outputs:
+        if not routing and not output.port.startswith(VIRTUAL_PORT_PREFIX):
+            raise ValueError(
+                f"{sender_class.__name__}는 설정의 포트를 직접 열므로 virtual:// 포트"
+                f" 설정에서만 재생할 수 있습니다 ({output.port})"
+            )
+        if output.port in original_ports.values():
+            if routing:
+                output.port = REPLAY_PORT_PREFIX + output.port
+            continue
+        replay_port = REPLAY_PORT_PREFIX + output.port if routing else output.port
+        original_ports[replay_port] = output.port
+        output.port = replay_port
+        virtual_port = get_virtual_port(replay_port, output.baudrate, timeout=0.1)
+        virtual_port.loopback = False
+        virtual_port.write_callbacks.clear()
+        received = serial[original_ports[replay_port]] = bytearray()
+        virtual_port.write_callbacks.append(
+            lambda timestamp_ns, data, received=received: received.extend(data)
+        )
+
+    latencies = []
+
+    def record_latency(result, total_ns):
+        latencies.append(total_ns)
+
+    result_queue = FairIngestQueue(maxsize=len(capture["results"]) + 1)
+    if routing:
+        sender = sender_class(traced_queue(sender_class, result_queue), config=config)
+    else:
+        sender = sender_class(
+            result_data_queue=traced_queue(sender_class, result_queue)
+        )
+    skipped = {}
+    tracer.finish_callbacks.append(record_latency)
+    sender.start()
+    started_ns = time.perf_counter_ns()
+    try:
+        results = capture["results"]
+        first_ns = results[0][0] if results else 0
+        for timestamp_ns, line_idx, text, rejected in results:
+            if rejected is not None:
+                # capture 때 서버가 거절해서 serial에 나가지 않은 frame
+                skipped[rejected] = skipped.get(rejected, 0) + 1
+                continue
+            if speed:
+                delay = (
+                    started_ns + (timestamp_ns - first_ns) / speed
+                ) - time.perf_counter_ns()
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+            try:
+                result = parse_line_result(text, line_idx)
+            except InvalidLineResult:
+                skipped["invalid_result"] = skipped.get("invalid_result", 0) + 1
+                continue
+            tracer.start(result)
+            tracer.mark(result, "enqueue")
+            result_queue.put_nowait(result)
+        # 마지막 출력 뒤 settle초 동안 더 나오는 것이 없으면 끝난 것으로 본다
+        written = -1
+        while written != _progress(latencies, serial) or not result_queue.empty():
+            written = _progress(latencies, serial)
+            time.sleep(settle)
+    finally:
+        sender.stop()
+        sender.join(timeout=5)
+        tracer.finish_callbacks.remove(record_latency)
+    return {
+        "serial": serial,
+        "protocol": getattr(sender, "protocol", "text"),
+        "latencies": latencies,
+        "skipped": skipped,
+        "elapsed": (time.perf_counter_ns() - started_ns) / 1e9,
+    }
+
+
+def _progress(latencies, serial) -> tuple:
+    # 플러그인 sender는 latency가 없으므로 출력 바이트 수도 함께 본다
+    return len(latencies), sum(len(data) for data in serial.values())
+
+
+def normalize_sequence(data: bytes, codec=result_record_codec) -> bytes:
+    """binary record의 seq를 첫 record 기준 상대값으로 바꿉니다 (CRC도 다시 계산)."""
+    normalized = bytearray(data)
+    first_seq = None
+    index = 0
+    while index + codec.size <= len(normalized):
+        try:
+            record = codec.decode(bytes(normalized[index : index + codec.size]))
+        except ValueError:
+            index += 1
+            continue
+        if first_seq is None:
+            first_seq = record["seq"]
+        record["seq"] = (record["seq"] - first_seq) & 0xFF
+        normalized[index : index + codec.size] = codec.encode_dict(record)
+        index += codec.size
+    return bytes(normalized)
+
+
+def diff_bytes(expected: bytes, actual: bytes, context=16) -> dict:
+    report = {
+        "equal": expected == actual,
+        "expected_bytes": len(expected),
+        "actual_bytes": len(actual),
+    }
+    if not report["equal"]:
+        offset = next(
+            (
+                index
+                for index, (left, right) in enumerate(zip(expected, actual))
+                if left != right
+            ),
+            min(len(expected), len(actual)),
+        )
+        report["first_difference"] = offset
+        report["expected"] = bytes(expected[offset : offset + context]).hex(" ")
+        report["actual"] = bytes(actual[offset : offset + context]).hex(" ")
+    return report
+
+
+def latency_summary(latencies) -> dict:
+    """정확한 백분위수(초). 비교용이라 histogram 근사 대신 전부 정렬한다."""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(percent):
+        return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)] / 1e9
+
+    return {
+        "count": len(ordered),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": ordered[-1] / 1e9,
+    }
+
+
+def compare(capture: dict, replayed: dict, latency_tolerance=1.5) -> dict:
+    ports = sorted(set(capture["serial"]) | set(replayed["serial"]))
+    normalize = normalize_sequence if replayed.get("protocol") == "binary" else bytes
+    serial = {
+        port: diff_bytes(
+            normalize(capture["serial"].get(port, b"")),
+            normalize(replayed["serial"].get(port, b"")),
+        )
+        for port in ports
+    }
+    captured = latency_summary(capture["latencies"])
+    replay_latency = latency_summary(replayed["latencies"])
+    latency_regressed = bool(
+        captured.get("count")
+        and replay_latency.get("count")
+        and replay_latency["p99"] > captured["p99"] * latency_tolerance
+    )
+    return {
+        "results": len(capture["results"]),
+        "skipped": replayed.get("skipped", {}),
+        "elapsed": replayed["elapsed"],
+        "serial": serial,
+        "serial_equal": all(port["equal"] for port in serial.values()),
+        "latency": {"capture": captured, "replay": replay_latency},
+        "latency_regressed": latency_regressed,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", help="traffic capture 파일")
+    parser.add_argument("--speed", default="1", help="배속 (1, 10, ...) 또는 max")
+    parser.add_argument(
+        "--sender", help="plugin_registry sender 이름 (기본 RoutingResultSender)"
+    )
+    parser.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=1.5,
+        help="capture p99 대비 허용 비율",
+    )
+    args = parser.parse_args(argv)
+
+    sender_class = None
+    if args.sender:
+        from plugin_registry import plugin_registry
+
+        sender_class = plugin_registry.get_sender_class(args.sender)
+        if sender_class is None:
+            parser.error(f"sender {args.sender} not found")
+    speed = None if args.speed == "max" else float(args.speed)
+
+    capture = load_capture(args.capture)
+    replayed = replay(capture, speed=speed, sender_class=sender_class)
+    report = compare(capture, replayed, args.latency_tolerance)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["serial_equal"] and not report["latency_regressed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import collections
+import threading
+import time
+
+VIRTUAL_PORT_PREFIX = "virtual://"
+
+_virtual_ports = {}
+_virtual_ports_lock = threading.Lock()
+
+
+class VirtualSerialPort:
+    """
+    아두이노 없이 테스트하기 위한 가상 시리얼 포트 (pyserial Serial과 같은 메서드 제공).
+
+    쓰는 바이트는 timestamp와 함께 기록되고, loopback이면 그대로 읽기 버퍼로 돌아온다.
+    읽기 버퍼는 max_rx_bytes까지만 두고 넘치면 오래된 바이트부터 버린다 (아무도 읽지 않는 포트).
+    emulate_timing이면 보드레이트 기준(1byte = 10bit) 전송 시간만큼 write가 걸린다.
+    """
+
+    def __init__(
+        self,
+        port,
+        baudrate=9600,
+        timeout=1,
+        loopback=True,
+        emulate_timing=True,
+        max_rx_bytes=1 << 20,
+    ):
+        self.port = port
+        self.baudrate = int(baudrate)
+        self.timeout = timeout
+        self.loopback = loopback
+        self.emulate_timing = emulate_timing
+        self.is_open = True
+        self.written = collections.deque(maxlen=100000)  # (perf_counter_ns, bytes)
+        self.bytes_written = 0
+        self._rx = bytearray()
+        self.max_rx_bytes = max_rx_bytes
+        self.rx_overflow_bytes = 0
+        self._rx_condition = threading.Condition()
+        self._busy_until = 0.0
+        self._write_lock = threading.Lock()
+        self.write_callbacks = []  # callback(timestamp_ns, data)
+
+    def write(self, data: bytes) -> int:
+        data = bytes(data)
+        with self._write_lock:
+            if self.emulate_timing:
+                now = time.perf_counter()
+                start = max(now, self._busy_until)
+                self._busy_until = start + len(data) * 10 / self.baudrate
+                delay = self._busy_until - now
+                if delay > 0:
+                    time.sleep(delay)
+            timestamp_ns = time.perf_counter_ns()
+            self.written.append((timestamp_ns, data))
+            self.bytes_written += len(data)
+        for callback in self.write_callbacks:
+            callback(timestamp_ns, data)
+        if self.loopback:
+            self.inject(data)
+        return len(data)
+
+    def inject(self, data: bytes):
+        """장치가 PC로 보낸 것처럼 읽기 버퍼에 데이터를 넣습니다."""
+        with self._rx_condition:
+            self._rx.extend(data)
+            overflow = len(self._rx) - self.max_rx_bytes
+            if overflow > 0:
+                del self._rx[:overflow]
+                self.rx_overflow_bytes += overflow
+            self._rx_condition.notify_all()
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._rx)
+
+    def read(self, size=1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._rx_condition:
+            while len(self._rx) < size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._rx_condition.wait(remaining)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    def readline(self) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._rx_condition:
+            while b"\n" not in self._rx:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    data = bytes(self._rx)
+                    self._rx.clear()
+                    return data
+                self._rx_condition.wait(remaining)
+            end = self._rx.index(b"\n") + 1
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+            return data
+
+    def read_all(self) -> bytes:
+        with self._rx_condition:
+            data = bytes(self._rx)
+            self._rx.clear()
+            return data
+
+    def reset_input_buffer(self):
+        self.read_all()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def get_virtual_port(port: str, baudrate=9600, timeout=1) -> VirtualSerialPort:
+    """같은 이름이면 같은 가상 포트를 반환합니다 (테스트 도구끼리 공유)."""
+    with _virtual_ports_lock:
+        virtual_port = _virtual_ports.get(port)
+        if virtual_port is None:
+            virtual_port = VirtualSerialPort(port, baudrate, timeout)
+            _virtual_ports[port] = virtual_port
+        virtual_port.baudrate = int(baudrate)
+        virtual_port.timeout = timeout
+        virtual_port.is_open = True
+        return virtual_port
+
+
+def open_serial_port(port: str, baudrate=9600, timeout=1):
+    """`virtual://` 로 시작하면 가상 포트, 아니면 pyserial 포트를 엽니다."""
+    if port.startswith(VIRTUAL_PORT_PREFIX):
+        return get_virtual_port(port, baudrate, timeout)
+    import serial
+
+    return serial.Serial(port=port, baudrate=int(baudrate), timeout=timeout)